@@ -1,16 +1,57 @@
 from django.contrib import admin
-from .models import Post, Response
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from .models import DeadOutboxMessage, DeliveryRun, OutboxMessage, Post, Response
+from .outbox import kick_drain
+from .response_counters import edited_fields
 from modeltranslation.admin import \
     TranslationAdmin
 
 
-class PostAdmin(TranslationAdmin):
-    model = Post
+class PostAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=edited_fields(form.changed_data))
+        else:
+            super().save_model(request, obj, form, change)
 
 
 class ResponseAdmin(TranslationAdmin):
     model = Response
 
 
-admin.site.register(Post)
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'available_at', 'last_error')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('kind', 'payload', 'attempts', 'claim', 'last_error', 'creation_date')
+    actions = ['retry_messages']
+
+    @admin.action(description=_('Retry selected messages now'))
+    def retry_messages(self, request, queryset):
+        count = queryset.update(status='pending', attempts=0, available_at=timezone.now(), claim='')
+        transaction.on_commit(kick_drain)
+        self.message_user(request, _('%d messages scheduled for delivery') % count)
+
+
+@admin.register(DeadOutboxMessage)
+class DeadOutboxMessageAdmin(OutboxMessageAdmin):
+    list_filter = ('kind',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(status='dead')
+
+
+@admin.register(DeliveryRun)
+class DeliveryRunAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'key', 'recipients', 'sent', 'failed', 'skipped', 'creation_date', 'updated_at')
+    list_filter = ('kind',)
+    readonly_fields = ('kind', 'key', 'recipients', 'sent', 'failed', 'skipped', 'creation_date', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(Post, PostAdmin)
 admin.site.register(Response)
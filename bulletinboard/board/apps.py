@@ -6,4 +6,4 @@ class BoardConfig(AppConfig):
     name = 'board'
 
     def ready(self):
-        from . import signals
\ No newline at end of file
+        from . import checks, signals
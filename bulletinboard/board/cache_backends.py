@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from functools import partial
+from time import monotonic
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+from django.utils.module_loading import import_string
+from redis.exceptions import RedisError
+
+
+class LocalTier:
+    """Bounded LRU of serialized cache values with a TTL per entry.
+
+    One tier is shared by all threads of a process, like the storage of
+    LocMemCache.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.pubsub = None
+        self.stats = {'local': {'hits': 0, 'misses': 0}, 'remote': {'hits': 0, 'misses': 0}}
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, timeout, generation=None):
+        with self.lock:
+            # A read-through that raced with an invalidation must not store the old value
+            if generation is not None and generation != self.generation:
+                return
+            if timeout <= 0:
+                self._data.pop(key, None)
+                return
+            self._data[key] = (monotonic() + timeout, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        with self.lock:
+            self.generation += 1
+            if keys is None:
+                self._data.clear()
+            else:
+                for key in keys:
+                    self._data.pop(key, None)
+
+    def record(self, tier, hit):
+        with self.lock:
+            self.stats[tier]['hits' if hit else 'misses'] += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+def get_local_tier(name, max_entries):
+    with _local_tiers_lock:
+        tier = _local_tiers.get(name)
+        # A forked worker must not share the parent's entries or pub/sub socket
+        if tier is None or tier.pid != os.getpid():
+            tier = _local_tiers[name] = LocalTier(max_entries)
+        return tier
+
+
+class TwoTierCacheClient(RedisCacheClient):
+    def __init__(self, servers, client_class=None, **options):
+        super().__init__(servers, **options)
+        if isinstance(client_class, str):
+            client_class = import_string(client_class)
+        if client_class is not None:
+            self._client = client_class
+
+    def loads(self, payload):
+        return self._serializer.loads(payload)
+
+    def get_with_ttl(self, key):
+        """(payload, milliseconds left in Redis or -1 without expiry), read in one round trip."""
+        pipeline = self.get_client(key).pipeline()
+        pipeline.get(key)
+        pipeline.pttl(key)
+        return tuple(pipeline.execute())
+
+    def mget_with_ttl(self, keys):
+        pipeline = self.get_client(None).pipeline()
+        pipeline.mget(keys)
+        for key in keys:
+            pipeline.pttl(key)
+        payloads, *ttls = pipeline.execute()
+        return list(zip(payloads, ttls))
+
+    def set(self, key, value, timeout):
+        client = self.get_client(key, write=True)
+        payload = self._serializer.dumps(value)
+        if timeout == 0:
+            client.delete(key)
+        else:
+            client.set(key, payload, ex=timeout)
+        return payload
+
+    def set_many(self, data, timeout):
+        client = self.get_client(None, write=True)
+        payloads = {key: self._serializer.dumps(value) for key, value in data.items()}
+        pipeline = client.pipeline()
+        pipeline.mset(payloads)
+        if timeout is not None:
+            for key in payloads:
+                pipeline.expire(key, timeout)
+        pipeline.execute()
+        return payloads
+
+
+class TwoTierCache(RedisCache):
+    """Redis cache with a bounded in-process LRU in front of it.
+
+    Reads are served from the local tier when possible. Writes go to Redis
+    and publish the changed keys on INVALIDATION_CHANNEL; every process drops
+    them from its local tier before its next cache operation. LOCAL_TIMEOUT
+    bounds how stale a local entry can get if an invalidation is lost.
+
+    OPTIONS: LOCAL_MAX_ENTRIES, LOCAL_TIMEOUT, INVALIDATION_CHANNEL and
+    CLIENT_CLASS (a redis.Redis compatible class, dotted path allowed); the
+    rest is passed to the Redis connection pool as for RedisCache.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        options = dict(self._options)
+        self.local_max_entries = int(options.pop('LOCAL_MAX_ENTRIES', 1000))
+        self.local_timeout = int(options.pop('LOCAL_TIMEOUT', 60))
+        self.channel = options.pop('INVALIDATION_CHANNEL', f'{self.key_prefix}cache-invalidation')
+        self._class = partial(TwoTierCacheClient, client_class=options.pop('CLIENT_CLASS', None))
+        self._options = options
+        self._tier_name = f'{server}|{self.channel}'
+        self._tier = get_local_tier(self._tier_name, self.local_max_entries)
+
+    @property
+    def tier(self):
+        if self._tier.pid != os.getpid():
+            self._tier = get_local_tier(self._tier_name, self.local_max_entries)
+        return self._tier
+
+    def get_stats(self):
+        tier = self.tier
+        with tier.lock:
+            stats = {name: dict(counts) for name, counts in tier.stats.items()}
+            stats['local']['entries'] = len(tier)
+        return stats
+
+    def _local_timeout(self, timeout):
+        return self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+
+    def _remaining_local_timeout(self, ttl):
+        # A local copy must expire no later than the entry in Redis
+        return self._local_timeout(None if ttl is None or ttl < 0 else ttl / 1000)
+
+    def _sync(self):
+        """Apply invalidations published by other processes and return the local tier."""
+        tier = self.tier
+        with tier.lock:
+            try:
+                if tier.pubsub is None:
+                    tier.pubsub = self._cache.get_client().pubsub(ignore_subscribe_messages=True)
+                    tier.pubsub.subscribe(self.channel)
+                    # Nothing published before the subscription can be trusted
+                    tier.invalidate()
+                while (message := tier.pubsub.get_message()) is not None:
+                    data = json.loads(message['data'])
+                    if data['origin'] != tier.origin:
+                        tier.invalidate(data['keys'])
+            except (RedisError, OSError):
+                tier.pubsub = None
+                tier.invalidate()
+        return tier
+
+    def _publish(self, tier, keys):
+        message = json.dumps({'origin': tier.origin, 'keys': keys})
+        self._cache.get_client(None, write=True).publish(self.channel, message)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        tier = self._sync()
+        payload = tier.get(key)
+        tier.record('local', payload is not None)
+        if payload is None:
+            generation = tier.generation
+            payload, ttl = self._cache.get_with_ttl(key)
+            tier.record('remote', payload is not None)
+            if payload is None:
+                return default
+            tier.set(key, payload, self._remaining_local_timeout(ttl), generation)
+        return self._cache.loads(payload)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        tier = self._sync()
+        found = {}
+        missing = []
+        for key in key_map:
+            payload = tier.get(key)
+            tier.record('local', payload is not None)
+            if payload is None:
+                missing.append(key)
+            else:
+                found[key] = payload
+        if missing:
+            generation = tier.generation
+            for key, (payload, ttl) in zip(missing, self._cache.mget_with_ttl(missing)):
+                tier.record('remote', payload is not None)
+                if payload is not None:
+                    tier.set(key, payload, self._remaining_local_timeout(ttl), generation)
+                    found[key] = payload
+        return {key_map[key]: self._cache.loads(payload) for key, payload in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        tier = self._sync()
+        return tier.get(key) is not None or self._cache.has_key(key)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self.get_backend_timeout(timeout)
+        tier = self._sync()
+        payload = self._cache.set(key, value, timeout)
+        tier.invalidate([key])
+        tier.set(key, payload, self._local_timeout(timeout))
+        self._publish(tier, [key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        data = {self.make_and_validate_key(key, version=version): value for key, value in data.items()}
+        timeout = self.get_backend_timeout(timeout)
+        tier = self._sync()
+        payloads = self._cache.set_many(data, timeout)
+        tier.invalidate(payloads)
+        for key, payload in payloads.items():
+            tier.set(key, payload, self._local_timeout(timeout))
+        self._publish(tier, list(payloads))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        tier = self._sync()
+        added = self._cache.add(key, value, self.get_backend_timeout(timeout))
+        if added:
+            tier.invalidate([key])
+            self._publish(tier, [key])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self.get_backend_timeout(timeout)
+        tier = self._sync()
+        touched = self._cache.touch(key, timeout)
+        if timeout == 0:
+            tier.invalidate([key])
+            self._publish(tier, [key])
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        tier = self._sync()
+        value = self._cache.incr(key, delta)
+        tier.invalidate([key])
+        self._publish(tier, [key])
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        tier = self._sync()
+        deleted = self._cache.delete(key)
+        tier.invalidate([key])
+        self._publish(tier, [key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        if not keys:
+            return
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        tier = self._sync()
+        self._cache.delete_many(keys)
+        tier.invalidate(keys)
+        self._publish(tier, keys)
+
+    def clear(self):
+        tier = self._sync()
+        cleared = self._cache.clear()
+        tier.invalidate()
+        self._publish(tier, None)
+        return cleared
@@ -0,0 +1,99 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import translation
+
+from .packing import POST_SCHEMA_VERSION, pack_post, unpack_post
+
+
+POST_CACHE_TIMEOUT = 60 * 60
+# how long a rebuild may hold the lock, and how long others wait for it
+BUILD_LOCK_TIMEOUT = 10
+BUILD_WAIT = 2
+BUILD_POLL_INTERVAL = 0.05
+
+_missing = object()
+
+
+def get_or_build(key, build, timeout):
+    """Cached value of key, built by a single caller on a miss.
+
+    The first caller to miss takes a lock (cache.add) and rebuilds; the
+    others poll for its result instead of hitting the database at once. If
+    the rebuild takes longer than BUILD_WAIT they build the value themselves.
+    Timeouts get up to 10% jitter so entries written together don't expire
+    together.
+    """
+    lock_key = f'{key}-lock'
+    deadline = time.monotonic() + BUILD_WAIT
+    while True:
+        value = cache.get(key, _missing)
+        if value is not _missing:
+            return value
+        if cache.add(lock_key, True, BUILD_LOCK_TIMEOUT):
+            try:
+                value = build()
+                cache.set(key, value, timeout + random.randint(0, timeout // 10))
+                return value
+            finally:
+                cache.delete(lock_key)
+        if time.monotonic() >= deadline:
+            return build()
+        time.sleep(BUILD_POLL_INTERVAL)
+
+
+def post_version_key(pk):
+    return f'posts-{pk}-version'
+
+
+def get_post_version(pk):
+    key = post_version_key(pk)
+    version = cache.get(key)
+    if version is None:
+        # Never restart from a fixed number: that could revive an old entry
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def post_cache_key(pk, version, language):
+    return f'posts-{pk}-v{version}-s{POST_SCHEMA_VERSION}-{language}'
+
+
+def get_cached_post(pk, load):
+    """Post pk from the cache under its current version, loaded by load() on a miss.
+
+    The cache holds a packed copy for the active language (see packing.py);
+    a cached post is rebuilt from it without touching the database.
+    """
+    loaded = []
+
+    def build():
+        loaded.append(load())
+        return pack_post(loaded[0])
+
+    key = post_cache_key(pk, get_post_version(pk), translation.get_language())
+    payload = get_or_build(key, build, POST_CACHE_TIMEOUT)
+    if loaded:
+        return loaded[0]
+    return unpack_post(payload) or load()
+
+
+def bump_post_versions(pks):
+    """Switch the posts to fresh cache keys; readers never see the old entries again.
+
+    Bumped right away and once more on commit, so a reader that loaded the
+    old row before the commit can't leave it under the new version.
+    """
+    pks = list(pks)
+    if not pks:
+        return
+
+    def bump():
+        version = time.time_ns()
+        cache.set_many({post_version_key(pk): version for pk in pks}, None)
+
+    bump()
+    transaction.on_commit(bump)
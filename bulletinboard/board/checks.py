@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_mail_rate_store(app_configs, **kwargs):
+    """Workers in separate containers can only share the send limit through Redis."""
+    rated = settings.MAIL_RATE_PER_SECOND or settings.MAIL_RATE_PER_HOUR
+    if settings.EMAIL_QUEUE == 'celery' and rated and not settings.MAIL_RATE_REDIS_URL:
+        return [Error(
+            'Mail rate limits are enabled, but MAIL_RATE_REDIS_URL is not set.',
+            hint='Set MAIL_RATE_REDIS_URL (or REDIS_HOST) so all workers share the limit, '
+                 'or disable the limits with MAIL_RATE_PER_SECOND = MAIL_RATE_PER_HOUR = 0.',
+            id='board.E001',
+        )]
+    return []
@@ -0,0 +1,46 @@
+"""Delivery runs and idempotency keys of the mail tasks.
+
+Board tasks store no results (CELERY_TASK_IGNORE_RESULT): nobody reads
+them, and a fan-out would leave a result key per task in Redis until it
+expires. Instead every fan-out adds its outcomes to the counters of a
+DeliveryRun row, which the admin lists.
+
+Work that may be handed out twice (an outbox message dispatched again
+because its row could not be deleted, a duplicated fan-out task) is marked
+done under an expiring idempotency key once it succeeded, and skipped
+while the key exists.
+"""
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DeliveryRun
+
+
+IDEMPOTENCY_TIMEOUT = 24 * 3600
+
+
+def idempotency_key(key):
+    return f'idempotency-{key}'
+
+
+def done(keys):
+    """The keys whose work was already marked done."""
+    found = cache.get_many([idempotency_key(key) for key in keys])
+    return {key for key in keys if idempotency_key(key) in found}
+
+
+def mark_done(keys, timeout=IDEMPOTENCY_TIMEOUT):
+    cache.set_many({idempotency_key(key): 1 for key in keys}, timeout)
+
+
+def start_run(kind, key, **counters):
+    """The run of the fan-out; a rerun of the same fan-out keeps counting into it."""
+    return DeliveryRun.objects.get_or_create(kind=kind, key=str(key), defaults=counters)[0]
+
+
+def count(kind, key, **outcomes):
+    """Add to the run's counters (recipients, sent, failed, skipped) in one UPDATE."""
+    outcomes = {name: F(name) + value for name, value in outcomes.items() if value}
+    if outcomes:
+        DeliveryRun.objects.filter(kind=kind, key=str(key)).update(**outcomes, updated_at=timezone.now())
@@ -1,14 +1,22 @@
-from django_filters import FilterSet, DateFilter, ModelMultipleChoiceFilter, CharFilter
+from django_filters import FilterSet, DateFilter, ModelMultipleChoiceFilter, CharFilter, OrderingFilter
 from django import forms
 from django.utils.translation import gettext_lazy as _
+from .forms import PostAutocompleteWidget
 from .models import Post, Category, Response, Profile
+from .search import search_posts
+
+
+class PostOrderingFilter(OrderingFilter):
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        # many posts share a counter value: the id keeps pages stable
+        return qs.order_by(*qs.query.order_by, '-id') if value else qs
 
 
 class PostFilter(FilterSet):
-    title = CharFilter(
-        field_name='title',
-        lookup_expr='icontains',
-        label=_('Title')
+    q = CharFilter(
+        method='filter_search',
+        label=_('Search')
     )
 
     category = ModelMultipleChoiceFilter(
@@ -24,15 +32,42 @@ class PostFilter(FilterSet):
         widget=forms.DateInput(attrs={'type': 'date'})
     )
 
+    ordering = PostOrderingFilter(
+        fields=(
+            ('creation_date', 'date'),
+            ('response_count', 'responses'),
+            ('pending_response_count', 'pending'),
+            ('accepted_response_count', 'accepted'),
+        ),
+        field_labels={
+            'creation_date': _('Publication date'),
+            'response_count': _('Responses'),
+            'pending_response_count': _('Pending responses'),
+            'accepted_response_count': _('Accepted responses'),
+        },
+        label=_('Ordering'),
+    )
+
     class Meta:
         model = Post
         fields = []
 
+    def filter_search(self, queryset, name, value):
+        return search_posts(queryset, value)
+
+
+def author_posts(request):
+    # only validates the selected posts: the widget loads the others on demand
+    if request is None:
+        return Post.objects.none()
+    return Post.objects.filter(author=request.profile)
+
 
 class ResponseFilter(FilterSet):
     post = ModelMultipleChoiceFilter(
         field_name='post',
-        queryset=Post.objects.all(),
+        queryset=author_posts,
+        widget=PostAutocompleteWidget,
         label=_('Post'),
     )
 
@@ -1,7 +1,9 @@
 from allauth.account.forms import SignupForm
 from django import forms
 from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
 from .models import Post, Profile, GENDER_CHOICES, Response
+from .moderation import MAX_RESPONSES, MODERATION_STATUSES
 from django.utils.translation import gettext_lazy as _
 from ckeditor.widgets import CKEditorWidget
 
@@ -110,4 +112,51 @@ class ResponseForm(forms.ModelForm):
         model = Response
         fields = [
             'text',
-        ]
\ No newline at end of file
+        ]
+
+
+class IdListField(forms.Field):
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [int(item) for item in value]
+        except (TypeError, ValueError):
+            raise ValidationError(_('Enter a list of ids'), code='invalid_list')
+
+
+class ResponseModerationForm(forms.Form):
+    status = forms.ChoiceField(choices=[(status, status) for status in MODERATION_STATUSES])
+    # ownership is checked by moderate(), in one query for all of them
+    responses = IdListField()
+
+    def clean_responses(self):
+        responses = self.cleaned_data['responses']
+        if len(responses) > MAX_RESPONSES:
+            raise ValidationError(_('At most %d responses at once') % MAX_RESPONSES)
+        return responses
+
+
+class PostAutocompleteWidget(forms.SelectMultiple):
+    """Renders only the selected posts, the others are looked up by title as the user types."""
+
+    class Media:
+        js = ('js/post_autocomplete.js',)
+
+    def __init__(self, attrs=None):
+        super().__init__({
+            'data-autocomplete-url': reverse_lazy('post_autocomplete'),
+            'data-placeholder': _('Search by title'),
+            **(attrs or {}),
+        })
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        ids = [item for item in value if str(item).isdigit()]
+        self.choices = [(post.pk, str(post)) for post in choices.queryset.filter(pk__in=ids)] if ids else []
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
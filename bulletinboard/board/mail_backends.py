@@ -0,0 +1,166 @@
+"""Email backend that hands messages to a worker instead of talking to SMTP.
+
+send_messages() only renders each message to MIME bytes plus its envelope
+and queues it: as a Celery task, or on a background thread of the current
+process with EMAIL_QUEUE = 'thread' (development without a worker). The
+worker sends exactly those bytes through QUEUED_EMAIL_BACKEND over a
+connection kept open between tasks.
+"""
+import base64
+import logging
+import os
+import queue
+import threading
+from email import message_from_bytes, policy
+from email.message import Message
+from time import monotonic
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import MIMEMixin, sanitize_address
+from django.utils.module_loading import import_string
+
+from . import mail_throttle
+from .mail_throttle import MailThrottled
+
+
+# an SMTP server drops idle connections, so an older one is reopened
+POOL_IDLE_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        payloads = [serialize(message) for message in email_messages if message.recipients()]
+        if not payloads:
+            return 0
+        try:
+            if settings.EMAIL_QUEUE == 'thread':
+                background_queue().put(payloads)
+            else:
+                from .tasks import send_queued_email
+                send_queued_email.delay(payloads)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+        return len(payloads)
+
+
+def serialize(message):
+    encoding = message.encoding or settings.DEFAULT_CHARSET
+    return {
+        'from_email': sanitize_address(message.from_email, encoding),
+        'recipients': [sanitize_address(address, encoding) for address in message.recipients()],
+        'mime': base64.b64encode(message.message().as_bytes(linesep='\r\n')).decode('ascii'),
+    }
+
+
+class RawMessage(MIMEMixin, Message):
+    pass
+
+
+class QueuedEmailMessage(EmailMessage):
+    """A queued message: sends the MIME bytes rendered in the web process as they are."""
+
+    def __init__(self, from_email, recipients, mime):
+        self.mime = base64.b64decode(mime)
+        parsed = message_from_bytes(self.mime, policy=policy.default)
+        body = parsed.get_body(('plain',))
+        super().__init__(
+            subject=parsed['Subject'] or '',
+            body=body.get_content() if body else '',
+            from_email=from_email,
+            to=recipients,
+        )
+
+    def message(self, *args, **kwargs):
+        return message_from_bytes(self.mime, _class=RawMessage)
+
+
+def is_queued(backend):
+    return issubclass(import_string(backend), QueuedEmailBackend)
+
+
+def get_delivery_connection(**kwargs):
+    """Connection that sends right away, even when EMAIL_BACKEND queues."""
+    backend = settings.EMAIL_BACKEND
+    if is_queued(backend):
+        backend = settings.QUEUED_EMAIL_BACKEND
+    return get_connection(backend, **kwargs)
+
+
+_pool = threading.local()
+
+
+def pooled_connection():
+    """This thread's open delivery connection, reused while it is not idle."""
+    connection = getattr(_pool, 'connection', None)
+    backend = settings.QUEUED_EMAIL_BACKEND
+    if connection is not None and (
+        _pool.backend != backend or monotonic() - _pool.last_used > POOL_IDLE_TIMEOUT
+    ):
+        close_pooled_connection()
+        connection = None
+    if connection is None:
+        connection = get_connection(backend)
+        connection.open()
+        _pool.connection, _pool.backend = connection, backend
+    _pool.last_used = monotonic()
+    return connection
+
+
+def close_pooled_connection():
+    connection = getattr(_pool, 'connection', None)
+    _pool.connection = None
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def deliver(payloads):
+    """Send serialized messages over the pooled connection; returns the failed ones."""
+    failed = []
+    for position, payload in enumerate(payloads):
+        try:
+            mail_throttle.acquire('transactional')
+        except MailThrottled as e:
+            logger.warning(f"{len(payloads) - position} queued emails postponed: {e}")
+            failed += payloads[position:]
+            break
+        try:
+            pooled_connection().send_messages([QueuedEmailMessage(**payload)])
+        except Exception as e:
+            logger.warning(f"Failed to send queued email to {payload['recipients']}: {e}")
+            # the connection may be broken: the next message opens a new one
+            close_pooled_connection()
+            failed.append(payload)
+    return failed
+
+
+_background = {'pid': None, 'queue': None}
+_background_lock = threading.Lock()
+
+
+def background_queue():
+    """Queue of this process's delivery thread, started on first use and after a fork."""
+    with _background_lock:
+        if _background['pid'] != os.getpid():
+            _background['queue'] = queue.Queue()
+            threading.Thread(target=deliver_forever, args=(_background['queue'],),
+                             name='queued-email', daemon=True).start()
+            _background['pid'] = os.getpid()
+        return _background['queue']
+
+
+def deliver_forever(payloads_queue):
+    while True:
+        payloads = payloads_queue.get()
+        try:
+            deliver(payloads)
+        finally:
+            payloads_queue.task_done()
@@ -0,0 +1,220 @@
+"""Send rate limit shared by every process that delivers mail.
+
+Each message is logged with its send time in two sliding windows kept in
+Redis (MAIL_RATE_REDIS_URL, the broker by default), so all workers count
+the same sends: no second may hold more than MAIL_RATE_PER_SECOND of them
+and no hour more than MAIL_RATE_PER_HOUR, wherever the second or hour
+starts. Bulk mail (new post notifications, weekly digests) may only fill
+MAIL_BULK_SHARE of each window; the rest is kept for transactional mail
+(login codes, confirmations, accepted responses), which therefore never
+waits behind a digest. A rate of 0 disables that window. Without Redis
+(development without a worker) the windows are kept in process memory and
+only limit that process.
+"""
+import os
+import uuid
+from collections import deque
+from threading import Lock
+from time import monotonic, sleep, time
+
+import redis
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from kombu.exceptions import ChannelError
+
+
+PRIORITIES = ('transactional', 'bulk')
+# how long a sender sleeps for a free slot before giving up with MailThrottled
+MAX_WAIT = 5
+HOUR = 3600
+
+
+class MailThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Mail rate limit reached, retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+def limits(priority):
+    share = 1 if priority == 'transactional' else settings.MAIL_BULK_SHARE
+    return [
+        (window, max(1, int(rate * share)))
+        for window, rate in ((1, settings.MAIL_RATE_PER_SECOND), (HOUR, settings.MAIL_RATE_PER_HOUR))
+        if rate
+    ]
+
+
+def window_key(window):
+    return f'mail-sent-{window}'
+
+
+_redis = {'pid': None, 'url': None, 'client': None}
+_local = LocMemCache('mail-throttle', {})
+_local_windows = {}
+_local_lock = Lock()
+
+
+def redis_client():
+    """This process's client of the shared windows, or None without MAIL_RATE_REDIS_URL."""
+    url = settings.MAIL_RATE_REDIS_URL
+    if not url:
+        return None
+    # a forked worker must not share the parent's sockets
+    if _redis['pid'] != os.getpid() or _redis['url'] != url:
+        _redis.update(pid=os.getpid(), url=url, client=redis.Redis.from_url(url))
+    return _redis['client']
+
+
+def incr(key, delta, timeout):
+    client = redis_client()
+    if client is None:
+        try:
+            return _local.incr(key, delta)
+        except ValueError:
+            _local.add(key, 0, timeout)
+            return _local.incr(key, delta)
+    # INCR is atomic, and EXPIRE in the same transaction never leaves a
+    # counter without a timeout
+    pipeline = client.pipeline()
+    pipeline.incr(key, delta)
+    pipeline.expire(key, timeout)
+    return pipeline.execute()[0]
+
+
+def get_counters(keys):
+    client = redis_client()
+    if client is None:
+        values = _local.get_many(keys)
+        return [values.get(key, 0) for key in keys]
+    return [int(value or 0) for value in client.mget(keys)]
+
+
+def take(priority):
+    """Take a send slot; returns 0, or the seconds until a full window frees one."""
+    windows = limits(priority)
+    if not windows:
+        return 0
+    client = redis_client()
+    if client is None:
+        return take_local(windows, time())
+    return take_shared(client, windows, time())
+
+
+def take_shared(client, windows, now):
+    # the send is logged in every window in one MULTI, and then checked:
+    # two senders racing for the last slot can both be refused, but never
+    # both let through
+    member = f'{now}:{uuid.uuid4().hex}'
+    pipeline = client.pipeline()
+    for window, limit in windows:
+        key = window_key(window)
+        pipeline.zremrangebyscore(key, '-inf', now - window)
+        pipeline.zadd(key, {member: now})
+        pipeline.zcard(key)
+        pipeline.expire(key, window)
+    counts = pipeline.execute()[2::4]
+    full = [(window, limit, count) for (window, limit), count in zip(windows, counts) if count > limit]
+    if not full:
+        return 0
+
+    # take the send back out of every window, so denied bulk senders don't
+    # eat into what is left for transactional mail, and find when the
+    # oldest sends in the way leave their windows
+    pipeline = client.pipeline()
+    for window, limit in windows:
+        pipeline.zrem(window_key(window), member)
+    for window, limit, count in full:
+        index = count - 1 - limit
+        pipeline.zrange(window_key(window), index, index, withscores=True)
+    oldest = pipeline.execute()[len(windows):]
+    retry_after = 0.001
+    for (window, limit, count), entry in zip(full, oldest):
+        if entry:
+            retry_after = max(retry_after, entry[0][1] + window - now)
+    return retry_after
+
+
+def take_local(windows, now):
+    with _local_lock:
+        retry_after = 0
+        for window, limit in windows:
+            sent = _local_windows.setdefault(window, deque())
+            while sent and sent[0] <= now - window:
+                sent.popleft()
+            if len(sent) >= limit:
+                retry_after = max(retry_after, sent[len(sent) - limit] + window - now, 0.001)
+        if retry_after:
+            return retry_after
+        for window, limit in windows:
+            _local_windows[window].append(now)
+        return 0
+
+
+def acquire(priority='bulk'):
+    """Wait for a send slot, up to MAX_WAIT seconds, or raise MailThrottled."""
+    started = monotonic()
+    slept = False
+    while retry_after := take(priority):
+        if monotonic() - started + retry_after > MAX_WAIT:
+            record(priority, 'throttled', 1)
+            raise MailThrottled(retry_after)
+        sleep(retry_after)
+        slept = True
+    if slept:
+        record(priority, 'waits', 1)
+        record(priority, 'wait_ms', int((monotonic() - started) * 1000))
+
+
+def stats_key(priority, name, slot):
+    return f'mail-stats-{priority}-{name}-{slot}'
+
+
+def record(priority, name, value):
+    incr(stats_key(priority, name, int(time() // HOUR)), value, HOUR * 2)
+
+
+def get_stats():
+    """Sends of the last hour, and waits of the current one, per priority."""
+    now = time()
+    hour = int(now // HOUR)
+    stats = {'sent_last_hour': sent_within(HOUR, now)}
+    for priority in PRIORITIES:
+        waits, wait_ms, throttled = get_counters(
+            [stats_key(priority, name, hour) for name in ('waits', 'wait_ms', 'throttled')]
+        )
+        stats[priority] = {
+            'waits': waits,
+            'average_wait_ms': wait_ms // waits if waits else 0,
+            'throttled': throttled,
+        }
+    return stats
+
+
+def sent_within(window, now):
+    """Sends logged in the window, counted only while its rate is enabled."""
+    client = redis_client()
+    if client is None:
+        with _local_lock:
+            return sum(1 for sent_at in _local_windows.get(window, ()) if sent_at > now - window)
+    return client.zcount(window_key(window), f'({now - window}', '+inf')
+
+
+def queue_depths():
+    """Messages waiting in each Celery queue that carries mail."""
+    from bulletinboard.celery import app
+
+    queues = {app.conf.task_default_queue,
+              *(route['queue'] for route in settings.CELERY_TASK_ROUTES.values())}
+    with app.connection_for_read() as connection:
+        return {name: queue_depth(connection, name) for name in sorted(queues)}
+
+
+def queue_depth(connection, name):
+    channel = connection.channel()
+    try:
+        return channel.queue_declare(queue=name, passive=True).message_count
+    except ChannelError:
+        # the Redis transport deletes a queue's list once it is empty
+        return 0
+    finally:
+        channel.close()
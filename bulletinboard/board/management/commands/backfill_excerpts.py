@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from modeltranslation.utils import get_translation_fields
+
+from board.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Fills the stored plain-text excerpts of existing posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        excerpt_fields = get_translation_fields('excerpt')
+        posts = Post.objects.only('id', *get_translation_fields('text')).order_by('id')
+        batch = []
+        updated = 0
+        for post in posts.iterator(chunk_size=batch_size):
+            post.update_excerpts()
+            batch.append(post)
+            if len(batch) >= batch_size:
+                Post.objects.bulk_update(batch, excerpt_fields)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Post.objects.bulk_update(batch, excerpt_fields)
+            updated += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Updated excerpts of {updated} posts'))
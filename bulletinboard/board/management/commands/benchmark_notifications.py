@@ -0,0 +1,199 @@
+import base64
+import json
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+from kombu.serialization import dumps
+
+from board.mail_backends import get_delivery_connection
+from board.models import Category, Post, Profile
+from board.notifications import personalize, render_personalized, render_post_notification
+from board.tasks import build_post_notification, send_post_notification_batch
+from bulletinboard.celery import app as celery_app
+
+
+def broker_bytes(task_name, args):
+    """Size of a task message as the Redis transport stores it in the queue."""
+    message = celery_app.amqp.as_task_v2(str(uuid.uuid4()), task_name, args=args)
+    content_type, encoding, body = dumps(message.body, serializer='json')
+    return len(json.dumps({
+        'body': base64.b64encode(body.encode()).decode(),
+        'content-encoding': encoding,
+        'content-type': content_type,
+        'headers': message.headers,
+        'properties': message.properties,
+    }, default=str))
+
+
+class SimulatedSMTPBackend(locmem.EmailBackend):
+    """Locmem backend that pays a fixed cost per connection, like an SMTP handshake.
+
+    As with the SMTP backend, send_messages() on a closed connection opens
+    one just for that call.
+    """
+    connect_seconds = 0
+    connections = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = False
+
+    def open(self):
+        if self.opened:
+            return False
+        type(self).connections += 1
+        time.sleep(self.connect_seconds)
+        self.opened = True
+        return True
+
+    def close(self):
+        self.opened = False
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+class Command(BaseCommand):
+    help = ('Measures new post notification rendering, per recipient versus once per post, '
+            'the broker memory of a fan-out, and throughput: one message per task versus '
+            'batches over one connection. '
+            'Messages go to the locmem outbox; the post is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--connect-ms', type=float, default=5,
+                            help='Simulated cost of opening a connection')
+        parser.add_argument('--text-length', type=int, default=20_000,
+                            help='Length of the post text rendered into the notification')
+
+    def handle(self, *args, **options):
+        recipients = [(f'user{n}@example.com', f'user{n}') for n in range(options['recipients'])]
+        batch_size = options['batch_size']
+        self._compare_rendering(recipients, options['text_length'])
+        self._compare_broker_size(recipients, batch_size, options['text_length'])
+        SimulatedSMTPBackend.connect_seconds = options['connect_ms'] / 1000
+        backend = f'{SimulatedSMTPBackend.__module__}.{SimulatedSMTPBackend.__name__}'
+        # without the send rate limit: this measures the senders themselves
+        with transaction.atomic(), override_settings(
+            EMAIL_BACKEND=backend, MAIL_RATE_PER_SECOND=0, MAIL_RATE_PER_HOUR=0
+        ):
+            post = self._create_post(options['text_length'])
+            post_url = post.get_absolute_url_with_domain()
+            recipient_ids = self._create_recipients(recipients)
+
+            def one_by_one():
+                # what the task queued per subscriber did: render the template
+                # and open a connection for one message
+                for email, username in recipients:
+                    rendered = render_personalized('post_created.html', {
+                        'post_title': post.title, 'post_text': post.text, 'post_url': post_url,
+                    })
+                    build_post_notification(email, username, post.title, rendered,
+                                            get_delivery_connection()).send()
+
+            def batched():
+                for start in range(0, len(recipient_ids), batch_size):
+                    send_post_notification_batch.apply(args=(post.pk, recipient_ids[start:start + batch_size]))
+
+            for name, run in (('one per task', one_by_one), (f'batches of {batch_size}', batched)):
+                mail.outbox = []
+                SimulatedSMTPBackend.connections = 0
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{name:>16}: {len(mail.outbox) / elapsed:8.0f} messages/s, '
+                    f'{SimulatedSMTPBackend.connections} connections'
+                )
+            transaction.set_rollback(True)
+
+    def _compare_broker_size(self, recipients, batch_size, text_length):
+        text = self._post_text(text_length)
+        post_url = 'https://example.com/posts/1'
+        batches = [recipients[start:start + batch_size] for start in range(0, len(recipients), batch_size)]
+        contracts = {
+            # the signal used to queue every subscriber with a copy of the post,
+            # and that task queued one message per subscriber in turn
+            'dict per subscriber': (
+                broker_bytes('board.tasks.send_bulk_post_notifications', ([
+                    {'email': email, 'username': username, 'post_title': 'New post',
+                     'post_text': text, 'post_url': post_url}
+                    for email, username in recipients
+                ],))
+                + sum(broker_bytes('board.tasks.send_new_post_notification',
+                                   (email, username, 'New post', text, post_url))
+                      for email, username in recipients),
+                1 + len(recipients),
+            ),
+            'address batches': (
+                sum(broker_bytes(send_post_notification_batch.name, (1, [list(pair) for pair in batch]))
+                    for batch in batches),
+                len(batches),
+            ),
+            'id batches': (
+                sum(broker_bytes(send_post_notification_batch.name,
+                                 (1, list(range(start, start + len(batch)))))
+                    for start, batch in zip(range(0, len(recipients), batch_size), batches)),
+                len(batches),
+            ),
+        }
+        self.stdout.write(f'Broker memory of a fan-out to {len(recipients)} subscribers '
+                          f'({text_length} characters of text):')
+        for name, (size, messages) in contracts.items():
+            self.stdout.write(f'{name:>20}: {size / 1024:10.1f} KiB in {messages} messages')
+
+    def _compare_rendering(self, recipients, text_length):
+        with transaction.atomic():
+            post = self._create_post(text_length)
+            post_url = post.get_absolute_url_with_domain()
+
+            started = time.perf_counter()
+            for email, username in recipients:
+                render_to_string('post_created.html', {
+                    'post_title': post.title, 'post_text': post.text,
+                    'username': username, 'post_url': post_url,
+                })
+            per_recipient = time.perf_counter() - started
+
+            started = time.perf_counter()
+            rendered = render_post_notification(post)
+            for email, username in recipients:
+                personalize(rendered, username)
+            once = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'Rendering for {len(recipients)} recipients ({text_length} characters of text): '
+            f'per recipient {per_recipient * 1000:.0f} ms, once per post {once * 1000:.1f} ms'
+        )
+
+    def _create_post(self, text_length):
+        user = User.objects.create(username='benchmark-notifications')
+        profile = Profile.objects.create(user=user)
+        category = Category.objects.create(name='tank')
+        text = self._post_text(text_length)
+        return Post.objects.create(author=profile, category=category,
+                                   title_ru='Новый пост', title_en_us='New post',
+                                   text_ru=text, text_en_us=text)
+
+    def _post_text(self, text_length):
+        return '<p>' + ('Lorem ipsum dolor sit amet. ' * (text_length // 28 + 1))[:text_length] + '</p>'
+
+    def _create_recipients(self, recipients):
+        users = User.objects.bulk_create(
+            User(username=f'benchmark-{username}', email=email) for email, username in recipients
+        )
+        return [user.pk for user in users]
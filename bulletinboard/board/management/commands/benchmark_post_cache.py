@@ -0,0 +1,57 @@
+import pickle
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from board.models import Category, Post, Profile
+from board.packing import pack_post, unpack_post
+
+
+class Command(BaseCommand):
+    help = ('Compares the size and decode time of the packed post cache entries with '
+            'pickled Post instances. Generated posts are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--text-length', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._populate(options['posts'], options['text_length'])
+            posts = list(Post.objects.select_related('author__user', 'category'))
+            pickles = [pickle.dumps(post, pickle.HIGHEST_PROTOCOL) for post in posts]
+            packed = [pack_post(post) for post in posts]
+            transaction.set_rollback(True)
+
+        for name, payloads, decode in (
+            ('pickle', pickles, pickle.loads),
+            ('packed', packed, unpack_post),
+        ):
+            sizes = [len(payload) for payload in payloads]
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                for payload in payloads:
+                    decode(payload)
+                timings.append((time.perf_counter() - started) / len(payloads))
+            self.stdout.write(
+                f'{name}: {statistics.mean(sizes):8.0f} bytes per post, '
+                f'{statistics.median(timings) * 1_000_000:8.1f} us to decode'
+            )
+
+    def _populate(self, count, text_length):
+        user = User.objects.create(username='benchmark-post-cache')
+        profile = Profile.objects.create(user=user)
+        category = Category.objects.create(name='tank')
+        text = '<p>' + ('Lorem ipsum dolor sit amet. ' * (text_length // 28 + 1))[:text_length] + '</p>'
+        Post.objects.bulk_create([
+            Post(author=profile, category=category,
+                 title_ru=f'Пост {number}', title_en_us=f'Post {number}',
+                 text_ru=text, text_en_us=text)
+            for number in range(count)
+        ])
+        self.stdout.write(f'Generated {count} posts')
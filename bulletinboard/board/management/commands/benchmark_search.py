@@ -0,0 +1,77 @@
+import random
+import statistics
+import string
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from board.models import Category, Post, Profile
+from board.search import is_supported, rebuild_index, search_posts
+
+
+class Command(BaseCommand):
+    help = ('Compares the full-text search index with the old title__icontains filter '
+            'on generated posts. All generated data is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError('Full-text search index is only available on SQLite')
+        rnd = random.Random(options['seed'])
+        vocabulary = [
+            ''.join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 9)))
+            for _ in range(5000)
+        ]
+        with transaction.atomic():
+            self._populate(rnd, vocabulary, options['posts'])
+            started = time.perf_counter()
+            rebuild_index()
+            self.stdout.write(f'Index built in {time.perf_counter() - started:.2f}s')
+            # frequent, average and rare words
+            for term in (vocabulary[0], vocabulary[2500], vocabulary[-1]):
+                old = self._measure(options['repeat'], lambda: Post.objects.filter(
+                    title__icontains=term).order_by('-creation_date'))
+                new = self._measure(options['repeat'], lambda: search_posts(
+                    Post.objects.all(), term))
+                self.stdout.write(
+                    f'{term:>10}: icontains {old[0] * 1000:8.2f} ms ({old[1]} hits), '
+                    f'fts {new[0] * 1000:8.2f} ms ({new[1]} hits)'
+                )
+            transaction.set_rollback(True)
+
+    def _populate(self, rnd, vocabulary, count):
+        user = User.objects.create(username='benchmark-search')
+        profile = Profile.objects.create(user=user)
+        category = Category.objects.create(name='tank')
+        # Zipf-like word distribution, so terms differ in selectivity
+        weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+        batch = []
+        for _ in range(count):
+            title = ' '.join(rnd.choices(vocabulary, weights, k=5)).capitalize()
+            text = '<p>' + ' '.join(rnd.choices(vocabulary, weights, k=60)) + '</p>'
+            batch.append(Post(
+                author=profile, category=category,
+                title_ru=title, title_en_us=title, text_ru=text, text_en_us=text,
+            ))
+            if len(batch) == 5000:
+                Post.objects.bulk_create(batch)
+                batch = []
+        Post.objects.bulk_create(batch)
+        self.stdout.write(f'Generated {count} posts')
+
+    def _measure(self, repeat, make_queryset):
+        timings = []
+        hits = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = make_queryset()
+            hits = queryset.count()
+            list(queryset[:10])
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), hits
@@ -0,0 +1,126 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from board.models import POST_CATEGORIES, Category, CategoryUser, DigestDelivery, Post, Profile
+from board.notifications import personalize
+from board.tasks import digest_period, digest_window, render_weekly_posts, send_weekly_posts, weekly_posts
+from bulletinboard.celery import app as celery_app
+
+
+class CountingBackend(BaseEmailBackend):
+    """Builds every message like a real backend would, then drops it."""
+    connections = 0
+    messages = 0
+
+    def open(self):
+        type(self).connections += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            message.message().as_bytes()
+        type(self).messages += len(messages)
+        return len(messages)
+
+
+class Command(BaseCommand):
+    help = ('Runs send_weekly_posts on generated categories and subscribers with a backend '
+            'that discards the mail, and compares rendering the digest per subscriber with '
+            'rendering it once per category. All generated data is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--subscribers', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=20, help='Posts per category this week')
+        parser.add_argument('--sample', type=int, default=1000,
+                            help='Subscribers used to compare personalization costs')
+
+    def handle(self, *args, **options):
+        backend = f'{CountingBackend.__module__}.{CountingBackend.__name__}'
+        # without the send rate limit: this measures the senders themselves
+        with transaction.atomic(), override_settings(
+            EMAIL_BACKEND=backend, MAIL_RATE_PER_SECOND=0, MAIL_RATE_PER_HOUR=0
+        ):
+            categories = self._populate(options['categories'], options['subscribers'], options['posts'])
+            self._compare_personalization(categories[0], options['sample'])
+
+            CountingBackend.connections = CountingBackend.messages = 0
+            # shards run in this process, inside the rolled back transaction
+            celery_app.conf.task_always_eager = True
+            started = time.perf_counter()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    send_weekly_posts()
+            finally:
+                celery_app.conf.task_always_eager = False
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'send_weekly_posts: {CountingBackend.messages} messages in {elapsed:.1f}s '
+                f'({CountingBackend.messages / elapsed:.0f}/s), {len(queries)} queries, '
+                f'{CountingBackend.connections} connections, '
+                f'{DigestDelivery.objects.count()} deliveries recorded'
+            )
+            transaction.set_rollback(True)
+
+    def _populate(self, category_count, subscriber_count, posts_per_category):
+        started = time.perf_counter()
+        password = make_password(None)
+        users = User.objects.bulk_create(
+            [User(username=f'weekly{n}', email=f'weekly{n}@example.com', password=password)
+             for n in range(subscriber_count)],
+            batch_size=5000,
+        )
+        author = Profile.objects.create(user=users[0])
+        codes = [code for code, name in POST_CATEGORIES]
+        categories = Category.objects.bulk_create(
+            [Category(name=codes[n % len(codes)]) for n in range(category_count)]
+        )
+        for category in categories:
+            CategoryUser.objects.bulk_create(
+                [CategoryUser(category=category, user=user) for user in users], batch_size=5000
+            )
+            Post.objects.bulk_create([
+                Post(author=author, category=category,
+                     title_ru=f'Пост {n}', title_en_us=f'Post {n}',
+                     text_ru='<p>Text</p>', text_en_us='<p>Text</p>',
+                     excerpt_ru='Text', excerpt_en_us='Text')
+                for n in range(posts_per_category)
+            ])
+        # the digest covers the week before this Monday
+        Post.objects.filter(author=author).update(creation_date=digest_window(digest_period())[1] - timedelta(days=1))
+        self.stdout.write(
+            f'Generated {category_count} categories x {subscriber_count} subscribers '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+        return categories
+
+    def _compare_personalization(self, category, sample):
+        week_ago, period_end = digest_window(digest_period())
+        posts = list(weekly_posts(week_ago, period_end).filter(category=category))
+        usernames = [f'weekly{n}' for n in range(sample)]
+
+        started = time.perf_counter()
+        for username in usernames:
+            render_to_string('weekly_postsletter.html', {
+                'username': username, 'category': category, 'posts': posts, 'week_ago': week_ago,
+            })
+        per_render = (time.perf_counter() - started) / sample
+
+        started = time.perf_counter()
+        rendered = render_weekly_posts(category, posts, week_ago)
+        for username in usernames:
+            personalize(rendered, username)
+        per_substitution = (time.perf_counter() - started) / sample
+
+        self.stdout.write(
+            f'Personalization per message: render {per_render * 1_000_000:.0f} us, '
+            f'render once + substitute {per_substitution * 1_000_000:.1f} us'
+        )
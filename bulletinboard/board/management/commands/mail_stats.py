@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from board.mail_throttle import PRIORITIES, get_stats, queue_depths
+from board.models import OutboxMessage
+
+
+class Command(BaseCommand):
+    help = 'Shows mail queue depths, outbox size and mail sent in the last hour and send rate limit waits'
+
+    def handle(self, *args, **options):
+        try:
+            for name, depth in queue_depths().items():
+                self.stdout.write(f'queue {name}: {depth} tasks')
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'Broker unavailable: {e}'))
+
+        outbox = dict(OutboxMessage.objects.values_list('status').annotate(Count('id')))
+        self.stdout.write(f"outbox: {outbox.get('pending', 0)} pending, {outbox.get('dead', 0)} dead")
+
+        stats = get_stats()
+        self.stdout.write(f"sent in the last hour: {stats['sent_last_hour']}")
+        for priority in PRIORITIES:
+            self.stdout.write(
+                f"{priority}: {stats[priority]['waits']} waits, "
+                f"{stats[priority]['average_wait_ms']} ms average wait, "
+                f"{stats[priority]['throttled']} postponed"
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from board.search import is_supported, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not is_supported(options['database']):
+            raise CommandError('Full-text search index is only available on SQLite')
+        indexed = rebuild_index(batch_size=options['batch_size'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} posts'))
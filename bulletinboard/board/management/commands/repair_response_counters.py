@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from board.models import Post
+from board.response_counters import repair
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the response counters of posts from their responses, in id ranges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+        repaired = 0
+        for first_id in range(1, last_id + 1, batch_size):
+            with transaction.atomic():
+                repaired += len(repair(Post.objects.filter(id__gte=first_id, id__lt=first_id + batch_size)))
+        self.stdout.write(self.style.SUCCESS(f'Repaired response counters of {repaired} posts'))
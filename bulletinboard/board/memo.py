@@ -0,0 +1,56 @@
+from functools import cached_property
+
+from .profiles import get_profile
+from .roles import get_group_names
+from .subscriptions import category_bit, get_subscription_mask
+
+
+class RequestMemo:
+    """Lookups about the current request resolved at most once.
+
+    Views and template filters share it through ``request_memo(request)``,
+    so the viewer's profile, roles and subscriptions cost one query each
+    no matter how often they are checked while rendering.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        self._posts = {}
+
+    @property
+    def profile(self):
+        return get_profile(self.user)
+
+    @property
+    def group_names(self):
+        return get_group_names(self.user)
+
+    @property
+    def is_admin(self):
+        return 'admin' in self.group_names
+
+    @property
+    def is_author(self):
+        return 'authors' in self.group_names
+
+    @cached_property
+    def subscription_mask(self):
+        if not self.user.is_authenticated:
+            return 0
+        return get_subscription_mask(self.user.pk)
+
+    def is_subscribed(self, category):
+        return bool(self.subscription_mask & category_bit(category.pk))
+
+    def get_post(self, pk, load):
+        if pk not in self._posts:
+            self._posts[pk] = load()
+        return self._posts[pk]
+
+
+def request_memo(request):
+    memo = getattr(request, '_board_memo', None)
+    if memo is None:
+        memo = request._board_memo = RequestMemo(request)
+    return memo
@@ -1,6 +1,9 @@
 import pytz
 
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .profiles import get_profile
 
 
 class TimezoneMiddleware:
@@ -13,4 +16,15 @@ class TimezoneMiddleware:
             timezone.activate(pytz.timezone(tzname))
         else:
             timezone.deactivate()
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
+
+
+class ProfileMiddleware:
+    """Attaches the user's profile as a lazily loaded ``request.profile``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
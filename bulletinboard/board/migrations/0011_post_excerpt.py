@@ -0,0 +1,49 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+from board.utils import html_to_text
+
+
+EXCERPT_COLUMNS = {'text': 'excerpt', 'text_en_us': 'excerpt_en_us', 'text_ru': 'excerpt_ru'}
+
+
+def fill_excerpts(apps, schema_editor):
+    Post = apps.get_model('board', 'Post')
+    length = Post._meta.get_field('excerpt').max_length
+    posts = Post.objects.only('id', *EXCERPT_COLUMNS).order_by('id')
+    batch = []
+    for post in posts.iterator(chunk_size=500):
+        for text_field, excerpt_field in EXCERPT_COLUMNS.items():
+            setattr(post, excerpt_field, html_to_text(getattr(post, text_field))[:length])
+        batch.append(post)
+        if len(batch) == 500:
+            Post.objects.bulk_update(batch, EXCERPT_COLUMNS.values())
+            batch = []
+    Post.objects.bulk_update(batch, EXCERPT_COLUMNS.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0010_remove_category_name_en_us_remove_category_name_ru_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_en_us',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_ru',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    CategoryUser = apps.get_model('board', 'CategoryUser')
+    keep_ids = CategoryUser.objects.values('category', 'user').annotate(keep_id=Min('id')).values('keep_id')
+    CategoryUser.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0011_post_excerpt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['creation_date'], name='board_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', 'creation_date'], name='board_post_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'creation_date'], name='board_post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['post', 'creation_date'], name='board_resp_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['post', 'user', 'creation_date'], name='board_resp_post_user_date_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='categoryuser',
+            constraint=models.UniqueConstraint(fields=('category', 'user'), name='board_categoryuser_unique'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-18 19:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0013_digestdelivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post_created', 'New post'), ('response_accepted', 'Response accepted')], max_length=20)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('dead', 'Dead')], default='pending', max_length=7)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claim', models.CharField(blank=True, max_length=32)),
+                ('last_error', models.TextField(blank=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='board_outbox_due_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeadOutboxMessage',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'dead letter',
+                'verbose_name_plural': 'dead letters',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('board.outboxmessage',),
+        ),
+    ]
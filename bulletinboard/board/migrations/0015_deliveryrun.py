@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0014_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post_notifications', 'New post notifications'), ('weekly_digest', 'Weekly digest')], max_length=20)),
+                ('key', models.CharField(max_length=40)),
+                ('recipients', models.PositiveIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0)),
+                ('creation_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-creation_date'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='board_deliveryrun_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:24
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_responses(apps, schema_editor):
+    Post = apps.get_model('board', 'Post')
+    Response = apps.get_model('board', 'Response')
+
+    def count(**filters):
+        responses = Response.objects.filter(post=OuterRef('pk'), **filters).order_by().values('post')
+        return Coalesce(
+            Subquery(responses.annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0
+        )
+
+    Post.objects.update(
+        response_count=count(),
+        accepted_response_count=count(status='accepted'),
+        rejected_response_count=count(status='rejected'),
+        pending_response_count=count(status='in anticipation'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0015_deliveryrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='accepted_response_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='pending_response_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rejected_response_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='response_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['response_count', 'id'], name='board_post_responses_idx'),
+        ),
+        migrations.RunPython(count_responses, migrations.RunPython.noop),
+    ]
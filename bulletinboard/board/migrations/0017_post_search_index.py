@@ -0,0 +1,42 @@
+from django.db import migrations
+
+from board.utils import html_to_text
+
+
+# Title columns come first: search.RANK_WEIGHTS gives bm25() weights in column order.
+# IF NOT EXISTS adopts the table that older versions created after migrate.
+CREATE_SEARCH_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS board_post_fts USING fts5("
+    "title_en_us, title_ru, text_en_us, text_ru, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+DROP_SEARCH_INDEX = "DROP TABLE IF EXISTS board_post_fts"
+
+
+def index_posts(apps, schema_editor):
+    Post = apps.get_model('board', 'Post')
+    posts = Post.objects.using(schema_editor.connection.alias).values_list(
+        'id', 'title_en_us', 'title_ru', 'text_en_us', 'text_ru'
+    ).order_by('id')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM board_post_fts")
+        cursor.executemany(
+            "INSERT INTO board_post_fts (rowid, title_en_us, title_ru, text_en_us, text_ru) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [
+                (pk, title_en_us or '', title_ru or '', html_to_text(text_en_us), html_to_text(text_ru))
+                for pk, title_en_us, title_ru, text_en_us, text_ru in posts.iterator(chunk_size=1000)
+            ],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0016_post_response_counters'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEARCH_INDEX, DROP_SEARCH_INDEX),
+        migrations.RunPython(index_posts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
 from ckeditor_uploader.fields import RichTextUploadingField
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from modeltranslation.utils import get_translation_fields
+
+from .utils import html_to_text
 
 
 POST_CATEGORIES = [
@@ -23,6 +27,27 @@ GENDER_CHOICES = [
     ('female', _('Female')),
 ]
 
+EXCERPT_LENGTH = 200
+
+RESPONSE_COUNTER_FIELDS = (
+    'response_count', 'accepted_response_count', 'rejected_response_count', 'pending_response_count',
+)
+
+OUTBOX_KINDS = [
+    ('post_created', _('New post')),
+    ('response_accepted', _('Response accepted')),
+]
+
+OUTBOX_STATUS_CHOICES = [
+    ('pending', _('Pending')),
+    ('dead', _('Dead')),
+]
+
+DELIVERY_RUN_KINDS = [
+    ('post_notifications', _('New post notifications')),
+    ('weekly_digest', _('Weekly digest')),
+]
+
 STATUS_CHOICES = [
     ('accepted', _('Accepted')),
     ('in anticipation', _('In anticipation')),
@@ -56,6 +81,37 @@ class Post(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     title = models.CharField(max_length=100)
     text = RichTextUploadingField()
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False)
+    # Maintained by F() updates when responses change, see board.response_counters
+    response_count = models.PositiveIntegerField(default=0, editable=False)
+    accepted_response_count = models.PositiveIntegerField(default=0, editable=False)
+    rejected_response_count = models.PositiveIntegerField(default=0, editable=False)
+    pending_response_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['creation_date'], name='board_post_date_idx'),
+            models.Index(fields=['response_count', 'id'], name='board_post_responses_idx'),
+            models.Index(fields=['category', 'creation_date'], name='board_post_category_date_idx'),
+            models.Index(fields=['author', 'creation_date'], name='board_post_author_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        excerpt_fields = self.update_excerpts()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & {'text', *get_translation_fields('text')}:
+            kwargs['update_fields'] = {*update_fields, *excerpt_fields}
+        # post_save receivers write the outbox in the same transaction as the post
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def update_excerpts(self):
+        # Plain-text beginning of the text in every language, so lists and
+        # digests don't have to load and strip the whole rich-text body
+        excerpt_fields = get_translation_fields('excerpt')
+        for text_field, excerpt_field in zip(get_translation_fields('text'), excerpt_fields):
+            setattr(self, excerpt_field, html_to_text(getattr(self, text_field))[:EXCERPT_LENGTH])
+        return excerpt_fields
 
     def get_absolute_url(self):
         return reverse('post_detail', args=[str(self.id)])
@@ -76,7 +132,95 @@ class Response(models.Model):
     text = models.TextField()
     status = models.CharField(choices=STATUS_CHOICES, max_length=15, default='in anticipation')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'creation_date'], name='board_resp_post_date_idx'),
+            models.Index(fields=['post', 'user', 'creation_date'], name='board_resp_post_user_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # pre_save and post_save receivers update the post's counters in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
 class CategoryUser(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
\ No newline at end of file
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'user'], name='board_categoryuser_unique'),
+        ]
+
+
+class DigestDelivery(models.Model):
+    """Weekly digest delivered to a subscriber, one row per digest period and category."""
+    # local date of the Monday the digest period ends on
+    period = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'category', 'user'], name='board_digestdelivery_unique'),
+        ]
+
+
+class OutboxMessage(models.Model):
+    """Notification to send, written in the same transaction as the change that causes it.
+
+    Delivered messages are deleted; see board.outbox.
+    """
+    kind = models.CharField(max_length=20, choices=OUTBOX_KINDS)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(choices=OUTBOX_STATUS_CHOICES, max_length=7, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    creation_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='board_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.payload}'
+
+
+class DeadOutboxMessage(OutboxMessage):
+    """Outbox messages that ran out of attempts, for the admin."""
+
+    class Meta:
+        proxy = True
+        verbose_name = _('dead letter')
+        verbose_name_plural = _('dead letters')
+
+
+class DeliveryRun(models.Model):
+    """Delivery counters of one mail fan-out: a new post's notifications or a weekly digest.
+
+    Mail tasks store no results and add their outcomes here; see board.delivery.
+    """
+    kind = models.CharField(max_length=20, choices=DELIVERY_RUN_KINDS)
+    # the post id, or the digest period
+    key = models.CharField(max_length=40)
+    recipients = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # recipients deleted before their message was sent
+    skipped = models.PositiveIntegerField(default=0)
+    creation_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-creation_date']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='board_deliveryrun_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.key}'
@@ -0,0 +1,51 @@
+"""Accepting or rejecting many responses at once.
+
+One query locks the responses and checks that they all answer posts of
+the moderator (admins may moderate any), one UPDATE sets the status, the
+post counters get one F() update per post, and the acceptance emails are
+written to the outbox with one INSERT, for drain_outbox to send over one
+connection.
+"""
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.utils.translation import gettext as _
+from modeltranslation.utils import get_translation_fields
+
+from . import outbox
+from .models import Response
+from .response_counters import change_status_counts
+from .roles import is_admin
+
+
+MODERATION_STATUSES = ('accepted', 'rejected')
+# responses moderated by one request
+MAX_RESPONSES = 500
+
+
+def moderate(user, response_ids, status):
+    """Set the status of the responses; returns the ids of the ones whose status changed.
+
+    Raises PermissionDenied unless every response exists and the user may moderate it.
+    """
+    response_ids = set(response_ids)
+    status_fields = get_translation_fields('status')
+    with transaction.atomic():
+        # status is translated: the base column is the one the counters follow
+        responses = Response.objects.rewrite(False).select_for_update().filter(pk__in=response_ids)
+        if not is_admin(user):
+            responses = responses.filter(post__author__user=user)
+        rows = list(responses.values_list('id', 'post_id', 'status', *status_fields))
+        if len(rows) != len(response_ids):
+            raise PermissionDenied(_("Only post author can moderate responses"))
+
+        # the per-language columns may disagree with the base one, all of them are set
+        stale = [row[0] for row in rows if any(value != status for value in row[2:])]
+        if stale:
+            Response.objects.rewrite(False).filter(pk__in=stale).update(
+                status=status, **dict.fromkeys(status_fields, status)
+            )
+        changed = [row[:3] for row in rows if row[2] != status]
+        change_status_counts([(post_id, old_status) for pk, post_id, old_status in changed], status)
+        if status == 'accepted':
+            outbox.enqueue_many('response_accepted', [{'response_id': pk} for pk, post_id, old_status in changed])
+    return [pk for pk, post_id, old_status in changed]
@@ -0,0 +1,57 @@
+"""Notification emails rendered once and personalized per recipient.
+
+The recipient's username is the only part of a notification that differs
+between messages, so the template is rendered once with a unique
+placeholder in its place, and each message only substitutes the escaped
+username. New post notifications are also cached per post version and
+language, so every batch of a fan-out reuses one rendering, and each worker
+process keeps the latest ones in memory in front of the shared cache.
+"""
+import uuid
+
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.translation import get_language
+
+from .cache_backends import get_local_tier
+from .caching import POST_CACHE_TIMEOUT, get_or_build, get_post_version
+
+
+# rendered notifications kept by each worker process
+LOCAL_CACHE_ENTRIES = 32
+
+
+def render_personalized(template_name, context):
+    """(placeholder, html) of the template rendered with a placeholder for the username."""
+    placeholder = f'username-{uuid.uuid4().hex}'
+    return placeholder, render_to_string(template_name, {**context, 'username': placeholder})
+
+
+def personalize(rendered, username):
+    placeholder, html_content = rendered
+    # the template escapes the username, so the substitution must too
+    return html_content.replace(placeholder, escape(username))
+
+
+def post_notification_key(pk):
+    return f'post-notification-{pk}-v{get_post_version(pk)}-{get_language()}'
+
+
+def render_post_notification(post):
+    """post_created.html for the post, rendered once per post version and language."""
+    key = post_notification_key(post.pk)
+    # the key changes with the post version, so a local entry is never stale
+    local = get_local_tier('post-notifications', LOCAL_CACHE_ENTRIES)
+    rendered = local.get(key)
+    if rendered is None:
+        rendered = get_or_build(
+            key,
+            lambda: render_personalized('post_created.html', {
+                'post_title': post.title,
+                'post_text': post.text,
+                'post_url': post.get_absolute_url_with_domain(),
+            }),
+            POST_CACHE_TIMEOUT,
+        )
+        local.set(key, rendered, POST_CACHE_TIMEOUT)
+    return rendered
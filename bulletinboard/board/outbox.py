@@ -0,0 +1,129 @@
+"""Transactional outbox for outgoing notifications.
+
+A notification is an OutboxMessage row written in the same transaction as
+the change that causes it, so it exists exactly when the change was
+committed and the request never waits for Redis or SMTP. drain_outbox
+claims due rows in batches, hands each kind to its handler and deletes
+the delivered rows. Failed rows are retried with exponential backoff and
+become dead letters, listed in the admin, after OUTBOX_MAX_ATTEMPTS.
+A delivered message is marked done under an idempotency key before its row
+is deleted, so it is not delivered again if the deletion fails.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from itertools import groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import delivery
+from .models import OutboxMessage
+
+
+# a claimed row is due again if its worker dies before finishing it
+CLAIM_TIMEOUT = timedelta(minutes=10)
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(kind, using=None, **payload):
+    """Add a message to the outbox of the current transaction."""
+    message = OutboxMessage.objects.using(using).create(kind=kind, payload=payload)
+    transaction.on_commit(kick_drain, using=using)
+    return message
+
+
+def enqueue_many(kind, payloads, using=None):
+    """Add messages of one kind to the outbox of the current transaction, in one INSERT."""
+    messages = OutboxMessage.objects.using(using).bulk_create(
+        [OutboxMessage(kind=kind, payload=payload) for payload in payloads]
+    )
+    if messages:
+        transaction.on_commit(kick_drain, using=using)
+    return messages
+
+
+def kick_drain():
+    # Only saves latency: the periodic drain delivers whatever this misses
+    from .tasks import drain_outbox
+    try:
+        drain_outbox.delay()
+    except Exception as e:
+        logger.warning(f"Could not start the outbox drain: {e}")
+
+
+def claim(limit):
+    """Due messages, at most limit, reserved for this worker for CLAIM_TIMEOUT.
+
+    The claim is a single UPDATE ... WHERE id IN (SELECT ... LIMIT), so
+    concurrent drains never get the same rows.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = OutboxMessage.objects.filter(status='pending', available_at__lte=now)
+    batch = due.order_by('available_at', 'id').values('id')[:limit]
+    if not due.filter(id__in=batch).update(claim=token, available_at=now + CLAIM_TIMEOUT):
+        return []
+    return list(OutboxMessage.objects.filter(claim=token).order_by('kind', 'id'))
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def retry_later(message, error):
+    message.attempts += 1
+    message.last_error = str(error) or type(error).__name__
+    message.claim = ''
+    if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        message.status = 'dead'
+        logger.error(f"Outbox message {message.pk} ({message.kind}) is dead after "
+                     f"{message.attempts} attempts: {message.last_error}")
+    else:
+        message.available_at = timezone.now() + backoff(message.attempts)
+    message.save(update_fields=['attempts', 'last_error', 'claim', 'status', 'available_at'])
+
+
+def idempotency_key(message):
+    return f'outbox-{message.pk}'
+
+
+def drain(handlers, batch_size):
+    """Deliver due messages until none are left.
+
+    handlers maps a kind to a function taking that kind's messages and
+    returning (message, error) pairs for the failed ones. Returns the
+    number of delivered and failed messages.
+    """
+    delivered = failed = 0
+    while messages := claim(batch_size):
+        failures = []
+        already_done = delivery.done([idempotency_key(message) for message in messages])
+        pending = [message for message in messages if idempotency_key(message) not in already_done]
+        for kind, group in groupby(pending, key=attrgetter('kind')):
+            group = list(group)
+            handler = handlers.get(kind)
+            try:
+                if handler is None:
+                    raise LookupError(f'No outbox handler for {kind}')
+                failures += handler(group)
+            except Exception as e:
+                failures += [(message, e) for message in group]
+
+        failed_ids = {message.pk for message, error in failures}
+        delivery.mark_done([idempotency_key(message) for message in pending if message.pk not in failed_ids])
+        OutboxMessage.objects.filter(
+            claim=messages[0].claim
+        ).exclude(pk__in=failed_ids).delete()
+        for message, error in failures:
+            retry_later(message, error)
+        delivered += len(messages) - len(failed_ids)
+        failed += len(failed_ids)
+        if len(messages) < batch_size:
+            break
+    return delivered, failed
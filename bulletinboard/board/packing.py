@@ -0,0 +1,94 @@
+"""Compact cache encoding of posts for the detail page.
+
+Only the fields post.html and PostDetail read are kept, for one language:
+a fixed struct header followed by length-prefixed UTF-8 strings. The
+payload starts with POST_SCHEMA_VERSION, which is also part of the cache
+key, so workers running different code during a deploy never decode each
+other's entries. Unlike pickles, payloads don't depend on model state.
+"""
+import struct
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.base import ModelState
+from django.utils.translation import get_language
+from modeltranslation.utils import build_localized_fieldname
+
+from .models import RESPONSE_COUNTER_FIELDS, Category, Post, Profile
+
+
+POST_SCHEMA_VERSION = 2
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# schema, post id, creation date (microseconds since epoch), category id,
+# profile id, user id, the four response counters, then byte lengths of
+# title, text, category name, username
+POST_HEADER = struct.Struct('<BQqQQQIIIIIIII')
+
+
+def pack_post(post):
+    strings = [
+        (value or '').encode()
+        for value in (post.title, post.text, post.category.name, post.author.user.username)
+    ]
+    creation_date = post.creation_date - EPOCH
+    header = POST_HEADER.pack(
+        POST_SCHEMA_VERSION,
+        post.pk,
+        (creation_date.days * 86400 + creation_date.seconds) * 1_000_000 + creation_date.microseconds,
+        post.category_id,
+        post.author_id,
+        post.author.user_id,
+        *(getattr(post, field) for field in RESPONSE_COUNTER_FIELDS),
+        *map(len, strings),
+    )
+    return header + b''.join(strings)
+
+
+def unpack_post(payload):
+    """Post with its category and author user, or None for another schema version."""
+    if not payload or payload[0] != POST_SCHEMA_VERSION:
+        return None
+    (_, pk, creation_date, category_id, profile_id, user_id,
+     *counters_and_lengths) = POST_HEADER.unpack_from(payload)
+    counters = counters_and_lengths[:len(RESPONSE_COUNTER_FIELDS)]
+    lengths = counters_and_lengths[len(RESPONSE_COUNTER_FIELDS):]
+    strings = []
+    offset = POST_HEADER.size
+    for length in lengths:
+        strings.append(payload[offset:offset + length].decode())
+        offset += length
+    title, text, category_name, username = strings
+
+    language = get_language()
+    user = restore(User, id=user_id, username=username)
+    profile = restore(Profile, {'user': user}, id=profile_id, user_id=user_id)
+    category = restore(Category, id=category_id, name=category_name)
+    return restore(
+        Post, {'author': profile, 'category': category},
+        id=pk,
+        creation_date=EPOCH + timedelta(microseconds=creation_date),
+        category_id=category_id,
+        author_id=profile_id,
+        **dict(zip(RESPONSE_COUNTER_FIELDS, counters)),
+        # the payload is per language: these are the active language's columns
+        **{build_localized_fieldname('title', language): title,
+           build_localized_fieldname('text', language): text},
+    )
+
+
+def restore(model, related=None, **values):
+    """Instance as if loaded from the database, built the way unpickling does.
+
+    Skips Model.__init__; fields missing from values stay deferred and are
+    loaded on access.
+    """
+    obj = model.__new__(model)
+    obj._state = ModelState()
+    obj._state.adding = False
+    obj._state.db = DEFAULT_DB_ALIAS
+    obj.__dict__.update(values)
+    if related:
+        obj._state.fields_cache.update(related)
+    return obj
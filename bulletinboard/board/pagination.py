@@ -0,0 +1,207 @@
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response as ApiResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+KEYSET_ORDERING = ('-creation_date', '-id')
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def encode_cursor(obj, reverse=False):
+    value = f"{'p' if reverse else 'n'}|{obj.creation_date.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direction, creation_date, pk = value.split('|')
+        creation_date = parse_datetime(creation_date)
+        pk = int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    if direction not in ('n', 'p') or creation_date is None:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return direction == 'p', creation_date, pk
+
+
+def is_keyset_ordered(queryset):
+    """Keyset pagination only fits querysets ordered by (creation_date, id) or not at all."""
+    return not queryset.query.order_by or tuple(queryset.query.order_by) == KEYSET_ORDERING
+
+
+class KeysetPage:
+    """Page of a keyset-paginated queryset.
+
+    The page is found by seeking past the (creation_date, id) of the previous
+    page's edge row, so it costs the same at any depth. The total count is only
+    computed on request.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def paginate_keyset(queryset, cursor, page_size, with_count=False):
+    count = queryset.order_by().count() if with_count else None
+    if not cursor:
+        rows = list(queryset.order_by(*KEYSET_ORDERING)[:page_size + 1])
+        next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return KeysetPage(rows[:page_size], next_cursor=next_cursor, count=count)
+
+    reverse, creation_date, pk = decode_cursor(cursor)
+    if not reverse:
+        rows = list(queryset.filter(
+            Q(creation_date__lt=creation_date) | Q(creation_date=creation_date, id__lt=pk)
+        ).order_by(*KEYSET_ORDERING)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1]) if has_more else None,
+            previous_cursor=encode_cursor(rows[0], reverse=True) if rows else None,
+            count=count,
+        )
+
+    # Going back: walk in ascending order from the cursor, then flip the page
+    rows = list(queryset.filter(
+        Q(creation_date__gt=creation_date) | Q(creation_date=creation_date, id__gt=pk)
+    ).order_by('creation_date', 'id')[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size][::-1]
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if rows else None,
+        previous_cursor=encode_cursor(rows[0], reverse=True) if has_more else None,
+        count=count,
+    )
+
+
+class KeysetPaginationMixin:
+    """ListView mixin paginating by cursor unless a page number is requested.
+
+    ``?page=N`` keeps the old numbered pagination, ``?count=1`` adds the total
+    count to the cursor page.
+    """
+    cursor_kwarg = 'cursor'
+    count_kwarg = 'count'
+
+    def use_keyset_pagination(self, queryset):
+        return self.page_kwarg not in self.request.GET and is_keyset_ordered(queryset)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination(queryset):
+            return super().paginate_queryset(queryset, page_size)
+        with_count = self.request.GET.get(self.count_kwarg, '').lower() in TRUE_VALUES
+        try:
+            page = paginate_keyset(
+                queryset, self.request.GET.get(self.cursor_kwarg), page_size, with_count
+            )
+        except ValueError:
+            raise Http404(_('Invalid cursor'))
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = isinstance(context.get('page_obj'), KeysetPage)
+        return context
+
+
+class KeysetPagination(BasePagination):
+    """API pagination by (creation_date, id) cursor.
+
+    Requests with ``offset`` and querysets ordered some other way (e.g. by
+    search rank) fall back to limit/offset pagination.
+    """
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if 'offset' in request.query_params or not is_keyset_ordered(queryset):
+            self.fallback = LimitOffsetPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+        self.fallback = None
+        with_count = request.query_params.get(self.count_query_param, '').lower() in TRUE_VALUES
+        try:
+            self.page = paginate_keyset(
+                queryset, request.query_params.get(self.cursor_query_param),
+                self.get_page_size(request), with_count,
+            )
+        except ValueError:
+            raise NotFound(_('Invalid cursor'))
+        return list(self.page)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        payload = OrderedDict()
+        if self.page.count is not None:
+            payload['count'] = self.page.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return ApiResponse(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Profile
+
+
+PROFILE_CACHE_TIMEOUT = 60 * 60
+
+
+def profile_cache_key(user_id):
+    return f'profiles-{user_id}'
+
+
+def get_profile(user):
+    """The user's profile, created if missing.
+
+    Loaded at most once per user object (i.e. per request) and shared across
+    requests through the cache until the profile is saved or deleted.
+    """
+    if not user.is_authenticated:
+        return None
+    profile = getattr(user, '_board_profile', None)
+    if profile is None:
+        key = profile_cache_key(user.pk)
+        profile = cache.get(key)
+        if profile is None:
+            profile, created = Profile.objects.get_or_create(user=user)
+            # a created profile holds the user it was created for: the
+            # cache must not get the user's row with its password hash
+            profile._state.fields_cache.pop('user', None)
+            cache.set(key, profile, PROFILE_CACHE_TIMEOUT)
+        # the cached copy carries no user, reuse the one we already have
+        profile.user = user
+        user._board_profile = profile
+    return profile
+
+
+def invalidate_profile(user_id):
+    """Drop the cached profile right away and once more on commit.
+
+    A request between the save and the commit still reads the old row and
+    caches it again; the second delete removes it.
+    """
+    key = profile_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,117 @@
+"""Response counters stored on Post.
+
+Every post keeps how many responses it has and how many of them are
+accepted, rejected or pending, so pages and the API show them, and lists
+sort by them, without querying Response. Receivers in signals.py adjust
+them with F() updates in the transaction that creates, changes or deletes
+a response; repair_response_counters recomputes them from the responses.
+
+Response.status is a translated field. The counters follow its base
+column, which holds the status last set in any language.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from modeltranslation.fields import TranslationField
+
+from .caching import bump_post_versions
+from .models import RESPONSE_COUNTER_FIELDS, Post, Response
+
+
+STATUS_COUNTERS = {
+    'accepted': 'accepted_response_count',
+    'rejected': 'rejected_response_count',
+    'in anticipation': 'pending_response_count',
+}
+
+
+def counted_status(response):
+    # the descriptor would return the active language's column
+    return response.__dict__['status']
+
+
+def status_deltas(old_status=None, new_status=None):
+    deltas = dict.fromkeys(RESPONSE_COUNTER_FIELDS, 0)
+    if old_status is None:
+        deltas['response_count'] += 1
+    else:
+        deltas[STATUS_COUNTERS[old_status]] -= 1
+    if new_status is None:
+        deltas['response_count'] -= 1
+    else:
+        deltas[STATUS_COUNTERS[new_status]] += 1
+    return deltas
+
+
+def change_counts(post_id, old_status=None, new_status=None, using=None):
+    """Count a response created (no old status), deleted (no new status) or moved between statuses."""
+    update_counts({post_id: status_deltas(old_status, new_status)}, using)
+
+
+def change_status_counts(changes, new_status, using=None):
+    """Count responses moved to new_status, given as (post_id, old_status) pairs."""
+    deltas_by_post = {}
+    for post_id, old_status in changes:
+        deltas = deltas_by_post.setdefault(post_id, dict.fromkeys(RESPONSE_COUNTER_FIELDS, 0))
+        for field, delta in status_deltas(old_status, new_status).items():
+            deltas[field] += delta
+    update_counts(deltas_by_post, using)
+
+
+def update_counts(deltas_by_post, using=None):
+    """Apply counter deltas with one UPDATE per post."""
+    for post_id, deltas in deltas_by_post.items():
+        updates = {
+            # a counter that drifted must not fail the change by going below zero
+            name: F(name) + delta if delta > 0 else Greatest(F(name) + delta, 0)
+            for name, delta in deltas.items() if delta
+        }
+        if updates:
+            Post.objects.using(using).filter(pk=post_id).update(**updates)
+    # the detail page cache holds the counters
+    bump_post_versions(deltas_by_post)
+
+
+def edited_fields(names):
+    """The columns to save for an edit of the given Post fields.
+
+    save() writes every column, so counters loaded before a response
+    changed would overwrite the F() updates made since. An edited
+    translation saves its base column too, as a full save would.
+    """
+    fields = set(names)
+    for name in names:
+        field = Post._meta.get_field(name)
+        if isinstance(field, TranslationField):
+            fields.add(field.translated_field.name)
+    return fields
+
+
+def actual_counts():
+    """Annotations with each post's counters computed from its responses."""
+    def count(**filters):
+        responses = Response.objects.rewrite(False).filter(
+            post=OuterRef('pk'), **filters
+        ).order_by().values('post')
+        return Coalesce(
+            Subquery(responses.annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0
+        )
+
+    return {
+        'actual_response_count': count(),
+        **{f'actual_{field}': count(status=status) for status, field in STATUS_COUNTERS.items()},
+    }
+
+
+def repair(posts):
+    """Recompute the counters of the posts that drifted; returns their ids."""
+    drifted = posts.annotate(**actual_counts()).filter(
+        Q(*[~Q(**{field: F(f'actual_{field}')}) for field in RESPONSE_COUNTER_FIELDS], _connector=Q.OR)
+    )
+    ids = list(drifted.values_list('pk', flat=True))
+    if ids:
+        annotations = actual_counts()
+        Post.objects.filter(pk__in=ids).update(
+            **{field: annotations[f'actual_{field}'] for field in RESPONSE_COUNTER_FIELDS}
+        )
+        bump_post_versions(ids)
+    return ids
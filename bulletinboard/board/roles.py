@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.db import transaction
+
+
+ROLES_CACHE_TIMEOUT = 60 * 60
+
+
+def roles_cache_key(user_id):
+    return f'user-groups-{user_id}'
+
+
+def get_group_names(user):
+    """Names of the user's groups.
+
+    Loaded at most once per user object (i.e. per request) and shared across
+    requests through the cache until the user's group membership changes.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, '_board_group_names', None)
+    if names is None:
+        key = roles_cache_key(user.pk)
+        names = cache.get(key)
+        if names is None:
+            names = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, names, ROLES_CACHE_TIMEOUT)
+        user._board_group_names = names
+    return names
+
+
+def is_admin(user):
+    return 'admin' in get_group_names(user)
+
+
+def is_author(user):
+    return 'authors' in get_group_names(user)
+
+
+def invalidate_roles(user_ids):
+    """Drop the cached group names right away and once more on commit.
+
+    A request between the change and the commit still sees the old
+    membership and caches it again; the second delete removes it.
+    """
+    keys = [roles_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
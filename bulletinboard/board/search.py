@@ -0,0 +1,94 @@
+import re
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from modeltranslation.utils import get_translation_fields
+
+from .models import Post
+from .utils import html_to_text
+
+
+# created by migration 0017_post_search_index
+SEARCH_TABLE = 'board_post_fts'
+TITLE_COLUMNS = tuple(get_translation_fields('title'))
+TEXT_COLUMNS = tuple(get_translation_fields('text'))
+SEARCH_COLUMNS = TITLE_COLUMNS + TEXT_COLUMNS
+# bm25() weights in column order: a hit in the title outranks a hit in the text
+RANK_WEIGHTS = (10.0,) * len(TITLE_COLUMNS) + (1.0,) * len(TEXT_COLUMNS)
+INSERT_SQL = (
+    f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+    f"VALUES (%s{', %s' * len(SEARCH_COLUMNS)})"
+)
+
+
+def is_supported(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite'
+
+
+def _document(post):
+    return (
+        [getattr(post, column) or '' for column in TITLE_COLUMNS]
+        + [html_to_text(getattr(post, column)) for column in TEXT_COLUMNS]
+    )
+
+
+def index_post(post, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [post.pk])
+        cursor.execute(INSERT_SQL, [post.pk] + _document(post))
+
+
+def remove_post(post_id, using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [post_id])
+
+
+def rebuild_index(batch_size=1000, using=DEFAULT_DB_ALIAS):
+    posts = Post.objects.using(using).only('id', *SEARCH_COLUMNS).order_by('id')
+    indexed = 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        batch = []
+        for post in posts.iterator(chunk_size=batch_size):
+            batch.append([post.pk] + _document(post))
+            if len(batch) >= batch_size:
+                cursor.executemany(INSERT_SQL, batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(INSERT_SQL, batch)
+            indexed += len(batch)
+    return indexed
+
+
+def build_match_query(query, columns=None):
+    # User input is never passed to MATCH as is: every word becomes a quoted
+    # prefix term, so FTS5 operators and syntax errors can't leak through.
+    terms = re.findall(r'\w+', query or '')
+    if not terms:
+        return None
+    match = ' '.join(f'"{term}"*' for term in terms)
+    if columns:
+        # a column filter keeps the match in the given columns only
+        return f"{{{' '.join(columns)}}} : ({match})"
+    return match
+
+
+def search_posts(queryset, query, columns=None):
+    match = build_match_query(query, columns)
+    if match is None:
+        return queryset
+    # A join lets FTS5 drive the query: a correlated bm25() subquery per row
+    # would re-run the MATCH for every hit.
+    post_table = Post._meta.db_table
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f'{SEARCH_TABLE}.rowid = {post_table}.id', f'{SEARCH_TABLE} MATCH %s'],
+        params=[match],
+        select={'search_rank': f'bm25({SEARCH_TABLE}, {weights})'},
+    ).order_by('search_rank', '-creation_date')
+
+
+def search_titles(queryset, query):
+    """Posts whose title has words starting with every word of the query."""
+    return search_posts(queryset, query, TITLE_COLUMNS)
@@ -1,5 +1,7 @@
 from .models import *
 from rest_framework import serializers
+from .moderation import MAX_RESPONSES, MODERATION_STATUSES
+from .response_counters import edited_fields
 
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
@@ -22,10 +24,30 @@ class CategorySerializer(serializers.HyperlinkedModelSerializer):
 class PostSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Post
-        fields = ['id', 'author', 'creation_date', 'category', 'title', 'text']
+        fields = ['id', 'author', 'creation_date', 'category', 'title', 'text', *RESPONSE_COUNTER_FIELDS]
+
+    def update(self, instance, validated_data):
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        instance.save(update_fields=edited_fields(validated_data))
+        # the response shows the counters as they are now, not as loaded
+        instance.refresh_from_db(fields=RESPONSE_COUNTER_FIELDS)
+        return instance
+
+
+class PostListSerializer(serializers.HyperlinkedModelSerializer):
+    class Meta:
+        model = Post
+        fields = ['id', 'author', 'creation_date', 'category', 'title', 'excerpt', *RESPONSE_COUNTER_FIELDS]
 
 
 class ResponseSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Response
-        fields = ['id', 'post', 'creation_date', 'user', 'text']
\ No newline at end of file
+        fields = ['id', 'post', 'creation_date', 'user', 'text']
+
+
+class ResponseModerationSerializer(serializers.Serializer):
+    responses = serializers.ListField(child=serializers.IntegerField(), allow_empty=False,
+                                      max_length=MAX_RESPONSES)
+    status = serializers.ChoiceField(choices=MODERATION_STATUSES)
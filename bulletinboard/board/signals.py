@@ -1,33 +1,144 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group, User
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Post
-from .tasks import send_bulk_post_notifications
-import logging
-
-logger = logging.getLogger(__name__)
+from . import outbox
+from .caching import bump_post_versions
+from .models import Category, CategoryUser, Post, Profile, Response
+from .response_counters import change_counts, counted_status
+from .profiles import invalidate_profile
+from .roles import invalidate_roles
+from .subscriptions import invalidate_subscriptions
+from .search import index_post, remove_post
 
 
 @receiver(post_save, sender=Post)
-def notify_subscribers(sender, instance, created, **kwargs):
+def notify_subscribers(sender, instance, created, using, **kwargs):
+    # Only the id is stored; subscribers are resolved by the worker once the
+    # post is committed and visible to it
     if created:
-        try:
-            category = instance.category
-            subscribers_dict = {}
-            for subscriber in category.subscribers.all():
-                if subscriber.email not in subscribers_dict:
-                    subscribers_dict[subscriber.email] = {
-                        'email': subscriber.email,
-                        'username': subscriber.username,
-                        'post_title': instance.title,
-                        'post_text': instance.text,
-                        'post_url': instance.get_absolute_url_with_domain()
-                    }
-            notifications_data = list(subscribers_dict.values())
-            if notifications_data:
-                try:
-                    send_bulk_post_notifications.delay(notifications_data)
-                except Exception as e:
-                    logger.error(f"Celery task failed: {e}")
-                    send_bulk_post_notifications(notifications_data)
-        except Exception as e:
-            logger.error(f"Error in notify_subscribers: {e}")
+        outbox.enqueue('post_created', using=using, post_id=instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, using, **kwargs):
+    index_post(instance, using=using)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, using, **kwargs):
+    remove_post(instance.pk, using=using)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_roles([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_roles(instance.user_set.values_list('id', flat=True))
+    else:
+        invalidate_roles(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_of_group_members(sender, instance, **kwargs):
+    if instance.pk:
+        invalidate_roles(instance.user_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Category.subscribers.through)
+def invalidate_subscriptions_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_subscriptions([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_subscriptions(instance.subscribers.values_list('id', flat=True))
+    else:
+        invalidate_subscriptions(pk_set)
+
+
+@receiver(post_save, sender=CategoryUser)
+@receiver(post_delete, sender=CategoryUser)
+def invalidate_subscriptions_of_user(sender, instance, **kwargs):
+    invalidate_subscriptions([instance.user_id])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_cached_post(sender, instance, **kwargs):
+    bump_post_versions([instance.pk])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def bump_cached_posts_of_author(sender, instance, **kwargs):
+    bump_post_versions(Post.objects.filter(author_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def bump_cached_posts_of_user(sender, instance, created, update_fields, **kwargs):
+    # logins only touch last_login, which posts don't show
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    bump_post_versions(Post.objects.filter(author__user_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_cached_posts_of_category(sender, instance, **kwargs):
+    bump_post_versions(Post.objects.filter(category_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=Response)
+def remember_counted_response(sender, instance, using, raw, **kwargs):
+    # Locked, so concurrent status changes of one response are counted once each
+    instance._saved_row = None
+    if not raw and not instance._state.adding:
+        instance._saved_row = Response.objects.using(using).rewrite(False).select_for_update().filter(
+            pk=instance.pk
+        ).values_list('post_id', 'status').first()
+
+
+@receiver(post_save, sender=Response)
+def count_saved_response(sender, instance, using, raw, **kwargs):
+    if raw:
+        return
+    counted = getattr(instance, '_saved_row', None)
+    status = counted_status(instance)
+    if counted is None:
+        change_counts(instance.post_id, new_status=status, using=using)
+    elif counted[0] != instance.post_id:
+        change_counts(counted[0], old_status=counted[1], using=using)
+        change_counts(instance.post_id, new_status=status, using=using)
+    elif counted[1] != status:
+        change_counts(instance.post_id, old_status=counted[1], new_status=status, using=using)
+
+
+@receiver(pre_delete, sender=Response)
+def remember_deleted_response(sender, instance, using, origin=None, **kwargs):
+    # Responses deleted by a cascade or a queryset were just loaded; one
+    # deleted by itself may have been loaded before its status changed
+    instance._deleted_row = None
+    if origin is instance:
+        instance._deleted_row = Response.objects.using(using).rewrite(False).select_for_update().filter(
+            pk=instance.pk
+        ).values_list('post_id', 'status').first()
+
+
+@receiver(post_delete, sender=Response)
+def count_deleted_response(sender, instance, using, origin=None, **kwargs):
+    # the post is being deleted along with its responses
+    if isinstance(origin, Post) or isinstance(origin, QuerySet) and origin.model is Post:
+        return
+    post_id, status = getattr(instance, '_deleted_row', None) or (instance.post_id, counted_status(instance))
+    change_counts(post_id, old_status=status, using=using)
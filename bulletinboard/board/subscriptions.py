@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CategoryUser
+
+
+SUBSCRIPTIONS_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def subscriptions_cache_key(user_id):
+    return f'subscriptions-{user_id}'
+
+
+def category_bit(category_id):
+    # There are only a handful of categories, so a user's subscriptions fit
+    # into one small int with a bit per category id.
+    return 1 << category_id
+
+
+def get_subscription_masks(user_ids):
+    """Subscription bitmasks of many users: one cache round trip plus one query for misses."""
+    user_ids = set(user_ids)
+    keys = {subscriptions_cache_key(user_id): user_id for user_id in user_ids}
+    masks = {keys[key]: mask for key, mask in cache.get_many(keys).items()}
+    missing = user_ids - masks.keys()
+    if missing:
+        loaded = defaultdict(int)
+        for user_id, category_id in CategoryUser.objects.filter(
+                user_id__in=missing).values_list('user_id', 'category_id'):
+            loaded[user_id] |= category_bit(category_id)
+        loaded = {user_id: loaded[user_id] for user_id in missing}
+        cache.set_many(
+            {subscriptions_cache_key(user_id): mask for user_id, mask in loaded.items()},
+            SUBSCRIPTIONS_CACHE_TIMEOUT,
+        )
+        masks.update(loaded)
+    return masks
+
+
+def get_subscription_mask(user_id):
+    return get_subscription_masks([user_id])[user_id]
+
+
+def mask_category_ids(mask):
+    category_ids = []
+    category_id = 0
+    while mask:
+        if mask & 1:
+            category_ids.append(category_id)
+        mask >>= 1
+        category_id += 1
+    return category_ids
+
+
+def is_subscribed(user_id, category_id):
+    return bool(get_subscription_mask(user_id) & category_bit(category_id))
+
+
+def subscribed_user_ids(user_ids, category_id):
+    """Which of the given users are subscribed to the category."""
+    bit = category_bit(category_id)
+    return {user_id for user_id, mask in get_subscription_masks(user_ids).items() if mask & bit}
+
+
+def invalidate_subscriptions(user_ids):
+    """Drop the cached masks right away and once more on commit.
+
+    A reader between the change and the commit still sees the old rows and
+    caches the old mask; the second delete removes it.
+    """
+    keys = [subscriptions_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
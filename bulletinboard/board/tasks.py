@@ -1,81 +1,361 @@
+import logging
 import os
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from operator import attrgetter
 
 from celery import shared_task
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from celery.exceptions import MaxRetriesExceededError
+from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.conf import settings
-from datetime import datetime, timedelta
+from django.contrib.auth.models import User
+from django.db.models import Exists, Max, Min, OuterRef
+from django.utils import timezone
 from django.utils.translation import gettext as _
-from .models import Post, Category
+from modeltranslation.utils import get_translation_fields
+from . import delivery, mail_throttle, outbox
+from .mail_backends import deliver, get_delivery_connection
+from .mail_throttle import MailThrottled
+from .models import Category, CategoryUser, DigestDelivery, Post, Response
+from .notifications import personalize, render_personalized, render_post_notification
 
 
-@shared_task
-def send_new_post_notification(email, username, post_title, post_text, post_url):
-    html_content = render_to_string('post_created.html', {
-        'post_title': post_title,
-        'post_text': post_text,
-        'username': username,
-        'post_url': post_url
-    })
+SUBSCRIBERS_CHUNK_SIZE = 2000
+# weeks of digest deliveries kept before the ledger is pruned
+DIGEST_LEDGER_WEEKS = 4
+
+logger = logging.getLogger(__name__)
+
 
+def build_post_notification(email, username, post_title, rendered, connection=None):
+    """Message for one recipient from the post_created.html rendered for the post."""
     msg = EmailMultiAlternatives(
         subject=post_title,
         body=_(f'Hello, {username}. New post in your favorite section!'),
         from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[email]
+        to=[email],
+        connection=connection,
     )
-    msg.attach_alternative(html_content, "text/html")
-    msg.send()
+    msg.attach_alternative(personalize(rendered, username), "text/html")
+    return msg
 
-    return f"Email sent to {email}"
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_post_notification_batch(self, post_id, recipient_ids):
+    """Notify a batch of subscribers, given by user id, over one SMTP connection.
+
+    The task message carries only ids: the worker loads the post and the
+    recipients, one query each, and reuses the rendered notification.
+    Recipients whose message failed are retried as a smaller batch; the ones
+    left when the send rate limit is reached go to a new batch scheduled for
+    when it refills.
+    """
+    # the text is only needed to render the notification, which is usually cached
+    post = Post.objects.defer('text', *get_translation_fields('text')).filter(pk=post_id).first()
+    if post is None:
+        return f"Post {post_id} no longer exists"
+
+    recipients = list(
+        User.objects.filter(id__in=recipient_ids).order_by('id').values_list('id', 'email', 'username')
+    )
+    rendered = render_post_notification(post)
+    sent = set()
+    deferred = []
+    connection = get_delivery_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning(f"Mail connection failed for post {post_id} notifications: {e}")
+    else:
+        try:
+            for position, (user_id, email, username) in enumerate(recipients):
+                try:
+                    mail_throttle.acquire('bulk')
+                except MailThrottled as e:
+                    rest = [user_id for user_id, email, username in recipients[position:]]
+                    send_post_notification_batch.apply_async(args=(post_id, rest), countdown=e.retry_after)
+                    deferred = rest
+                    break
+                msg = build_post_notification(email, username, post.title, rendered, connection)
+                try:
+                    connection.send_messages([msg])
+                except Exception as e:
+                    logger.warning(f"Failed to send post {post_id} notification to {email}: {e}")
+                else:
+                    sent.add(user_id)
+        except Exception as e:
+            logger.warning(f"Post {post_id} notifications stopped: {e}")
+        finally:
+            try:
+                connection.close()
+            except Exception as e:
+                # the messages went out already: nobody is retried for this
+                logger.warning(f"Failed to close the mail connection for post {post_id} notifications: {e}")
+    # only recipients whose message never went out are retried
+    failed = [
+        user_id for user_id, email, username in recipients
+        if user_id not in sent and user_id not in deferred
+    ]
+
+    delivery.count('post_notifications', post_id, sent=len(recipients) - len(failed) - len(deferred),
+                   skipped=len(recipient_ids) - len(recipients))
+    if failed:
+        try:
+            raise self.retry(args=(post_id, failed))
+        except MaxRetriesExceededError:
+            logger.error(f"Gave up on post {post_id} notifications to {len(failed)} recipients")
+            delivery.count('post_notifications', post_id, failed=len(failed))
+    return _(f"Sent {len(recipients) - len(failed) - len(deferred)} of {len(recipient_ids)} emails")
 
 
 @shared_task
-def send_bulk_post_notifications(notifications_data):
-    results = []
-    for notification in notifications_data:
-        result = send_new_post_notification.delay(
-            notification['email'],
-            notification['username'],
-            notification['post_title'],
-            notification['post_text'],
-            notification['post_url']
-        )
-        results.append(result)
-    return _(f"Scheduled {len(results)} email tasks")
+def notify_post_subscribers(post_id):
+    post = Post.objects.filter(pk=post_id).only('id', 'category_id').first()
+    if post is None:
+        return f"Post {post_id} no longer exists"
+    idempotency_key = f'notify-post-{post_id}'
+    if delivery.done([idempotency_key]):
+        return f"Post {post_id} subscribers were already notified"
+
+    delivery.start_run('post_notifications', post_id)
+    batch_size = settings.NOTIFICATION_BATCH_SIZE
+    # Streamed in email order, so duplicates are adjacent and only one batch is kept in memory
+    subscribers = User.objects.filter(categoryuser__category_id=post.category_id).order_by(
+        'email', 'id'
+    ).values_list('id', 'email')
+    scheduled = 0
+    batch = []
+    previous_email = None
+    for user_id, email in subscribers.iterator(chunk_size=SUBSCRIBERS_CHUNK_SIZE):
+        if email == previous_email:
+            continue
+        previous_email = email
+        batch.append(user_id)
+        if len(batch) == batch_size:
+            send_post_notification_batch.delay(post_id, batch)
+            scheduled += len(batch)
+            batch = []
+    if batch:
+        send_post_notification_batch.delay(post_id, batch)
+        scheduled += len(batch)
+    delivery.count('post_notifications', post_id, recipients=scheduled)
+    delivery.mark_done([idempotency_key])
+    return _(f"Scheduled {scheduled} emails in batches of {batch_size}")
+
+
+@shared_task(bind=True, max_retries=5)
+def send_queued_email(self, payloads):
+    """Deliver messages queued by QueuedEmailBackend; failed ones are retried with backoff."""
+    failed = deliver(payloads)
+    if failed:
+        try:
+            raise self.retry(args=(failed,), countdown=60 * 2 ** self.request.retries)
+        except MaxRetriesExceededError:
+            logger.error(f"Gave up on {len(failed)} queued emails")
+    return f"Sent {len(payloads) - len(failed)} of {len(payloads)} emails"
+
+
+def dispatch_post_created(messages):
+    failures = []
+    for message in messages:
+        try:
+            notify_post_subscribers.delay(message.payload['post_id'])
+        except Exception as e:
+            failures.append((message, e))
+    return failures
+
+
+def send_response_accepted(messages):
+    responses = Response.objects.select_related('post', 'user').in_bulk(
+        [message.payload['response_id'] for message in messages]
+    )
+    failures = []
+    with get_delivery_connection() as connection:
+        for position, message in enumerate(messages):
+            response = responses.get(message.payload['response_id'])
+            if response is None:
+                # deleted since it was accepted
+                continue
+            try:
+                mail_throttle.acquire('transactional')
+            except MailThrottled as e:
+                failures += [(pending, e) for pending in messages[position:]]
+                break
+            msg = EmailMessage(
+                subject=_('Your response has been accepted'),
+                body=_('Your response to post "%s" has been accepted by the author.') % response.post.title,
+                from_email=os.getenv('EMAIL_HOST_USER'),
+                to=[response.user.email],
+                connection=connection,
+            )
+            try:
+                connection.send_messages([msg])
+            except Exception as e:
+                failures.append((message, e))
+    return failures
+
+
+OUTBOX_HANDLERS = {
+    'post_created': dispatch_post_created,
+    'response_accepted': send_response_accepted,
+}
 
 
 @shared_task
-def send_weekly_posts():
-    week_ago = datetime.now() - timedelta(days=7)
-    categories = Category.objects.prefetch_related('subscribers')
+def drain_outbox():
+    delivered, failed = outbox.drain(OUTBOX_HANDLERS, settings.OUTBOX_BATCH_SIZE)
+    return f"Delivered {delivered} outbox messages, {failed} failed"
 
-    for category in categories:
-        recent_posts = Post.objects.filter(
-            category=category,
-            creation_date__gte=week_ago
-        ).distinct()
 
-        if not recent_posts:
-            continue
+def weekly_posts(since, until=None):
+    """Posts created in the period, one query for all categories."""
+    posts = Post.objects.filter(creation_date__gte=since)
+    if until is not None:
+        posts = posts.filter(creation_date__lt=until)
+    return posts.defer('text', *get_translation_fields('text')).order_by('category_id', '-creation_date')
 
-        subscribers = category.subscribers.all()
-        for subscriber in subscribers:
-            html_content = render_to_string('weekly_postsletter.html', {
-                'username': subscriber.username,
-                'category': category,
-                'posts': recent_posts,
-                'week_ago': week_ago
-            })
 
+def render_weekly_posts(category, posts, week_ago):
+    """The category's digest rendered once, with a placeholder for the username."""
+    return render_personalized('weekly_postsletter.html', {
+        'category': category,
+        'posts': posts,
+        'week_ago': week_ago
+    })
+
+
+def digest_period(now=None):
+    """The digest period as the local date of the Monday it ends on.
+
+    Every run during the week, including a rerun after a crash, gets the same
+    period and so the same posts and delivery ledger.
+    """
+    today = timezone.localdate(now)
+    return today - timedelta(days=today.weekday())
+
+
+def digest_window(period):
+    """Start and end of the week of posts covered by the period."""
+    period_end = timezone.make_aware(datetime.combine(period, time.min))
+    return period_end - timedelta(days=7), period_end
+
+
+def send_weekly_digest(category, posts, period, subscribers):
+    """Send the category digest to (id, email, username) rows over one connection.
+
+    Every delivered batch is recorded in the DigestDelivery ledger, so a rerun
+    skips it. Returns the number of sent and failed messages.
+    """
+    week_ago = digest_window(period)[0]
+    rendered = render_weekly_posts(category, posts, week_ago)
+    subject = _(f'Weekly posts selection in the category "{category.name}"')
+    batch_size = settings.NOTIFICATION_BATCH_SIZE
+    sent = failed = 0
+
+    def flush(batch):
+        delivered = []
+        try:
+            for user_id, msg in batch:
+                mail_throttle.acquire('bulk')
+                if connection.send_messages([msg]):
+                    delivered.append(user_id)
+        finally:
+            # recorded even when the rate limit stops the shard halfway
+            DigestDelivery.objects.bulk_create(
+                [DigestDelivery(period=period, category=category, user_id=user_id) for user_id in delivered],
+                ignore_conflicts=True,
+            )
+            delivery.count('weekly_digest', period, sent=len(delivered))
+        if len(delivered) < len(batch):
+            logger.warning(f"Weekly digest of category {category.id}: "
+                           f"{len(batch) - len(delivered)} of {len(batch)} messages failed")
+            delivery.count('weekly_digest', period, failed=len(batch) - len(delivered))
+        return len(delivered), len(batch) - len(delivered)
+
+    # fail_silently: a refused address is counted as failed instead of aborting the shard
+    with get_delivery_connection(fail_silently=True) as connection:
+        batch = []
+        for user_id, email, username in subscribers.iterator(chunk_size=SUBSCRIBERS_CHUNK_SIZE):
             msg = EmailMultiAlternatives(
-                subject=_(f'Weekly posts selection in the category "{category.name}"'),
-                body=_(f'Hello, {subscriber.username}! Here are the new posts'
+                subject=subject,
+                body=_(f'Hello, {username}! Here are the new posts'
                      f' in the category "{category.name}" for the past week.'),
                 from_email=os.getenv('EMAIL_HOST_USER'),
-                to=[subscriber.email]
+                to=[email],
+                connection=connection,
+            )
+            msg.attach_alternative(personalize(rendered, username), "text/html")
+            batch.append((user_id, msg))
+            if len(batch) == batch_size:
+                delivered, undelivered = flush(batch)
+                sent, failed = sent + delivered, failed + undelivered
+                batch = []
+        if batch:
+            delivered, undelivered = flush(batch)
+            sent, failed = sent + delivered, failed + undelivered
+    return sent, failed
+
+
+@shared_task(acks_late=True)
+def send_weekly_posts():
+    """Split the weekly digest into subscriber id ranges sent in parallel on the digest queue.
+
+    Safe to rerun for the same period: shards skip subscribers already in the
+    ledger. The shards count their outcomes into the period's DeliveryRun.
+    """
+    period = digest_period()
+    DigestDelivery.objects.filter(period__lt=period - timedelta(weeks=DIGEST_LEDGER_WEEKS)).delete()
+    category_ids = list(
+        weekly_posts(*digest_window(period)).order_by().values_list('category_id', flat=True).distinct()
+    )
+    bounds = CategoryUser.objects.filter(category_id__in=category_ids).aggregate(
+        first=Min('user_id'), last=Max('user_id')
+    )
+    if bounds['first'] is None:
+        return 'No weekly emails to send'
+    delivery.start_run(
+        'weekly_digest', period,
+        recipients=CategoryUser.objects.filter(category_id__in=category_ids).count(),
+    )
+
+    shard_size = settings.WEEKLY_DIGEST_SHARD_SIZE
+    shards = 0
+    for first_user_id in range(bounds['first'], bounds['last'] + 1, shard_size):
+        send_weekly_posts_shard.delay(
+            period.isoformat(), category_ids,
+            first_user_id, min(first_user_id + shard_size, bounds['last'] + 1),
+        )
+        shards += 1
+    return f'Scheduled {shards} weekly digest shards'
+
+
+# acks_late + reject_on_worker_lost: a shard whose worker dies is redelivered
+# and resumes from the ledger; the same happens when the send rate limit is
+# reached, as often as it takes
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None)
+def send_weekly_posts_shard(self, period, category_ids, first_user_id, end_user_id):
+    """Weekly digest for the subscribers with first_user_id <= id < end_user_id."""
+    period = date.fromisoformat(period)
+    posts_by_category = {
+        category_id: list(posts)
+        for category_id, posts in groupby(
+            weekly_posts(*digest_window(period)).filter(category_id__in=category_ids),
+            key=attrgetter('category_id'),
+        )
+    }
+    sent = failed = 0
+    for category in Category.objects.filter(id__in=posts_by_category):
+        delivered = DigestDelivery.objects.filter(period=period, category=category, user=OuterRef('pk'))
+        subscribers = category.subscribers.filter(
+            id__gte=first_user_id, id__lt=end_user_id
+        ).exclude(Exists(delivered)).order_by().values_list('id', 'email', 'username')
+        try:
+            category_sent, category_failed = send_weekly_digest(
+                category, posts_by_category[category.id], period, subscribers
             )
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
+        except MailThrottled as e:
+            raise self.retry(countdown=e.retry_after)
+        sent += category_sent
+        failed += category_failed
+    return {'sent': sent, 'failed': failed}
 
-    return 'Successfully sent weekly emails'
\ No newline at end of file
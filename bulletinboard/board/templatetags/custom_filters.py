@@ -1,10 +1,9 @@
-import html
-import re
-
 from django import template
-from django.utils.html import strip_tags
 from django.utils.translation import gettext as _
 
+from board.roles import is_admin, is_author
+from board.utils import html_to_text
+
 
 register = template.Library()
 
@@ -16,23 +15,14 @@ def join_categories(value):
 
 @register.filter()
 def author(user):
-    if user.groups.filter(name='authors').exists():
-        return True
-    else:
-        return False
+    return is_author(user)
 
 
 @register.filter()
 def admin(user):
-    if user.groups.filter(name='admin').exists():
-        return True
-    else:
-        return False
+    return is_admin(user)
 
 
 @register.filter()
 def striptags_filter(value):
-    text = strip_tags(value)
-    text = html.unescape(text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
\ No newline at end of file
+    return html_to_text(value)
\ No newline at end of file
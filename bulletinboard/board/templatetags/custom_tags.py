@@ -8,5 +8,8 @@ register = template.Library()
 def url_replace(context, **kwargs):
     d = context['request'].GET.copy()
     for k, v in kwargs.items():
-        d[k] = v
+        if v is None:
+            d.pop(k, None)
+        else:
+            d[k] = v
     return d.urlencode()
\ No newline at end of file
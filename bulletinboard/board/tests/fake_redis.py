@@ -0,0 +1,174 @@
+"""In-memory stand-in for a Redis server, enough for the cache backends
+and the mail rate limit.
+
+All FakeRedis instances talk to the same server, so two cache backends
+configured with it behave like two processes sharing one Redis.
+"""
+from collections import deque
+from time import monotonic
+
+
+def encode(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class FakeRedis:
+    data = {}
+    expires = {}
+    subscribers = []
+
+    def __init__(self, connection_pool=None, **kwargs):
+        pass
+
+    @classmethod
+    def reset(cls):
+        cls.data.clear()
+        cls.expires.clear()
+        cls.subscribers.clear()
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self.data[key] = encode(value)
+        self.expires.pop(key, None)
+        if ex is not None:
+            self.expires[key] = monotonic() + ex
+        return True
+
+    def mset(self, mapping):
+        for key, value in mapping.items():
+            self.set(key, value)
+        return True
+
+    def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    def exists(self, key):
+        return int(self._alive(key))
+
+    def expire(self, key, seconds):
+        if not self._alive(key):
+            return False
+        if seconds <= 0:
+            self.delete(key)
+        else:
+            self.expires[key] = monotonic() + seconds
+        return True
+
+    def pttl(self, key):
+        if not self._alive(key):
+            return -2
+        expires_at = self.expires.get(key)
+        return -1 if expires_at is None else int((expires_at - monotonic()) * 1000)
+
+    def persist(self, key):
+        return self._alive(key) and self.expires.pop(key, None) is not None
+
+    def incr(self, key, amount=1):
+        value = int(self.get(key) or 0) + amount
+        self.data[key] = encode(value)
+        return value
+
+    def _members(self, key):
+        return self.data[key] if self._alive(key) else {}
+
+    def zadd(self, key, mapping):
+        self._alive(key)
+        members = self.data.setdefault(key, {})
+        added = len(set(map(encode, mapping)) - set(members))
+        members.update({encode(member): float(score) for member, score in mapping.items()})
+        return added
+
+    def zrem(self, key, *members):
+        entries = self._members(key)
+        return sum(1 for member in members if entries.pop(encode(member), None) is not None)
+
+    def zcard(self, key):
+        return len(self._members(key))
+
+    def zcount(self, key, low, high):
+        return len(self._in_range(key, low, high))
+
+    def zremrangebyscore(self, key, low, high):
+        removed = self._in_range(key, low, high)
+        for member in removed:
+            del self.data[key][member]
+        return len(removed)
+
+    def zrange(self, key, start, end, withscores=False):
+        entries = sorted(self._members(key).items(), key=lambda entry: (entry[1], entry[0]))
+        entries = entries[start:None if end == -1 else end + 1]
+        return entries if withscores else [member for member, score in entries]
+
+    def _in_range(self, key, low, high):
+        # scores given as '(1.5' are exclusive, like in ZRANGEBYSCORE
+        low, high = str(low), str(high)
+        low_open, high_open = low.startswith('('), high.startswith('(')
+        low, high = float(low.lstrip('(')), float(high.lstrip('('))
+        return [
+            member for member, score in self._members(key).items()
+            if (score > low if low_open else score >= low) and (score < high if high_open else score <= high)
+        ]
+
+    def flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def publish(self, channel, message):
+        receivers = [pubsub for pubsub in self.subscribers if channel in pubsub.channels]
+        for pubsub in receivers:
+            pubsub.messages.append({'type': 'message', 'channel': encode(channel), 'data': encode(message)})
+        return len(receivers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self.channels = set()
+        self.messages = deque()
+        client.subscribers.append(self)
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def get_message(self, timeout=0.0):
+        return self.messages.popleft() if self.messages else None
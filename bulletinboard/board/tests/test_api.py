@@ -2,6 +2,7 @@ import pytest
 from django.urls import reverse
 from rest_framework import status
 from board.models import Post, Response
+from board.serializers import PostSerializer
 
 
 @pytest.mark.api
@@ -40,6 +41,33 @@ class TestPostAPI:
         assert response.status_code == status.HTTP_201_CREATED
         assert Post.objects.filter(title='API Test Post').exists()
 
+    def test_posts_expose_response_counters(self, api_client, test_post, regular_user):
+        """Счётчики откликов отдаются в API и не меняются клиентом"""
+        Response.objects.create(post=test_post, user=regular_user, text='Ready')
+
+        listed = api_client.get(reverse('post-list')).data['results'][0]
+        detail = api_client.get(reverse('post-detail', args=[test_post.pk])).data
+
+        assert listed['response_count'] == detail['response_count'] == 1
+        assert detail['pending_response_count'] == 1
+        assert detail['accepted_response_count'] == detail['rejected_response_count'] == 0
+
+    def test_post_update_keeps_counters(self, api_client, author_user, test_post, regular_user, mocker):
+        """Отклик, пришедший во время изменения поста через API, остаётся в счётчиках"""
+        def respond_while_editing(serializer, attrs):
+            Response.objects.create(post=test_post, user=regular_user, text='Ready')
+            return attrs
+
+        mocker.patch.object(PostSerializer, 'validate', respond_while_editing)
+        api_client.force_authenticate(user=author_user)
+
+        response = api_client.patch(reverse('post-detail', args=[test_post.pk]), {'title': 'Changed title'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['response_count'] == 1
+        test_post.refresh_from_db()
+        assert (test_post.title, test_post.response_count) == ('Changed title', 1)
+
     def test_filter_posts_by_category(self, api_client, test_category, test_post):
         """Тест фильтрации постов по категории"""
         url = reverse('post-list')
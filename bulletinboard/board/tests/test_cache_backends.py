@@ -0,0 +1,119 @@
+import pytest
+
+from board import cache_backends
+from board.cache_backends import TwoTierCache
+from board.tests.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def make_cache():
+    """Каждый созданный кеш ведёт себя как отдельный процесс с общим Redis"""
+    FakeRedis.reset()
+
+    def make(**options):
+        cache_backends._local_tiers.clear()
+        return TwoTierCache('redis://fake:6379/0', {
+            'OPTIONS': {'CLIENT_CLASS': 'board.tests.fake_redis.FakeRedis', **options},
+        })
+
+    yield make
+    cache_backends._local_tiers.clear()
+    FakeRedis.reset()
+
+
+@pytest.mark.integration
+class TestTwoTierCache:
+    """Тесты двухуровневого кеша: локальный LRU перед Redis"""
+
+    def test_local_tier_serves_repeated_reads(self, make_cache):
+        """Повторное чтение обслуживается из памяти процесса"""
+        cache = make_cache()
+        cache.set('post', {'title': 'Raid'})
+        FakeRedis.data.clear()
+
+        assert cache.get('post') == {'title': 'Raid'}
+        assert cache.get_stats()['local']['hits'] == 1
+        assert cache.get_stats()['remote'] == {'hits': 0, 'misses': 0}
+
+    def test_read_through_fills_local_tier(self, make_cache):
+        """Промах локального уровня читает Redis и запоминает значение"""
+        writer, reader = make_cache(), make_cache()
+        writer.set('post', 'Raid')
+
+        assert reader.get('post') == 'Raid'
+        assert reader.get('post') == 'Raid'
+        assert reader.get('missing', 'default') == 'default'
+        assert reader.get_stats() == {
+            'local': {'hits': 1, 'misses': 2, 'entries': 1},
+            'remote': {'hits': 1, 'misses': 1},
+        }
+
+    def test_writes_invalidate_other_processes(self, make_cache):
+        """Запись в одном процессе сбрасывает локальную копию в другом"""
+        first, second = make_cache(), make_cache()
+        first.set('post', 'old')
+        assert second.get('post') == 'old'
+
+        first.set('post', 'new')
+        assert second.get('post') == 'new'
+
+        first.delete('post')
+        assert second.get('post') is None
+
+    def test_clear_and_incr_propagate(self, make_cache):
+        """Очистка и инкремент тоже рассылают инвалидацию"""
+        first, second = make_cache(), make_cache()
+        first.set_many({'a': 1, 'b': 2})
+        assert second.get_many(['a', 'b']) == {'a': 1, 'b': 2}
+
+        first.incr('a')
+        assert second.get('a') == 2
+
+        first.clear()
+        assert second.get_many(['a', 'b']) == {}
+
+    def test_local_copy_expires_with_redis_entry(self, make_cache, mocker):
+        """Локальная копия другого процесса живёт не дольше записи в Redis"""
+        clock = mocker.patch.object(cache_backends, 'monotonic', return_value=1000.0)
+        mocker.patch('board.tests.fake_redis.monotonic', clock)
+        writer, reader = make_cache(), make_cache()
+        writer.set_many({'lock': 'taken', 'a': 1}, 1)
+        assert reader.get('lock') == 'taken'
+        assert reader.get_many(['a']) == {'a': 1}
+
+        clock.return_value = 1001.3
+
+        assert writer.get('lock') is None
+        assert reader.get('lock') is None
+        assert reader.get_many(['a']) == {}
+        assert not reader.has_key('lock')
+
+    def test_local_tier_is_bounded(self, make_cache):
+        """Локальный уровень вытесняет давно не использованные ключи"""
+        cache = make_cache(LOCAL_MAX_ENTRIES=2)
+        cache.set_many({'a': 1, 'b': 2})
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get_stats()['local']['entries'] == 2
+        assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'b': 2, 'c': 3}
+        assert cache.get_stats()['remote']['hits'] == 1
+
+    def test_local_entries_expire(self, make_cache, mocker):
+        """Локальная копия живёт не дольше LOCAL_TIMEOUT"""
+        monotonic = mocker.patch.object(cache_backends, 'monotonic', return_value=1000.0)
+        cache = make_cache(LOCAL_TIMEOUT=5)
+        cache.set('post', 'Raid', timeout=60)
+
+        monotonic.return_value = 1006.0
+        assert cache.get('post') == 'Raid'
+        assert cache.get_stats()['remote']['hits'] == 1
+
+    def test_lost_subscription_flushes_local_tier(self, make_cache, mocker):
+        """При обрыве подписки локальный уровень сбрасывается"""
+        cache = make_cache()
+        cache.set('post', 'Raid')
+        mocker.patch.object(cache.tier.pubsub, 'get_message', side_effect=ConnectionError)
+
+        assert cache.get('post') == 'Raid'
+        assert cache.get_stats()['remote']['hits'] == 1
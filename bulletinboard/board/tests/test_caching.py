@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import translation
+
+from board.caching import get_cached_post, get_or_build, get_post_version
+from board.packing import POST_SCHEMA_VERSION, pack_post, unpack_post
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """Кеш с атомарным add, общий для всех потоков, как Redis"""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'board-stampede-tests',
+        }
+    }
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.mark.integration
+class TestStampedeGuard:
+    """Тесты защиты от одновременных промахов кеша"""
+
+    def test_concurrent_misses_build_once(self, locmem_cache):
+        """При одновременных промахах значение строит только один поток"""
+        workers = 8
+        barrier = threading.Barrier(workers)
+        builds = []
+        results = []
+
+        def build():
+            builds.append(threading.get_ident())
+            time.sleep(0.2)
+            return 'post'
+
+        def worker():
+            barrier.wait()
+            results.append(get_or_build('posts-hot', build, 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ['post'] * workers
+        assert len(builds) == 1
+
+    def test_failed_build_releases_lock(self, locmem_cache):
+        """Ошибка при построении не оставляет блокировку"""
+        def fail():
+            raise LookupError
+
+        with pytest.raises(LookupError):
+            get_or_build('posts-missing', fail, 60)
+
+        assert get_or_build('posts-missing', lambda: 'post', 60) == 'post'
+
+
+@pytest.mark.signal
+class TestPostCacheVersions:
+    """Кеш поста сбрасывается при изменении связанных объектов"""
+
+    def cached(self, post):
+        return get_cached_post(post.pk, lambda: pytest.fail('post should be cached'))
+
+    def warm(self, post):
+        version = get_post_version(post.pk)
+        get_cached_post(post.pk, lambda: post)
+        return version
+
+    def test_post_save_and_delete_bump_version(self, test_post):
+        """Сохранение и удаление поста меняют версию"""
+        version = self.warm(test_post)
+        test_post.title = 'Updated'
+        test_post.save()
+        assert get_post_version(test_post.pk) != version
+
+        version = self.warm(test_post)
+        pk = test_post.pk
+        test_post.delete()
+        assert get_post_version(pk) != version
+
+    def test_related_changes_bump_version(self, test_post):
+        """Изменение профиля, категории и имени автора меняют версию"""
+        for related in (test_post.author, test_post.category, test_post.author.user):
+            version = self.warm(test_post)
+            assert self.cached(test_post) == test_post
+            related.save()
+            assert get_post_version(test_post.pk) != version
+
+    def test_login_does_not_bump_version(self, client, test_post):
+        """Вход автора не сбрасывает кеш его постов"""
+        version = self.warm(test_post)
+
+        client.force_login(test_post.author.user)
+        test_post.author.user.save(update_fields=['last_login'])
+
+        assert get_post_version(test_post.pk) == version
+
+    def test_detail_shows_renamed_category(self, client, test_post):
+        """Страница поста не показывает устаревшую категорию"""
+        url = reverse('post_detail', args=[test_post.pk])
+        client.get(url)
+
+        test_post.category.name = 'heal'
+        test_post.category.save()
+
+        assert client.get(url).context['post'].category.name == 'heal'
+
+
+@pytest.mark.model
+class TestPostPacking:
+    """Тесты компактного формата поста в кеше"""
+
+    def test_round_trip(self, test_post, django_assert_num_queries):
+        """Распакованный пост содержит всё, что нужно странице поста, без запросов к БД"""
+        test_post.response_count, test_post.accepted_response_count = 3, 1
+        test_post.rejected_response_count, test_post.pending_response_count = 0, 2
+        payload = pack_post(test_post)
+
+        with django_assert_num_queries(0):
+            post = unpack_post(payload)
+            assert str(post.category) and str(post.author)
+            assert (post.response_count, post.accepted_response_count,
+                    post.rejected_response_count, post.pending_response_count) == (3, 1, 0, 2)
+
+        assert post == test_post
+        assert post.title == test_post.title
+        assert post.text == test_post.text
+        assert post.creation_date == test_post.creation_date
+        assert post.category == test_post.category
+        assert post.category.name == test_post.category.name
+        assert post.author == test_post.author
+        assert post.author.user == test_post.author.user
+        assert post.author.user.username == test_post.author.user.username
+
+    def test_other_schema_version_is_a_miss(self, test_post):
+        """Запись другой версии схемы не декодируется"""
+        payload = pack_post(test_post)
+
+        assert unpack_post(bytes([POST_SCHEMA_VERSION + 1]) + payload[1:]) is None
+
+    def test_cached_per_language(self, client, test_post):
+        """Страница поста берёт из кеша заголовок на языке запроса"""
+        test_post.title_ru = 'Ищу танка'
+        test_post.title_en_us = 'Looking for a tank'
+        test_post.save()
+        url = reverse('post_detail', args=[test_post.pk])
+
+        for language, title in (('ru', 'Ищу танка'), ('en-us', 'Looking for a tank')) * 2:
+            with translation.override(language):
+                assert client.get(url, HTTP_ACCEPT_LANGUAGE=language).context['post'].title == title
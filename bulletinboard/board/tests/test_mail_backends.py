@@ -0,0 +1,105 @@
+from smtplib import SMTPServerDisconnected
+
+import pytest
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.core.mail.backends import locmem
+
+from board import mail_backends
+from board.mail_backends import deliver, get_delivery_connection, serialize
+from board.tasks import send_queued_email
+
+QUEUED = 'board.mail_backends.QueuedEmailBackend'
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+@pytest.fixture
+def queued_email(settings):
+    """Письма ставятся в очередь, воркер отправляет их в locmem"""
+    settings.EMAIL_BACKEND = QUEUED
+    settings.QUEUED_EMAIL_BACKEND = LOCMEM
+    settings.EMAIL_QUEUE = 'celery'
+    yield settings
+    mail_backends.close_pooled_connection()
+
+
+def html_message():
+    msg = EmailMultiAlternatives('Привет', 'Plain body', 'board@example.com',
+                                 ['to@example.com'], bcc=['hidden@example.com'])
+    msg.attach_alternative('<p>HTML body</p>', 'text/html')
+    return msg
+
+
+@pytest.mark.email
+class TestQueuedEmailBackend:
+    """Тесты отправки писем через очередь"""
+
+    def test_send_only_enqueues(self, queued_email, mail_outbox, mocker):
+        """Отправка из запроса только ставит задачу и не трогает SMTP"""
+        delay = mocker.patch.object(send_queued_email, 'delay')
+
+        assert send_mail('Subject', 'Body', 'board@example.com', ['to@example.com']) == 1
+
+        assert mail_outbox == []
+        (payloads,), kwargs = delay.call_args
+        assert [payload['recipients'] for payload in payloads] == [['to@example.com']]
+
+    def test_worker_sends_the_same_message(self, queued_email, celery_eager, mail_outbox):
+        """Воркер отправляет письмо таким, каким его сформировал запрос"""
+        html_message().send()
+
+        sent, = mail_outbox
+        assert sent.subject == 'Привет'
+        assert sent.body.strip() == 'Plain body'
+        assert sent.recipients() == ['to@example.com', 'hidden@example.com']
+        raw = sent.message().as_bytes(linesep='\r\n')
+        assert b'<p>HTML body</p>' in raw
+        assert b'hidden@example.com' not in raw
+
+    def test_broker_failure(self, queued_email, mocker):
+        """Ошибка брокера видна отправителю, если он не просил fail_silently"""
+        mocker.patch.object(send_queued_email, 'delay', side_effect=ConnectionError)
+
+        with pytest.raises(ConnectionError):
+            send_mail('Subject', 'Body', 'board@example.com', ['to@example.com'])
+        assert send_mail('Subject', 'Body', 'board@example.com', ['to@example.com'],
+                         fail_silently=True) == 0
+
+    def test_background_thread(self, queued_email, mail_outbox):
+        """Без воркера письма отправляет фоновый поток процесса"""
+        queued_email.EMAIL_QUEUE = 'thread'
+
+        send_mail('Subject', 'Body', 'board@example.com', ['to@example.com'])
+        mail_backends.background_queue().join()
+
+        assert [message.to for message in mail_outbox] == [['to@example.com']]
+
+    def test_connection_is_pooled(self, queued_email, mail_outbox, mocker):
+        """Задачи воркера используют одно открытое соединение"""
+        get_connection = mocker.spy(mail_backends, 'get_connection')
+        payload = serialize(html_message())
+
+        deliver([payload])
+        deliver([payload, payload])
+
+        assert get_connection.call_count == 1
+        assert len(mail_outbox) == 3
+
+    def test_failed_messages_are_retried(self, queued_email, mail_outbox, mocker):
+        """Неотправленные письма повторяются, соединение открывается заново"""
+        send_messages = locmem.EmailBackend.send_messages
+        failures = iter([True])
+
+        def flaky_send(backend, messages):
+            if next(failures, False):
+                raise SMTPServerDisconnected
+            return send_messages(backend, messages)
+
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', flaky_send)
+
+        send_queued_email.apply(args=([serialize(html_message())],))
+
+        assert len(mail_outbox) == 1
+
+    def test_worker_tasks_do_not_requeue(self, queued_email):
+        """Задачи рассылки отправляют письма сами, а не ставят их в очередь снова"""
+        assert isinstance(get_delivery_connection(), locmem.EmailBackend)
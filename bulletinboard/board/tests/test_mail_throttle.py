@@ -0,0 +1,179 @@
+from functools import partial
+from itertools import chain, repeat
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+
+from board import mail_throttle, tasks
+from board.checks import check_mail_rate_store
+from board.mail_throttle import MailThrottled, acquire, get_stats, take
+from board.models import DigestDelivery
+from board.tasks import send_post_notification_batch, send_weekly_digest
+from board.tests.fake_redis import FakeRedis
+from bulletinboard.celery import app as celery_app, refuse_unshared_mail_limit
+
+
+@pytest.fixture
+def rates(settings):
+    """Лимит 5 писем в секунду, массовым рассылкам — 3 из них"""
+    settings.MAIL_RATE_PER_SECOND = 5
+    settings.MAIL_RATE_PER_HOUR = 0
+    settings.MAIL_BULK_SHARE = 0.6
+    return settings
+
+
+@pytest.fixture
+def frozen_time(mocker):
+    """Все вызовы попадают в одну секунду"""
+    mocker.patch.object(mail_throttle, 'time', return_value=1_000_000.5)
+
+
+@pytest.mark.email
+class TestMailThrottle:
+    """Тесты общего лимита отправки писем"""
+
+    def test_bulk_leaves_room_for_transactional(self, rates, frozen_time):
+        """Рассылка занимает только свою долю, остальное достаётся письмам из запросов"""
+        assert [take('bulk') for _ in range(3)] == [0, 0, 0]
+        assert take('bulk') == pytest.approx(1)
+        # отказы рассылке не расходуют остаток
+        take('bulk')
+        assert [take('transactional') for _ in range(2)] == [0, 0]
+        assert take('transactional') > 0
+
+    def test_waits_for_free_slot(self, rates, mocker):
+        """Когда лимит секунды исчерпан, отправитель ждёт, пока первое письмо выйдет из окна"""
+        rates.MAIL_RATE_PER_SECOND = 1
+        clock = chain([10.2, 10.2], repeat(11.2))
+        mocker.patch.object(mail_throttle, 'time', side_effect=lambda: next(clock))
+        sleep = mocker.patch.object(mail_throttle, 'sleep')
+
+        acquire('transactional')
+        acquire('transactional')
+
+        assert sleep.call_args.args[0] == pytest.approx(1)
+        assert get_stats()['transactional']['waits'] == 1
+
+    @pytest.mark.parametrize('shared', [True, False])
+    def test_no_burst_across_second_boundary(self, rates, mocker, shared):
+        """Окно скользящее: на стыке двух секунд нельзя отправить двойной лимит"""
+        if not shared:
+            rates.MAIL_RATE_REDIS_URL = None
+        now = mocker.patch.object(mail_throttle, 'time', return_value=10.9)
+        assert [take('transactional') for _ in range(5)] == [0] * 5
+
+        now.return_value = 11.1
+        assert take('transactional') == pytest.approx(0.8)
+        now.return_value = 11.9
+        assert [take('transactional') for _ in range(5)] == [0] * 5
+        assert take('transactional') > 0
+
+    def test_exhausted_hour_raises(self, rates, frozen_time):
+        """Исчерпанный часовой лимит не ждут, а откладывают отправку"""
+        rates.MAIL_RATE_PER_HOUR = 1
+        acquire('transactional')
+
+        with pytest.raises(MailThrottled) as error:
+            acquire('transactional')
+
+        assert error.value.retry_after > mail_throttle.MAX_WAIT
+        assert get_stats()['transactional']['throttled'] == 1
+        assert get_stats()['sent_last_hour'] == 1
+
+    def test_denied_hour_returns_second_token(self, rates, frozen_time):
+        """Если отказал часовой лимит, токен секунды возвращается"""
+        rates.MAIL_RATE_PER_HOUR = 1
+        acquire('transactional')
+
+        assert take('transactional') > mail_throttle.MAX_WAIT
+        assert FakeRedis().zcard(mail_throttle.window_key(1)) == 1
+        assert FakeRedis().zcard(mail_throttle.window_key(mail_throttle.HOUR)) == 1
+
+    def test_buckets_shared_through_redis(self, rates, frozen_time):
+        """Окна хранятся в Redis с таймаутом, а не в кеше отдельного контейнера"""
+        assert [take('transactional') for _ in range(5)] == [0] * 5
+
+        key = mail_throttle.window_key(1)
+        assert FakeRedis().zcard(key) == 5
+        assert key in FakeRedis.expires
+        # другой процесс со своим клиентом видит ту же исчерпанную корзину
+        mail_throttle._redis['pid'] = None
+        assert take('transactional') > 0
+
+    def test_local_buckets_without_redis(self, rates, frozen_time):
+        """Без Redis лимит считается в памяти процесса"""
+        rates.MAIL_RATE_REDIS_URL = None
+
+        assert [take('transactional') for _ in range(5)] == [0] * 5
+        assert take('transactional') > 0
+        assert FakeRedis.data == {}
+
+    def test_celery_requires_shared_store(self, rates):
+        """Воркеры не запускаются с лимитом, который не общий для всех"""
+        rates.EMAIL_QUEUE = 'celery'
+        rates.MAIL_RATE_REDIS_URL = None
+
+        assert [error.id for error in check_mail_rate_store(None)] == ['board.E001']
+        with pytest.raises(ImproperlyConfigured):
+            refuse_unshared_mail_limit()
+        rates.MAIL_RATE_REDIS_URL = 'redis://localhost:6379/0'
+        assert check_mail_rate_store(None) == []
+
+    def test_zero_rate_disables(self, rates, frozen_time):
+        rates.MAIL_RATE_PER_SECOND = 0
+
+        assert all(take('bulk') == 0 for _ in range(50))
+
+    def test_batch_defers_the_rest(self, rates, frozen_time, test_post, user_factory, mail_outbox, mocker):
+        """Пачка уведомлений отправляет сколько позволяет лимит, остаток переносится"""
+        rates.MAIL_RATE_PER_SECOND = 0
+        rates.MAIL_RATE_PER_HOUR = 2
+        rates.MAIL_BULK_SHARE = 1
+        later = mocker.patch.object(send_post_notification_batch, 'apply_async')
+        recipient_ids = [user.pk for user in user_factory.create_batch(3)]
+
+        send_post_notification_batch.apply(args=(test_post.pk, recipient_ids))
+
+        assert len(mail_outbox) == 2
+        assert later.call_args.kwargs['args'] == (test_post.pk, recipient_ids[2:])
+        assert later.call_args.kwargs['countdown'] > 0
+
+    def test_digest_records_sent_before_throttle(self, rates, frozen_time, test_category, user_factory,
+                                                 mail_outbox):
+        """Остановленная лимитом рассылка успевает записать отправленное в журнал"""
+        rates.MAIL_RATE_PER_SECOND = 0
+        rates.MAIL_RATE_PER_HOUR = 2
+        rates.MAIL_BULK_SHARE = 1
+        test_category.subscribers.add(*user_factory.create_batch(3))
+        subscribers = test_category.subscribers.values_list('id', 'email', 'username')
+
+        with pytest.raises(MailThrottled):
+            send_weekly_digest(test_category, [], tasks.digest_period(), subscribers)
+
+        assert len(mail_outbox) == 2
+        assert DigestDelivery.objects.count() == 2
+
+    def test_stats_command(self, mocker, capsys):
+        mocker.patch('board.management.commands.mail_stats.queue_depths', return_value={'mail': 3})
+
+        call_command('mail_stats')
+
+        output = capsys.readouterr().out
+        assert 'queue mail: 3 tasks' in output
+        assert 'outbox: 0 pending, 0 dead' in output
+        assert 'bulk: 0 waits' in output
+
+    def test_empty_queues_are_reported(self, mocker, capsys):
+        """Пустые очереди показываются с нулём, а не как недоступный брокер"""
+        memory_broker = partial(celery_app.connection_for_read, 'memory://')
+        mocker.patch.object(celery_app, 'connection_for_read', memory_broker)
+        with memory_broker() as connection:
+            connection.SimpleQueue('mail').put({'task': 'send_queued_email'})
+
+        call_command('mail_stats')
+
+        output = capsys.readouterr().out
+        assert 'Broker unavailable' not in output
+        assert 'queue mail: 1 tasks' in output
+        assert 'queue digest: 0 tasks' in output
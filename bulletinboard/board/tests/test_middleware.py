@@ -1,4 +1,12 @@
+import pickle
+
 import pytest
+from board.models import Profile
+from board.profiles import profile_cache_key
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 import pytz
 
@@ -27,4 +35,70 @@ class TestTimezoneMiddleware:
         response = client.get('/')
 
         # Проверяем наличие времени в контексте
-        assert 'current_time' in response.context
\ No newline at end of file
+        assert 'current_time' in response.context
+
+
+@pytest.mark.middleware
+class TestProfileMiddleware:
+    """Тесты middleware профиля пользователя"""
+
+    def test_profile_attached_to_request(self, authenticated_client, author_user):
+        """Профиль пользователя доступен как request.profile"""
+        response = authenticated_client.get(reverse('profile_detail'))
+
+        assert response.wsgi_request.profile == Profile.objects.get(user=author_user)
+
+    def test_profile_is_cached_between_requests(self, authenticated_client):
+        """Профиль не запрашивается из БД повторно"""
+        authenticated_client.get(reverse('profile_detail'))
+
+        with CaptureQueriesContext(connection) as queries:
+            authenticated_client.get(reverse('profile_detail'))
+
+        assert not [q for q in queries if 'FROM "board_profile"' in q['sql']]
+
+    def test_profile_invalidated_on_save(self, authenticated_client, author_user):
+        """Сохранение профиля сбрасывает кеш"""
+        authenticated_client.get(reverse('profile_detail'))
+        profile = Profile.objects.get(user=author_user)
+        profile.gender = 'female'
+        profile.save()
+
+        response = authenticated_client.get(reverse('profile_detail'))
+
+        assert response.wsgi_request.profile.gender == 'female'
+
+    def test_profile_read_before_commit_is_dropped(self, authenticated_client, author_user,
+                                                   django_capture_on_commit_callbacks):
+        """Профиль, закешированный до коммита сохранения, удаляется после коммита"""
+        profile = Profile.objects.get(user=author_user)
+        old = Profile.objects.get(user=author_user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            profile.gender = 'female'
+            profile.save()
+            # параллельный запрос ещё видит старую строку
+            cache.set(profile_cache_key(author_user.pk), old)
+
+        response = authenticated_client.get(reverse('profile_detail'))
+
+        assert response.wsgi_request.profile.gender == 'female'
+
+    def test_cached_profile_has_no_user(self, client, regular_user):
+        """В кеш не попадает пользователь с хешем пароля, даже когда профиль только что создан"""
+        Profile.objects.filter(user=regular_user).delete()
+        client.force_login(regular_user)
+
+        client.get(reverse('profile_detail'))
+
+        cached = cache.get(profile_cache_key(regular_user.pk))
+        assert cached.user_id == regular_user.pk
+        assert 'user' not in cached._state.fields_cache
+        assert b'pbkdf2' not in pickle.dumps(cached)
+
+    def test_profile_is_lazy(self, client):
+        """Профиль не загружается, если он не нужен"""
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/')
+
+        assert not [q for q in queries if 'board_profile' in q['sql']]
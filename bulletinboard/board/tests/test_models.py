@@ -1,6 +1,12 @@
 import pytest
-from board.models import Post, Response, CategoryUser
+from board.models import Post, Response, CategoryUser, EXCERPT_LENGTH
+from board.forms import PostForm
+from board.response_counters import edited_fields
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 
 @pytest.mark.model
@@ -20,6 +26,35 @@ class TestPostModel:
         """Тест автоматической установки даты"""
         assert test_post.creation_date is not None
 
+    def test_excerpt_is_plain_text_per_language(self, test_post):
+        """Отрывок текста хранится без HTML для каждого языка"""
+        test_post.text_ru = '<p>Нужен <strong>танк</strong>&nbsp;в рейд</p>'
+        test_post.text_en_us = '<p>' + 'word ' * 100 + '</p>'
+        test_post.save()
+        test_post.refresh_from_db()
+
+        assert test_post.excerpt_ru == 'Нужен танк в рейд'
+        assert len(test_post.excerpt_en_us) == EXCERPT_LENGTH
+
+    def test_backfill_excerpts_command(self, test_post):
+        """Команда заполняет отрывки у существующих постов"""
+        Post.objects.filter(pk=test_post.pk).update(excerpt_ru='', excerpt_en_us='')
+
+        call_command('backfill_excerpts')
+
+        test_post.refresh_from_db()
+        assert test_post.excerpt_ru == test_post.text_ru[:EXCERPT_LENGTH].strip()
+
+    def test_post_list_does_not_load_text(self, client, test_post):
+        """Список постов не загружает полный текст"""
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('post_list'))
+
+        assert test_post.excerpt[:10] in response.content.decode()
+        post_queries = [q['sql'] for q in queries if 'FROM "board_post"' in q['sql']]
+        assert post_queries
+        assert not any('"board_post"."text' in sql for sql in post_queries)
+
 
 @pytest.mark.model
 class TestCategoryModel:
@@ -58,4 +93,121 @@ class TestResponseModel:
         """Тест строкового представления"""
         expected = f"Response by {test_response.user.username} on {test_response.post.title}"
         # Можно добавить свой __str__ если нужно
-        assert test_response.text is not None
\ No newline at end of file
+        assert test_response.text is not None
+
+def counters(post):
+    post.refresh_from_db()
+    return (post.response_count, post.accepted_response_count,
+            post.rejected_response_count, post.pending_response_count)
+
+
+@pytest.mark.model
+class TestResponseCounters:
+    """Тесты счётчиков откликов поста"""
+
+    def test_counters_follow_responses(self, client, test_post, author_user, regular_user,
+                                       another_regular_user, mail_outbox):
+        """Создание, принятие, отклонение и удаление откликов меняют счётчики поста"""
+        first = Response.objects.create(post=test_post, user=regular_user, text='First')
+        second = Response.objects.create(post=test_post, user=another_regular_user, text='Second')
+        assert counters(test_post) == (2, 0, 0, 2)
+
+        client.force_login(author_user)
+        client.post(reverse('response_accept', args=[test_post.pk, first.pk]))
+        client.post(reverse('response_accept', args=[test_post.pk, first.pk]))
+        client.post(reverse('response_reject', args=[test_post.pk, second.pk]))
+        assert counters(test_post) == (2, 1, 1, 0)
+
+        second.delete()
+        assert counters(test_post) == (1, 1, 0, 0)
+
+    def test_edited_fields_keep_counters(self, test_post, regular_user):
+        """Сохранение только изменённых полей ранее загруженного поста не затирает счётчики"""
+        stale = Post.objects.get(pk=test_post.pk)
+        Response.objects.create(post=test_post, user=regular_user, text='Ready')
+
+        stale.title = 'Changed title'
+        stale.save(update_fields=edited_fields(['title']))
+
+        assert counters(test_post) == (1, 0, 0, 1)
+        assert test_post.title == 'Changed title'
+
+    def test_edited_translation_saves_base_column(self):
+        assert edited_fields(['title_ru', 'category']) == {'title_ru', 'title', 'category'}
+
+    def test_post_edit_keeps_counters(self, client, author_user, test_post, regular_user, mocker):
+        """Отклик, пришедший во время редактирования поста на сайте, остаётся в счётчиках"""
+        clean = PostForm.clean
+
+        def respond_while_editing(form):
+            Response.objects.create(post=test_post, user=regular_user, text='Ready')
+            return clean(form)
+
+        mocker.patch.object(PostForm, 'clean', respond_while_editing)
+        client.force_login(author_user)
+
+        page = client.post(reverse('post_update', args=[test_post.pk]), {
+            'category': test_post.category_id, 'title': 'Changed title', 'text': '<p>Changed text of the post</p>',
+        })
+
+        assert page.status_code == 302
+        assert counters(test_post) == (1, 0, 0, 1)
+        assert test_post.title == 'Changed title'
+        assert test_post.excerpt == 'Changed text of the post'
+
+    def test_admin_edit_saves_changed_fields(self, admin_client, test_post):
+        """Админка сохраняет только изменённые поля поста, а не счётчики"""
+        post = {
+            'author': test_post.author_id, 'category': test_post.category_id,
+            'title': 'Changed title', 'text': test_post.text,
+            'title_en_us': 'Changed title', 'title_ru': test_post.title_ru or '',
+            'text_en_us': test_post.text_en_us or '', 'text_ru': test_post.text_ru or '',
+        }
+        with CaptureQueriesContext(connection) as queries:
+            page = admin_client.post(reverse('admin:board_post_change', args=[test_post.pk]), post)
+
+        assert page.status_code == 302
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "board_post"')]
+        assert len(updates) == 1
+        assert 'response_count' not in updates[0]
+        test_post.refresh_from_db()
+        assert test_post.title_en_us == 'Changed title'
+
+    def test_deleting_user_updates_counters(self, test_post, regular_user, another_regular_user):
+        """Отклики удалённого пользователя вычитаются из счётчиков"""
+        Response.objects.create(post=test_post, user=regular_user, text='First')
+        Response.objects.create(post=test_post, user=another_regular_user, text='Second')
+
+        regular_user.delete()
+
+        assert counters(test_post) == (1, 0, 0, 1)
+
+    def test_repair_command(self, test_post, regular_user):
+        """Команда пересчитывает разошедшиеся счётчики"""
+        Response.objects.create(post=test_post, user=regular_user, text='Ready', status='accepted')
+        Post.objects.filter(pk=test_post.pk).update(response_count=7, pending_response_count=3)
+
+        call_command('repair_response_counters')
+
+        assert counters(test_post) == (1, 1, 0, 0)
+
+    def test_post_page_shows_counters(self, client, test_post, regular_user):
+        """Страница поста показывает счётчики и после изменения откликов, несмотря на кеш"""
+        client.get(test_post.get_absolute_url())
+        Response.objects.create(post=test_post, user=regular_user, text='Ready')
+
+        with CaptureQueriesContext(connection) as queries:
+            page = client.get(test_post.get_absolute_url())
+
+        assert page.context['post'].response_count == 1
+        assert not any('board_response' in query['sql'] for query in queries)
+
+    def test_posts_ordered_by_responses(self, client, test_post, author_user, test_category, regular_user):
+        """Список постов сортируется по числу откликов"""
+        busy = Post.objects.create(author=author_user.profile, category=test_category,
+                                   title='Busy post', text='<p>Text</p>')
+        Response.objects.create(post=busy, user=regular_user, text='Ready')
+
+        page = client.get(reverse('post_list'), {'ordering': '-responses'})
+
+        assert [post.pk for post in page.context['posts']] == [busy.pk, test_post.pk]
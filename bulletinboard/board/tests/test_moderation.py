@@ -0,0 +1,116 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from board import tasks
+from board.models import OutboxMessage, Post, Response
+from board.tasks import drain_outbox
+
+
+@pytest.fixture
+def pending_responses(test_post, regular_user, another_regular_user, no_drain_kick):
+    responses = [
+        Response.objects.create(post=test_post, user=user, text=f'Ready, {user.username}')
+        for user in (regular_user, another_regular_user)
+    ]
+    OutboxMessage.objects.all().delete()
+    return responses
+
+
+def moderate(client, responses, status):
+    return client.post(reverse('responses_moderate'),
+                       {'responses': [response.pk for response in responses], 'status': status})
+
+
+@pytest.mark.view
+class TestModerateResponses:
+    """Тесты массового принятия и отклонения откликов"""
+
+    def test_accept_with_one_update(self, client, author_user, test_post, pending_responses, mail_outbox,
+                                    django_capture_on_commit_callbacks, no_drain_kick):
+        """Статус меняется одним UPDATE, письма ставятся в outbox одной вставкой"""
+        client.force_login(author_user)
+
+        with CaptureQueriesContext(connection) as queries, django_capture_on_commit_callbacks(execute=True):
+            page = moderate(client, pending_responses, 'accepted')
+
+        assert page.status_code == 302
+        assert [response.status for response in Response.objects.all()] == ['accepted', 'accepted']
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "board_response"')]
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "board_outboxmessage"')]
+        assert len(updates) == 1 and len(inserts) == 1
+        assert sorted(OutboxMessage.objects.values_list('payload__response_id', flat=True)) == sorted(
+            response.pk for response in pending_responses
+        )
+        assert mail_outbox == []
+        no_drain_kick.assert_called_once()
+        test_post.refresh_from_db()
+        assert (test_post.accepted_response_count, test_post.pending_response_count) == (2, 0)
+
+    def test_emails_sent_in_one_batch(self, client, author_user, pending_responses, mail_outbox, mocker):
+        """Письма о принятии отправляются одной пачкой через одно соединение"""
+        client.force_login(author_user)
+        moderate(client, pending_responses, 'accepted')
+        get_connection = mocker.spy(tasks, 'get_delivery_connection')
+
+        drain_outbox()
+
+        assert sorted(message.to[0] for message in mail_outbox) == sorted(
+            response.user.email for response in pending_responses
+        )
+        assert get_connection.call_count == 1
+
+    def test_unchanged_responses_are_not_notified(self, client, author_user, pending_responses):
+        """Уже принятые отклики не получают письмо повторно"""
+        client.force_login(author_user)
+        moderate(client, pending_responses[:1], 'accepted')
+
+        moderate(client, pending_responses, 'accepted')
+
+        assert OutboxMessage.objects.count() == 2
+
+    def test_foreign_responses_are_refused(self, client, author_user, pending_responses, regular_user,
+                                           test_category):
+        """Нельзя изменить ни одного отклика, если среди них есть чужой"""
+        other_post = Post.objects.create(author=regular_user.profile, category=test_category,
+                                         title='Other post', text='<p>Other text</p>')
+        foreign = Response.objects.create(post=other_post, user=author_user, text='Mine')
+        client.force_login(author_user)
+
+        page = moderate(client, [*pending_responses, foreign], 'rejected')
+
+        assert page.status_code == 403
+        assert set(Response.objects.values_list('status', flat=True)) == {'in anticipation'}
+
+    def test_invalid_request(self, client, author_user, pending_responses):
+        """Неизвестный статус отклоняется"""
+        client.force_login(author_user)
+
+        assert moderate(client, pending_responses, 'deleted').status_code == 400
+
+
+@pytest.mark.api
+class TestModerateResponsesAPI:
+    """Тесты API массовой модерации откликов"""
+
+    def test_reject(self, api_client, author_user, test_post, pending_responses):
+        api_client.force_authenticate(user=author_user)
+
+        response = api_client.post(reverse('response-moderate'), {
+            'responses': [response.pk for response in pending_responses], 'status': 'rejected',
+        }, format='json')
+
+        assert response.status_code == 200
+        assert sorted(response.data['changed']) == sorted(response.pk for response in pending_responses)
+        assert not OutboxMessage.objects.exists()
+        test_post.refresh_from_db()
+        assert test_post.rejected_response_count == 2
+
+    def test_requires_authentication(self, api_client, pending_responses):
+        response = api_client.post(reverse('response-moderate'), {
+            'responses': [pending_responses[0].pk], 'status': 'accepted',
+        }, format='json')
+
+        assert response.status_code in (401, 403)
+        assert Response.objects.filter(status='accepted').count() == 0
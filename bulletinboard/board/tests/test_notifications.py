@@ -0,0 +1,429 @@
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+
+import pytest
+from celery.exceptions import MaxRetriesExceededError
+from django.contrib.auth.models import User
+from django.core.mail.backends import locmem
+from django.db import transaction
+from django.utils import timezone
+
+from board import notifications, tasks
+from board.models import Category, DeliveryRun, DigestDelivery, OutboxMessage, Post
+from board.tasks import (
+    digest_period, digest_window, notify_post_subscribers, send_post_notification_batch,
+    send_weekly_posts, send_weekly_posts_shard,
+)
+from bulletinboard.celery import app as celery_app
+
+
+def create_recipients(user_factory, *names):
+    return [user_factory(username=name, email=f'{name.strip("<>")}@example.com').pk for name in names]
+
+
+@pytest.fixture
+def post_in_subscribed_category(subscribed_user, test_category, author_user):
+    return Post(author=author_user.profile, category=test_category,
+                title='Raid tonight', text='<p>Meet at the gates</p>')
+
+
+@pytest.mark.signal
+class TestNotifySubscribersSignal:
+    """Создание поста только пишет сообщение в outbox"""
+
+    def test_outbox_written_with_post(self, post_in_subscribed_category, mocker,
+                                      django_capture_on_commit_callbacks):
+        """Сообщение с id поста пишется вместе с постом, разбор outbox запускается после коммита"""
+        drain = mocker.patch.object(tasks.drain_outbox, 'delay')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_in_subscribed_category.save()
+            drain.assert_not_called()
+
+        message = OutboxMessage.objects.get()
+        assert message.kind == 'post_created'
+        assert message.payload == {'post_id': post_in_subscribed_category.pk}
+        drain.assert_called_once()
+
+    def test_rolled_back_post_leaves_no_message(self, post_in_subscribed_category):
+        """Откаченный пост не оставляет уведомления"""
+        with transaction.atomic():
+            post_in_subscribed_category.save()
+            transaction.set_rollback(True)
+
+        assert not OutboxMessage.objects.exists()
+
+    def test_update_does_not_enqueue(self, test_post):
+        """Изменение поста не запускает рассылку"""
+        OutboxMessage.objects.all().delete()
+
+        test_post.title = 'Updated'
+        test_post.save()
+
+        assert not OutboxMessage.objects.exists()
+
+    def test_broker_failure_does_not_send_inline(self, post_in_subscribed_category, mocker,
+                                                 django_capture_on_commit_callbacks):
+        """Недоступный брокер не приводит к отправке писем в запросе"""
+        mocker.patch.object(tasks.drain_outbox, 'delay', side_effect=ConnectionError)
+        notify = mocker.patch.object(notify_post_subscribers, 'delay')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_in_subscribed_category.save()
+
+        notify.assert_not_called()
+        assert OutboxMessage.objects.get().status == 'pending'
+
+
+@pytest.mark.email
+class TestNotifyPostSubscribersTask:
+    """Тесты задачи рассылки уведомлений о новом посте"""
+
+    def test_schedules_one_email_per_address(self, post_in_subscribed_category, test_category,
+                                             another_regular_user, user_factory, mocker):
+        """Каждый адрес получает одно письмо"""
+        duplicate = user_factory(username='duplicate', email=another_regular_user.email)
+        test_category.subscribers.add(another_regular_user, duplicate)
+        post_in_subscribed_category.save()
+        send = mocker.patch.object(send_post_notification_batch, 'delay')
+
+        notify_post_subscribers(post_in_subscribed_category.pk)
+
+        send.assert_called_once()
+        post_id, recipient_ids = send.call_args.args
+        assert post_id == post_in_subscribed_category.pk
+        assert all(isinstance(user_id, int) for user_id in recipient_ids)
+        emails = test_category.subscribers.filter(id__in=recipient_ids).values_list('email', flat=True)
+        assert sorted(emails) == sorted({subscriber.email for subscriber in test_category.subscribers.all()})
+
+    def test_recipients_are_batched(self, post_in_subscribed_category, test_category,
+                                    user_factory, settings, mocker):
+        """Подписчики делятся на пачки заданного размера"""
+        settings.NOTIFICATION_BATCH_SIZE = 2
+        test_category.subscribers.add(*user_factory.create_batch(4))
+        post_in_subscribed_category.save()
+        send = mocker.patch.object(send_post_notification_batch, 'delay')
+
+        notify_post_subscribers(post_in_subscribed_category.pk)
+
+        assert [len(call.args[1]) for call in send.call_args_list] == [2, 2, 1]
+
+    def test_duplicate_task_is_skipped(self, post_in_subscribed_category, mocker):
+        """Повторно доставленная задача не рассылает уведомления второй раз"""
+        post_in_subscribed_category.save()
+        send = mocker.patch.object(send_post_notification_batch, 'delay')
+
+        notify_post_subscribers(post_in_subscribed_category.pk)
+        notify_post_subscribers(post_in_subscribed_category.pk)
+
+        send.assert_called_once()
+        run = DeliveryRun.objects.get(kind='post_notifications', key=str(post_in_subscribed_category.pk))
+        assert run.recipients == 1
+
+    def test_deleted_post(self, mocker):
+        """Удалённый до запуска задачи пост ничего не рассылает"""
+        send = mocker.patch.object(send_post_notification_batch, 'delay')
+
+        notify_post_subscribers(999999)
+
+        send.assert_not_called()
+
+
+@pytest.mark.email
+class TestSendPostNotificationBatch:
+    """Тесты отправки пачки уведомлений через одно соединение"""
+
+    def test_batch_uses_one_connection(self, test_post, user_factory, mail_outbox, mocker,
+                                       django_assert_max_num_queries):
+        """Вся пачка отправляется через одно соединение, пост и получатели читаются один раз"""
+        get_connection = mocker.spy(tasks, 'get_delivery_connection')
+        recipient_ids = create_recipients(user_factory, 'user0', 'user1', 'user2')
+
+        with django_assert_max_num_queries(4):
+            send_post_notification_batch.apply(args=(test_post.pk, recipient_ids))
+
+        assert get_connection.call_count == 1
+        assert [message.to for message in mail_outbox] == [
+            ['user0@example.com'], ['user1@example.com'], ['user2@example.com'],
+        ]
+        html, mimetype = mail_outbox[0].alternatives[0]
+        assert test_post.title in html
+        assert 'user0' in html
+
+    def test_deleted_recipients_are_skipped(self, test_post, user_factory, mail_outbox):
+        """Удалённые после постановки задачи пользователи писем не получают"""
+        gone, kept = create_recipients(user_factory, 'gone', 'kept')
+        User.objects.filter(pk=gone).delete()
+
+        result = send_post_notification_batch.apply(args=(test_post.pk, [gone, kept])).get()
+
+        assert [message.to for message in mail_outbox] == [['kept@example.com']]
+        assert result == 'Sent 1 of 2 emails'
+
+    def test_run_counts_outcomes(self, test_post, user_factory, mail_outbox, mocker):
+        """Отправленные, неотправленные и пропущенные письма считаются в итогах рассылки"""
+        DeliveryRun.objects.create(kind='post_notifications', key=str(test_post.pk), recipients=3)
+        sent, bad, gone = create_recipients(user_factory, 'sent', 'bad', 'gone')
+        User.objects.filter(pk=gone).delete()
+        send_messages = locmem.EmailBackend.send_messages
+
+        def refusing_send(backend, messages):
+            if messages[0].to == ['bad@example.com']:
+                raise SMTPRecipientsRefused({})
+            return send_messages(backend, messages)
+
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', refusing_send)
+
+        send_post_notification_batch.apply(args=(test_post.pk, [sent, bad, gone]))
+
+        run = DeliveryRun.objects.get()
+        assert (run.sent, run.failed, run.skipped) == (1, 1, 1)
+
+    def test_rendered_once_per_post(self, test_post, user_factory, mail_outbox, mocker):
+        """Шаблон письма отрисовывается один раз на пост, имя подставляется в каждое письмо"""
+        render = mocker.spy(notifications, 'render_to_string')
+        alice, bob = create_recipients(user_factory, 'alice', '<bob>')
+
+        send_post_notification_batch.apply(args=(test_post.pk, [alice]))
+        send_post_notification_batch.apply(args=(test_post.pk, [bob]))
+
+        assert render.call_count == 1
+        alice, bob = (message.alternatives[0][0] for message in mail_outbox)
+        assert ', alice!</h1>' in alice
+        assert ', &lt;bob&gt;!</h1>' in bob
+        assert 'username-' not in alice + bob
+
+    def test_worker_keeps_rendered_post(self, test_post, user_factory, mail_outbox, mocker):
+        """Следующие пачки берут письмо из памяти воркера, не обращаясь к общему кешу"""
+        shared_cache = mocker.spy(notifications, 'get_or_build')
+        recipient_ids = create_recipients(user_factory, 'alice', 'bob')
+
+        for user_id in recipient_ids:
+            send_post_notification_batch.apply(args=(test_post.pk, [user_id]))
+
+        assert shared_cache.call_count == 1
+        assert len(mail_outbox) == 2
+
+    def test_edited_post_is_rendered_again(self, test_post, user_factory, mail_outbox):
+        """После изменения поста письмо отрисовывается заново"""
+        recipient_ids = create_recipients(user_factory, 'alice')
+        send_post_notification_batch.apply(args=(test_post.pk, recipient_ids))
+        test_post.title = 'Changed title'
+        test_post.save()
+
+        send_post_notification_batch.apply(args=(test_post.pk, recipient_ids))
+
+        assert 'Changed title' in mail_outbox[1].alternatives[0][0]
+
+    def test_failed_messages_are_retried(self, test_post, user_factory, mail_outbox, mocker):
+        """Повторно отправляются только письма, которые не ушли"""
+        send_messages = locmem.EmailBackend.send_messages
+        failures = iter([True])
+
+        def flaky_send(backend, messages):
+            if messages[0].to == ['flaky@example.com'] and next(failures, False):
+                raise SMTPRecipientsRefused({})
+            return send_messages(backend, messages)
+
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', flaky_send)
+        recipient_ids = create_recipients(user_factory, 'ok', 'flaky')
+
+        send_post_notification_batch.apply(args=(test_post.pk, recipient_ids))
+
+        assert [message.to for message in mail_outbox] == [['ok@example.com'], ['flaky@example.com']]
+
+    def test_close_failure_does_not_resend(self, test_post, user_factory, mail_outbox, mocker):
+        """Ошибка при закрытии соединения не отправляет письма повторно"""
+        mocker.patch.object(locmem.EmailBackend, 'close', side_effect=SMTPServerDisconnected)
+        retry = mocker.patch.object(send_post_notification_batch, 'retry')
+
+        send_post_notification_batch.apply(args=(test_post.pk, create_recipients(user_factory, 'alice', 'bob')))
+
+        assert len(mail_outbox) == 2
+        retry.assert_not_called()
+
+    def test_open_failure_retries_everyone(self, test_post, user_factory, mail_outbox, mocker):
+        """Если соединение не открылось, повторяется вся пачка"""
+        mocker.patch.object(locmem.EmailBackend, 'open', side_effect=SMTPServerDisconnected)
+        retry = mocker.patch.object(send_post_notification_batch, 'retry', side_effect=MaxRetriesExceededError)
+        recipient_ids = create_recipients(user_factory, 'alice', 'bob')
+
+        send_post_notification_batch.apply(args=(test_post.pk, recipient_ids))
+
+        assert mail_outbox == []
+        assert retry.call_args.kwargs['args'] == (test_post.pk, recipient_ids)
+
+    def test_stopped_batch_retries_only_unsent(self, test_post, user_factory, mail_outbox, mocker):
+        """Если пачка прервалась, повторяются только получатели без письма"""
+        acquire = mocker.patch.object(tasks.mail_throttle, 'acquire', side_effect=[None, ConnectionError])
+        retry = mocker.patch.object(send_post_notification_batch, 'retry', side_effect=MaxRetriesExceededError)
+        alice, bob = create_recipients(user_factory, 'alice', 'bob')
+
+        send_post_notification_batch.apply(args=(test_post.pk, [alice, bob]))
+
+        assert [message.to for message in mail_outbox] == [['alice@example.com']]
+        assert acquire.call_count == 2
+        assert retry.call_args.kwargs['args'] == (test_post.pk, [bob])
+
+    def test_gives_up_after_max_retries(self, test_post, user_factory, mail_outbox, mocker):
+        """После исчерпания попыток ошибка логируется"""
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', side_effect=SMTPRecipientsRefused({}))
+        error = mocker.spy(tasks.logger, 'error')
+
+        send_post_notification_batch.apply(args=(test_post.pk, create_recipients(user_factory, 'bad')))
+
+        assert mail_outbox == []
+        error.assert_called_once()
+
+
+@pytest.fixture
+def weekly_categories(category_factory, post_factory, author_user, user_factory):
+    """Две категории с постами за прошлую неделю и подписчиками, одна со старым постом"""
+    profile = author_user.profile
+    week_ago, period_end = digest_window(digest_period())
+    categories = category_factory.create_batch(3)
+    for category in categories:
+        category.subscribers.add(*user_factory.create_batch(3))
+    for category in categories[:2]:
+        posts = post_factory.create_batch(2, author=profile, category=category)
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(creation_date=period_end - timedelta(days=1))
+    old = post_factory(author=profile, category=categories[2], title='Old news')
+    Post.objects.filter(pk=old.pk).update(creation_date=week_ago - timedelta(days=1))
+    return categories
+
+
+def shard_args(first_user_id=0, end_user_id=10 ** 9):
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    return digest_period().isoformat(), category_ids, first_user_id, end_user_id
+
+
+@pytest.mark.email
+class TestSendWeeklyPosts:
+    """Тесты еженедельной рассылки"""
+
+    def test_sends_personalized_digest(self, weekly_categories, mail_outbox, celery_eager):
+        """Подписчики категорий с новыми постами получают письмо со своим именем"""
+        send_weekly_posts()
+
+        expected = {
+            subscriber.email: subscriber.username
+            for category in weekly_categories[:2]
+            for subscriber in category.subscribers.all()
+        }
+        assert sorted(message.to[0] for message in mail_outbox) == sorted(expected)
+        for message in mail_outbox:
+            html, mimetype = message.alternatives[0]
+            assert f'Hello, {expected[message.to[0]]}!' in html
+            assert 'username-' not in html
+            assert 'Old news' not in html
+
+    def test_shards_cover_every_subscriber_once(self, weekly_categories, mail_outbox,
+                                                celery_eager, settings, mocker):
+        """Шарды по диапазонам id вместе отправляют каждому подписчику одно письмо"""
+        settings.WEEKLY_DIGEST_SHARD_SIZE = 2
+        shard = mocker.spy(tasks.send_weekly_posts_shard, 'run')
+
+        send_weekly_posts()
+
+        expected = [
+            subscriber.email
+            for category in weekly_categories[:2]
+            for subscriber in category.subscribers.all()
+        ]
+        assert sorted(message.to[0] for message in mail_outbox) == sorted(expected)
+        assert shard.call_count > 1
+
+    def test_shard_queries_and_connections(self, weekly_categories, mail_outbox,
+                                           django_assert_num_queries, mocker):
+        """Шард делает фиксированное число запросов и одно соединение на категорию"""
+        get_connection = mocker.spy(tasks, 'get_delivery_connection')
+        args = shard_args()
+
+        # посты, категории, затем подписчики, запись в журнал и счётчик рассылки для каждой из двух категорий
+        with django_assert_num_queries(8):
+            result = send_weekly_posts_shard(*args)
+
+        assert result == {'sent': 6, 'failed': 0}
+        assert get_connection.call_count == 2
+
+    def test_shard_counts_failures(self, weekly_categories, mail_outbox, mocker):
+        """Неотправленные письма учитываются, а не прерывают шард, и не попадают в журнал"""
+        refused = {category.subscribers.first().email for category in weekly_categories[:2]}
+        send_messages = locmem.EmailBackend.send_messages
+
+        def refusing_send(backend, messages):
+            if messages[0].to[0] in refused:
+                return 0
+            return send_messages(backend, messages)
+
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', refusing_send)
+
+        assert send_weekly_posts_shard(*shard_args()) == {'sent': 4, 'failed': 2}
+        assert DigestDelivery.objects.count() == 4
+        assert not DigestDelivery.objects.filter(user__email__in=refused).exists()
+
+    def test_rerun_sends_only_undelivered(self, weekly_categories, mail_outbox, celery_eager):
+        """Повторный запуск за тот же период не дублирует письма"""
+        send_weekly_posts()
+        assert len(mail_outbox) == 6
+        assert DigestDelivery.objects.filter(period=digest_period()).count() == 6
+
+        mail_outbox.clear()
+        send_weekly_posts()
+
+        assert mail_outbox == []
+
+    def test_resumes_after_crash(self, weekly_categories, mail_outbox):
+        """После падения шард досылает только подписчикам, не попавшим в журнал"""
+        category = weekly_categories[0]
+        delivered = list(category.subscribers.order_by('id')[:2])
+        DigestDelivery.objects.bulk_create([
+            DigestDelivery(period=digest_period(), category=category, user=user) for user in delivered
+        ])
+
+        assert send_weekly_posts_shard(*shard_args()) == {'sent': 4, 'failed': 0}
+        assert not {user.email for user in delivered} & {message.to[0] for message in mail_outbox}
+
+    def test_period_is_stable_within_week(self):
+        """Все запуски в течение недели относятся к одному периоду, неделя постов заканчивается в понедельник"""
+        monday = timezone.make_aware(timezone.datetime(2026, 10, 12, 8))
+        sunday = monday + timedelta(days=6, hours=15)
+
+        assert digest_period(monday) == digest_period(sunday) == monday.date()
+        week_ago, period_end = digest_window(digest_period(monday))
+        assert period_end == monday.replace(hour=0)
+        assert period_end - week_ago == timedelta(days=7)
+
+    def test_old_ledger_is_pruned(self, weekly_categories, regular_user, celery_eager):
+        """Записи журнала старше нескольких недель удаляются"""
+        old_period = digest_period() - timedelta(weeks=tasks.DIGEST_LEDGER_WEEKS + 1)
+        DigestDelivery.objects.create(period=old_period, category=weekly_categories[0], user=regular_user)
+
+        send_weekly_posts()
+
+        assert not DigestDelivery.objects.filter(period=old_period).exists()
+
+    def test_run_counts_outcomes(self, weekly_categories, mail_outbox, celery_eager, settings, mocker):
+        """Итог рассылки складывается из счётчиков всех шардов"""
+        settings.WEEKLY_DIGEST_SHARD_SIZE = 2
+        refused = {category.subscribers.first().email for category in weekly_categories[:2]}
+        send_messages = locmem.EmailBackend.send_messages
+
+        def refusing_send(backend, messages):
+            if messages[0].to[0] in refused:
+                return 0
+            return send_messages(backend, messages)
+
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', refusing_send)
+
+        send_weekly_posts()
+
+        run = DeliveryRun.objects.get(kind='weekly_digest', key=digest_period().isoformat())
+        assert (run.recipients, run.sent, run.failed) == (6, 4, 2)
+
+    def test_shards_are_routed_to_digest_queue(self):
+        """Шарды уходят в отдельную очередь digest"""
+        route = celery_app.amqp.router.route({}, send_weekly_posts_shard.name)
+
+        assert route['queue'].name == 'digest'
+        assert celery_app.amqp.router.route({}, notify_post_subscribers.name)['queue'].name == 'celery'
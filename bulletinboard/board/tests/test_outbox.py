@@ -0,0 +1,172 @@
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+
+import pytest
+from django.core.mail.backends import locmem
+from django.urls import reverse
+from django.utils import timezone
+
+from board import outbox, tasks
+from board.models import DeadOutboxMessage, DeliveryRun, OutboxMessage, Response
+from board.tasks import drain_outbox, notify_post_subscribers
+
+
+@pytest.fixture
+def accepted_response(test_post, regular_user, no_drain_kick):
+    response = Response.objects.create(post=test_post, user=regular_user, text='Ready', status='accepted')
+    OutboxMessage.objects.all().delete()
+    outbox.enqueue('response_accepted', response_id=response.pk)
+    return response
+
+
+@pytest.mark.integration
+class TestOutboxDrain:
+    """Тесты разбора outbox"""
+
+    def test_post_created_dispatches_notifications(self, test_post, mocker):
+        """Сообщение о новом посте запускает рассылку и удаляется"""
+        notify = mocker.patch.object(notify_post_subscribers, 'delay')
+
+        assert drain_outbox() == 'Delivered 1 outbox messages, 0 failed'
+
+        notify.assert_called_once_with(test_post.pk)
+        assert not OutboxMessage.objects.exists()
+
+    def test_response_accepted_email(self, accepted_response, mail_outbox):
+        """Автор отклика получает письмо о принятии"""
+        drain_outbox()
+
+        assert [message.to for message in mail_outbox] == [[accepted_response.user.email]]
+        assert accepted_response.post.title in mail_outbox[0].body
+        assert not OutboxMessage.objects.exists()
+
+    def test_failure_is_retried_with_backoff(self, test_post, mocker):
+        """Ошибка доставки откладывает сообщение с растущей задержкой"""
+        mocker.patch.object(notify_post_subscribers, 'delay', side_effect=ConnectionError('redis is down'))
+
+        assert drain_outbox() == 'Delivered 0 outbox messages, 1 failed'
+
+        message = OutboxMessage.objects.get()
+        assert message.status == 'pending'
+        assert message.attempts == 1
+        assert message.last_error == 'redis is down'
+        assert message.available_at > timezone.now() + outbox.backoff(1) - timedelta(seconds=5)
+        assert outbox.backoff(2) == 2 * outbox.backoff(1)
+        assert outbox.backoff(30) == outbox.BACKOFF_MAX
+        # не пора: повторный разбор сообщение не трогает
+        assert drain_outbox() == 'Delivered 0 outbox messages, 0 failed'
+
+    def test_dead_after_max_attempts(self, accepted_response, settings, mail_outbox, mocker):
+        """Исчерпавшее попытки сообщение попадает в dead letters"""
+        settings.OUTBOX_MAX_ATTEMPTS = 2
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', side_effect=SMTPServerDisconnected)
+
+        for _ in range(2):
+            OutboxMessage.objects.update(available_at=timezone.now())
+            drain_outbox()
+
+        message = DeadOutboxMessage.objects.get()
+        assert message.status == 'dead'
+        assert message.attempts == 2
+        assert 'SMTPServerDisconnected' in message.last_error
+
+    def test_only_failed_messages_stay(self, accepted_response, regular_user, test_post, mail_outbox, mocker):
+        """Доставленные сообщения пачки удаляются, неудачные остаются"""
+        other = Response.objects.create(post=test_post, user=regular_user, text='Also ready')
+        outbox.enqueue('response_accepted', response_id=other.pk)
+        send_messages = locmem.EmailBackend.send_messages
+        failures = iter([True])
+
+        def flaky_send(backend, messages):
+            if next(failures, False):
+                raise SMTPServerDisconnected
+            return send_messages(backend, messages)
+
+        mocker.patch.object(locmem.EmailBackend, 'send_messages', flaky_send)
+
+        assert drain_outbox() == 'Delivered 1 outbox messages, 1 failed'
+        assert OutboxMessage.objects.get().payload == {'response_id': accepted_response.pk}
+
+    def test_delivered_message_is_not_delivered_again(self, accepted_response, mail_outbox, mocker):
+        """Доставленное сообщение, строку которого не удалось удалить, не отправляется повторно"""
+        delete = mocker.patch('django.db.models.query.QuerySet.delete', side_effect=[RuntimeError, (1, {})])
+
+        with pytest.raises(RuntimeError):
+            drain_outbox()
+        OutboxMessage.objects.update(available_at=timezone.now())
+        drain_outbox()
+
+        assert len(mail_outbox) == 1
+        assert delete.call_count == 2
+
+    def test_unknown_kind_is_not_lost(self, no_drain_kick):
+        """Сообщение неизвестного вида остаётся в outbox с ошибкой"""
+        outbox.enqueue('unknown')
+
+        drain_outbox()
+
+        assert 'unknown' in OutboxMessage.objects.get(kind='unknown').last_error
+
+    def test_claims_do_not_overlap(self, no_drain_kick):
+        """Параллельные воркеры получают разные сообщения, пока не истечёт аренда"""
+        OutboxMessage.objects.all().delete()
+        for number in range(3):
+            outbox.enqueue('post_created', post_id=number)
+
+        first = outbox.claim(2)
+        second = outbox.claim(2)
+
+        assert len(first) == 2
+        assert len(second) == 1
+        assert not {message.pk for message in first} & {message.pk for message in second}
+        assert outbox.claim(2) == []
+
+        OutboxMessage.objects.update(available_at=timezone.now() - timedelta(seconds=1))
+        assert len(outbox.claim(5)) == 3
+
+
+@pytest.mark.view
+class TestAcceptResponse:
+    """Принятие отклика пишет уведомление в outbox вместо отправки в запросе"""
+
+    def test_accept_enqueues_email(self, client, test_post, author_user, regular_user, mail_outbox,
+                                   no_drain_kick, django_capture_on_commit_callbacks):
+        response = Response.objects.create(post=test_post, user=regular_user, text='Ready')
+        client.force_login(author_user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(reverse('response_accept', args=[test_post.pk, response.pk]))
+
+        assert mail_outbox == []
+        assert OutboxMessage.objects.filter(kind='response_accepted',
+                                            payload={'response_id': response.pk}).exists()
+        no_drain_kick.assert_called_once()
+
+
+@pytest.mark.integration
+class TestOutboxAdmin:
+    """Тесты dead letters в админке"""
+
+    def test_dead_letters_and_retry(self, admin_client, no_drain_kick):
+        dead = OutboxMessage.objects.create(kind='post_created', payload={'post_id': 1},
+                                            status='dead', attempts=10, last_error='boom')
+        OutboxMessage.objects.create(kind='post_created', payload={'post_id': 2})
+
+        page = admin_client.get(reverse('admin:board_deadoutboxmessage_changelist'))
+        assert list(page.context['cl'].queryset) == [dead]
+
+        admin_client.post(reverse('admin:board_outboxmessage_changelist'), {
+            'action': 'retry_messages', '_selected_action': [dead.pk],
+        })
+
+        dead.refresh_from_db()
+        assert (dead.status, dead.attempts) == ('pending', 0)
+
+    def test_delivery_runs(self, admin_client):
+        """Итоги рассылок видны в админке"""
+        DeliveryRun.objects.create(kind='weekly_digest', key='2026-10-12', recipients=5, sent=4, failed=1)
+
+        page = admin_client.get(reverse('admin:board_deliveryrun_changelist'))
+
+        assert page.status_code == 200
+        assert [(run.sent, run.failed) for run in page.context['cl'].queryset] == [(4, 1)]
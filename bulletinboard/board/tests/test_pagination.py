@@ -0,0 +1,89 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from board.models import Post
+
+
+@pytest.fixture
+def many_posts(test_post, post_factory):
+    posts = [test_post] + post_factory.create_batch(24, author=test_post.author)
+    return sorted(posts, key=lambda post: (post.creation_date, post.id), reverse=True)
+
+
+@pytest.mark.view
+class TestKeysetPagination:
+    """Тесты пагинации по курсору"""
+
+    def test_post_list_walks_all_pages(self, client, many_posts):
+        """Переход по курсорам выдаёт все посты без повторов"""
+        seen = []
+        params = {}
+        while True:
+            response = client.get(reverse('post_list'), params)
+            page = response.context['page_obj']
+            assert response.context['cursor_pagination']
+            seen.extend(page.object_list)
+            if not page.has_next():
+                break
+            params = {'cursor': page.next_cursor}
+
+        assert seen == many_posts
+
+    def test_previous_cursor_returns_previous_page(self, client, many_posts):
+        """Курсор назад возвращает предыдущую страницу"""
+        first = client.get(reverse('post_list')).context['page_obj']
+        second = client.get(reverse('post_list'), {'cursor': first.next_cursor}).context['page_obj']
+        back = client.get(reverse('post_list'), {'cursor': second.previous_cursor}).context['page_obj']
+
+        assert list(back.object_list) == list(first.object_list)
+        assert not back.has_previous()
+
+    def test_deep_page_has_no_offset_or_count(self, client, many_posts):
+        """Страница по курсору не использует OFFSET и COUNT(*)"""
+        first = client.get(reverse('post_list')).context['page_obj']
+        second = client.get(reverse('post_list'), {'cursor': first.next_cursor}).context['page_obj']
+
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse('post_list'), {'cursor': second.next_cursor})
+
+        post_queries = [q['sql'] for q in queries if 'board_post' in q['sql']]
+        assert post_queries
+        assert not any('OFFSET' in sql or 'COUNT(' in sql for sql in post_queries)
+
+    def test_count_is_optional(self, client, many_posts):
+        """Общее количество считается только по запросу"""
+        assert client.get(reverse('post_list')).context['page_obj'].count is None
+        assert client.get(reverse('post_list'), {'count': '1'}).context['page_obj'].count == 25
+
+    def test_page_number_still_works(self, client, many_posts):
+        """Пагинация по номеру страницы остаётся доступной"""
+        response = client.get(reverse('post_list'), {'page': 2})
+
+        assert not response.context['cursor_pagination']
+        assert list(response.context['page_obj'].object_list) == many_posts[10:20]
+
+    def test_invalid_cursor(self, client, many_posts):
+        """Некорректный курсор даёт 404"""
+        assert client.get(reverse('post_list'), {'cursor': 'garbage'}).status_code == 404
+
+    def test_api_cursor_pagination(self, api_client, many_posts):
+        """API отдаёт ссылки на следующую страницу по курсору"""
+        response = api_client.get(reverse('post-list'), {'limit': 20})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        assert [post['id'] for post in response.data['results']] == [p.id for p in many_posts[:20]]
+
+        response = api_client.get(response.data['next'])
+        assert [post['id'] for post in response.data['results']] == [p.id for p in many_posts[20:]]
+        assert response.data['next'] is None
+
+    def test_api_offset_fallback(self, api_client, many_posts):
+        """Параметр offset переключает API на старую пагинацию"""
+        response = api_client.get(reverse('post-list'), {'offset': 20, 'limit': 10})
+
+        assert response.data['count'] == Post.objects.count()
+        assert len(response.data['results']) == 5
@@ -0,0 +1,28 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+
+@pytest.mark.view
+class TestPostDetailQueries:
+    """Страница поста делает фиксированное число запросов к БД и кешу"""
+
+    # сессия, пользователь, отклики; профиль, группы и подписки берутся из кеша
+    DETAIL_QUERIES = 3
+    # версия поста, пост, группы, профиль и подписки пользователя
+    DETAIL_CACHE_READS = 5
+
+    @pytest.mark.parametrize('viewer', ['author_user', 'regular_user'])
+    def test_detail_queries(self, request, client, test_response, viewer,
+                            django_assert_num_queries, mocker):
+        """Повторный просмотр поста не повторяет запросы"""
+        client.force_login(request.getfixturevalue(viewer))
+        url = reverse('post_detail', args=[test_response.post.id])
+        client.get(url)
+
+        cache_get = mocker.spy(cache, 'get')
+        with django_assert_num_queries(self.DETAIL_QUERIES):
+            response = client.get(url)
+
+        assert response.status_code == 200
+        assert cache_get.call_count == self.DETAIL_CACHE_READS
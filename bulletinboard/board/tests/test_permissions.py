@@ -1,7 +1,11 @@
 import pytest
 from django.urls import reverse
-from django.contrib.auth.models import Permission
+from django.contrib.auth.models import Group, Permission, User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from board.models import Post, Response
+from board.roles import get_group_names, is_admin, roles_cache_key
+from django.core.cache import cache
 
 
 @pytest.mark.permission
@@ -59,4 +63,46 @@ class TestResponsePermissions:
         )
 
         # Должен быть доступ (200)
-        assert edit_response.status_code == 200
\ No newline at end of file
+        assert edit_response.status_code == 200
+
+
+@pytest.mark.permission
+class TestRoleCache:
+    """Тесты кеша ролей пользователя"""
+
+    def test_roles_are_cached_between_requests(self, author_user):
+        """Группы не запрашиваются из БД повторно"""
+        assert get_group_names(User.objects.get(pk=author_user.pk)) == {'authors'}
+
+        with CaptureQueriesContext(connection) as queries:
+            assert get_group_names(User.objects.get(pk=author_user.pk)) == {'authors'}
+
+        assert not [q for q in queries if 'auth_user_groups' in q['sql']]
+
+    def test_roles_invalidated_on_membership_change(self, author_user):
+        """Изменение групп пользователя сбрасывает кеш ролей"""
+        get_group_names(User.objects.get(pk=author_user.pk))
+        admin_group = Group.objects.create(name='admin')
+
+        author_user.groups.add(admin_group)
+        assert is_admin(User.objects.get(pk=author_user.pk))
+
+        admin_group.user_set.remove(author_user)
+        assert not is_admin(User.objects.get(pk=author_user.pk))
+
+    def test_roles_read_before_commit_are_dropped(self, author_user, django_capture_on_commit_callbacks):
+        """Роли, закешированные до коммита изменения групп, удаляются после коммита"""
+        admin_group = Group.objects.create(name='admin')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            author_user.groups.add(admin_group)
+            # параллельный запрос ещё видит старый состав групп
+            cache.set(roles_cache_key(author_user.pk), frozenset({'authors'}))
+
+        assert is_admin(User.objects.get(pk=author_user.pk))
+
+    def test_anonymous_has_no_roles(self, client):
+        """У анонимного пользователя нет ролей"""
+        response = client.get(reverse('post_list'))
+
+        assert get_group_names(response.wsgi_request.user) == frozenset()
@@ -0,0 +1,113 @@
+import re
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from board.filters import PostFilter
+from board.models import CategoryUser, Post, Response
+from board.pagination import KEYSET_ORDERING
+from board.search import search_titles
+from board.tasks import weekly_posts
+
+# "SCAN board_post" without "USING ... INDEX" is a full table scan;
+# SQLite before 3.36 prints "SCAN TABLE board_post"
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+def index_use(table, index):
+    """Plan line of a table read through the index (or INTEGER PRIMARY KEY)."""
+    return re.compile(
+        rf'^(?:SEARCH|SCAN) (?:TABLE )?{table} USING (?:COVERING )?(?:INDEX )?{re.escape(index)}\b'
+    )
+
+
+def full_scans(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        details = [row[-1] for row in cursor.fetchall()]
+    return [detail for detail in details if FULL_SCAN.match(detail)], details
+
+
+@pytest.mark.model
+class TestHotQueryPlans:
+    """Горячие запросы не должны сканировать таблицы целиком"""
+
+    def assert_uses_indexes(self, queryset, *indexes):
+        """No full table scan, and every (table, index) pair shows up in the plan."""
+        assert indexes
+        scans, details = full_scans(queryset)
+        assert not scans, f'Full table scan in query plan: {details}'
+        for table, index in indexes:
+            assert any(index_use(table, index).match(detail) for detail in details), \
+                f'{table} is not read through {index}: {details}'
+
+    def test_weekly_posts(self, test_post):
+        """Посты всех категорий за неделю (send_weekly_posts)"""
+        self.assert_uses_indexes(
+            weekly_posts(timezone.now() - timedelta(days=7)),
+            ('board_post', 'board_post_category_date_idx'),
+        )
+
+    def test_post_filter_by_category(self, test_post):
+        """Фильтр постов по категории и дате (PostFilter)"""
+        filterset = PostFilter(
+            {'category': [test_post.category.id], 'creation_date_after': '2020-01-01'},
+            Post.objects.order_by(*KEYSET_ORDERING),
+        )
+        self.assert_uses_indexes(filterset.qs, ('board_post', 'board_post_category_date_idx'))
+
+    def test_post_list_page(self, test_post):
+        """Страница списка постов"""
+        self.assert_uses_indexes(
+            Post.objects.order_by(*KEYSET_ORDERING)[:11], ('board_post', 'board_post_date_idx')
+        )
+
+    def test_user_responses_to_post(self, test_response):
+        """Отклики пользователя на пост (PostDetail)"""
+        self.assert_uses_indexes(
+            Response.objects.filter(post=test_response.post, user=test_response.user)
+            .order_by('-creation_date'),
+            ('board_response', 'board_resp_post_user_date_idx'),
+        )
+
+    def test_all_responses_to_post(self, test_response):
+        """Все отклики на пост для автора (PostDetail)"""
+        self.assert_uses_indexes(
+            Response.objects.filter(post=test_response.post).order_by('-creation_date'),
+            ('board_response', 'board_resp_post_date_idx'),
+        )
+
+    def test_responses_to_author_posts(self, test_response):
+        """Отклики на посты автора (ResponseList)"""
+        self.assert_uses_indexes(
+            Response.objects.filter(post__author=test_response.post.author)
+            .select_related('post', 'post__author', 'user')
+            .order_by(*KEYSET_ORDERING)[:11],
+            ('board_post', 'board_post_author_date_idx'),
+            ('board_response', 'board_resp_post_user_date_idx'),
+        )
+
+    def test_author_post_titles(self, test_post):
+        """Поиск по заголовкам постов автора (выбор поста в фильтре откликов)"""
+        self.assert_uses_indexes(
+            search_titles(Post.objects.filter(author=test_post.author), 'dra')[:20],
+            ('board_post', 'INTEGER PRIMARY KEY'),
+        )
+        self.assert_uses_indexes(
+            Post.objects.filter(author=test_post.author).order_by('-creation_date', '-id')[:20],
+            ('board_post', 'board_post_author_date_idx'),
+        )
+
+    def test_subscription_check(self, subscribed_user, test_category):
+        """Проверка подписки на категорию"""
+        self.assert_uses_indexes(
+            CategoryUser.objects.filter(category=test_category, user=subscribed_user),
+            ('board_categoryuser', 'sqlite_autoindex_board_categoryuser_1'),
+        )
+        self.assert_uses_indexes(
+            test_category.subscribers.filter(id=subscribed_user.id),
+            ('board_categoryuser', 'sqlite_autoindex_board_categoryuser_1'),
+        )
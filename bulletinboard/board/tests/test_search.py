@@ -0,0 +1,135 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from board.models import Post
+from board.search import build_match_query, search_posts, search_titles
+
+
+@pytest.mark.integration
+class TestPostSearch:
+    """Тесты полнотекстового поиска по постам"""
+
+    def test_search_finds_text_in_both_languages(self, test_post):
+        """Поиск находит слова из текста на любом языке"""
+        test_post.text_ru = '<p>Ищем опытного кузнеца</p>'
+        test_post.text_en_us = '<p>Looking for an experienced blacksmith</p>'
+        test_post.save()
+
+        assert list(search_posts(Post.objects.all(), 'кузнец')) == [test_post]
+        assert list(search_posts(Post.objects.all(), 'blacksmith')) == [test_post]
+        assert not search_posts(Post.objects.all(), 'healer').exists()
+
+    def test_title_match_ranks_higher(self, test_post, post_factory):
+        """Совпадение в заголовке важнее совпадения в тексте"""
+        in_text = post_factory(author=test_post.author, title='Guild news',
+                               text='<p>The dragon raid starts at noon</p>')
+        in_title = post_factory(author=test_post.author, title='Dragon raid',
+                                text='<p>Meet at the gates</p>')
+
+        assert list(search_posts(Post.objects.all(), 'dragon')) == [in_title, in_text]
+
+    def test_index_follows_updates_and_deletes(self, test_post):
+        """Индекс обновляется при изменении и удалении поста"""
+        test_post.title = 'Wandering merchant'
+        test_post.save()
+        assert search_posts(Post.objects.all(), 'merchant').exists()
+
+        test_post.delete()
+        assert not search_posts(Post.objects.all(), 'merchant').exists()
+
+    def test_save_does_not_look_up_the_index(self, test_post):
+        """Сохранение поста не проверяет существование индекса"""
+        with CaptureQueriesContext(connection) as queries:
+            test_post.save()
+
+        assert not [query for query in queries if 'sqlite_master' in query['sql']]
+
+    def test_query_syntax_is_escaped(self, test_post):
+        """Операторы FTS5 во вводе пользователя не ломают запрос"""
+        # случайный текст фабрики может содержать слова на near*
+        test_post.title = 'Guild news'
+        test_post.text = '<p>Meet at the gates</p>'
+        test_post.save()
+
+        assert build_match_query('tank OR "heal') == '"tank"* "OR"* "heal"*'
+        assert build_match_query('  *  ') is None
+        assert build_match_query('tank', ['title_ru']) == '{title_ru} : ("tank"*)'
+        assert list(search_posts(Post.objects.all(), '" NEAR(')) == []
+
+    def test_rebuild_command(self, test_post):
+        """Команда перестройки индекса индексирует все посты"""
+        Post.objects.filter(pk=test_post.pk).update(title_ru='Alchemist', title_en_us='Alchemist')
+
+        call_command('rebuild_search_index')
+
+        assert list(search_posts(Post.objects.all(), 'alchemist')) == [test_post]
+
+    def test_post_list_q_parameter(self, client, test_post, post_factory):
+        """Параметр q работает на странице списка постов"""
+        post_factory(author=test_post.author, title='Something else', text='<p>Nothing here</p>')
+
+        response = client.get(reverse('post_list'), {'q': test_post.title})
+
+        assert list(response.context['posts']) == [test_post]
+
+    def test_api_q_parameter(self, api_client, test_post, post_factory):
+        """Параметр q работает в API"""
+        post_factory(author=test_post.author, title='Something else', text='<p>Nothing here</p>')
+
+        response = api_client.get(reverse('post-list'), {'q': test_post.title})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [post['id'] for post in response.data['results']] == [test_post.id]
+
+
+@pytest.mark.view
+class TestPostAutocomplete:
+    """Тесты выбора поста в фильтре откликов"""
+
+    def test_title_prefix(self, test_post, post_factory):
+        """Поиск по началу слов ищет только в заголовке"""
+        in_title = post_factory(author=test_post.author, title='Dragon raid', text='<p>Meet at the gates</p>')
+        post_factory(author=test_post.author, title='Guild news', text='<p>The dragon raid starts</p>')
+
+        assert list(search_titles(Post.objects.all(), 'dra')) == [in_title]
+
+    def test_only_own_posts(self, client, author_user, test_post, post_factory, regular_user):
+        """Автор видит только свои посты, найденные по началу заголовка"""
+        own = post_factory(author=test_post.author, title='Dragon raid')
+        post_factory(author=regular_user.profile, title='Dragon hunt')
+        client.force_login(author_user)
+
+        response = client.get(reverse('post_autocomplete'), {'q': 'drag'})
+
+        assert response.json() == {'results': [{'id': own.pk, 'text': 'Dragon raid'}]}
+
+    def test_latest_posts_without_query(self, client, author_user, test_post, post_factory):
+        """Без запроса предлагаются последние посты автора"""
+        latest = post_factory(author=test_post.author)
+        client.force_login(author_user)
+
+        results = client.get(reverse('post_autocomplete')).json()['results']
+
+        assert [post['id'] for post in results] == [latest.pk, test_post.pk]
+
+    def test_requires_login(self, client):
+        response = client.get(reverse('post_autocomplete'), {'q': 'drag'})
+
+        assert response.status_code == 302
+
+    def test_filter_renders_only_selected_posts(self, client, author_user, test_response, post_factory):
+        """Фильтр откликов не выводит все посты автора в select"""
+        other = post_factory(author=test_response.post.author, title='Not selected')
+        client.force_login(author_user)
+
+        page = client.get(reverse('my_responses'), {'post': [test_response.post.pk]})
+
+        assert list(page.context['responses']) == [test_response]
+        html = page.content.decode()
+        assert f'value="{test_response.post.pk}" selected' in html
+        assert 'Not selected' not in html and f'value="{other.pk}"' not in html
+        assert 'js/post_autocomplete.js' in html
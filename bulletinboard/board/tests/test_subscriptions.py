@@ -0,0 +1,95 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from board.models import Category, CategoryUser
+from board.subscriptions import (
+    get_subscription_mask, get_subscription_masks, is_subscribed, mask_category_ids,
+    subscribed_user_ids, subscriptions_cache_key,
+)
+
+
+@pytest.mark.model
+class TestSubscriptionCache:
+    """Тесты кеша подписок пользователя"""
+
+    def test_mask_follows_subscribe_and_unsubscribe(self, regular_user, test_category):
+        """Маска обновляется при подписке и отписке через m2m"""
+        assert not is_subscribed(regular_user.pk, test_category.pk)
+
+        test_category.subscribers.add(regular_user)
+        assert is_subscribed(regular_user.pk, test_category.pk)
+        assert mask_category_ids(get_subscription_mask(regular_user.pk)) == [test_category.pk]
+
+        test_category.subscribers.remove(regular_user)
+        assert not is_subscribed(regular_user.pk, test_category.pk)
+
+    def test_mask_follows_reverse_and_clear(self, regular_user, test_category):
+        """Маска обновляется при изменении подписок со стороны пользователя и очистке"""
+        regular_user.category_set.add(test_category)
+        assert is_subscribed(regular_user.pk, test_category.pk)
+
+        test_category.subscribers.clear()
+        assert not is_subscribed(regular_user.pk, test_category.pk)
+
+    def test_mask_follows_category_user_rows(self, regular_user, test_category):
+        """Маска обновляется при прямом создании и удалении CategoryUser"""
+        link = CategoryUser.objects.create(category=test_category, user=regular_user)
+        assert is_subscribed(regular_user.pk, test_category.pk)
+
+        link.delete()
+        assert not is_subscribed(regular_user.pk, test_category.pk)
+
+    def test_mask_read_before_commit_is_dropped(self, regular_user, test_category,
+                                                django_capture_on_commit_callbacks):
+        """Маска, закешированная до коммита подписки, удаляется после коммита"""
+        with django_capture_on_commit_callbacks(execute=True):
+            test_category.subscribers.add(regular_user)
+            # параллельный запрос ещё видит старые строки и кеширует пустую маску
+            cache.set(subscriptions_cache_key(regular_user.pk), 0)
+
+        assert is_subscribed(regular_user.pk, test_category.pk)
+
+    def test_cached_lookup_makes_no_queries(self, subscribed_user, test_category,
+                                            django_assert_num_queries):
+        """Повторная проверка подписки не обращается к БД"""
+        is_subscribed(subscribed_user.pk, test_category.pk)
+
+        with django_assert_num_queries(0):
+            assert is_subscribed(subscribed_user.pk, test_category.pk)
+
+    def test_bulk_lookup(self, subscribed_user, another_regular_user, test_category,
+                         django_assert_num_queries):
+        """Подписки многих пользователей загружаются одним запросом"""
+        other = Category.objects.create(name='heal')
+        other.subscribers.add(another_regular_user)
+        user_ids = [subscribed_user.pk, another_regular_user.pk]
+
+        with django_assert_num_queries(1):
+            masks = get_subscription_masks(user_ids)
+
+        assert mask_category_ids(masks[subscribed_user.pk]) == [test_category.pk]
+        assert mask_category_ids(masks[another_regular_user.pk]) == [other.pk]
+        assert subscribed_user_ids(user_ids, test_category.pk) == {subscribed_user.pk}
+
+
+@pytest.mark.view
+class TestSubscribeView:
+    """Тесты подписки на категорию через представление"""
+
+    def test_subscribe_is_idempotent(self, client, regular_user, test_category):
+        """Повторная подписка не создаёт дубликатов"""
+        client.force_login(regular_user)
+        url = reverse('subscribe_category', args=[test_category.pk])
+
+        client.get(url)
+        client.get(url)
+
+        assert CategoryUser.objects.filter(category=test_category, user=regular_user).count() == 1
+        assert is_subscribed(regular_user.pk, test_category.pk)
+
+    def test_subscribe_unknown_category(self, client, regular_user):
+        """Подписка на несуществующую категорию даёт 404"""
+        client.force_login(regular_user)
+
+        assert client.get(reverse('subscribe_category', args=[999999])).status_code == 404
@@ -5,7 +5,7 @@ from modeltranslation.translator import register, \
 
 @register(Post)
 class MyModelTranslationOptions(TranslationOptions):
-    fields = ('title', 'text',)
+    fields = ('title', 'text', 'excerpt',)
 
 
 @register(Response)
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import PostList, PostDetail, PostCreate, PostUpdate, PostDelete, MainPage, subscribe_to_category, \
-   ProfileDetail, ProfileUpdate, ResponseList, ResponseCreate, ResponseUpdate, ResponseDelete, accept_response, reject_response
+   ProfileDetail, ProfileUpdate, ResponseList, ResponseCreate, ResponseUpdate, ResponseDelete, accept_response, reject_response, \
+   moderate_responses, post_autocomplete
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import never_cache
 from ckeditor_uploader import views as ckeditor_views
@@ -20,6 +21,8 @@ urlpatterns = [
    path('ckeditor/browse/', never_cache(login_required(ckeditor_views.browse)), name='ckeditor_browse'),
    path('profile/', ProfileDetail.as_view(), name='profile_detail'),
    path('profile/responses/', ResponseList.as_view(), name='my_responses'),
+   path('profile/responses/moderate/', moderate_responses, name='responses_moderate'),
+   path('profile/posts/autocomplete/', post_autocomplete, name='post_autocomplete'),
    path('profile/edit/', ProfileUpdate.as_view(), name='profile_edit'),
    path('post/<int:post_pk>/response/<int:pk>/accept/', accept_response, name='response_accept'),
    path('post/<int:post_pk>/response/<int:pk>/reject/', reject_response, name='response_reject'),
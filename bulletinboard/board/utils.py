@@ -0,0 +1,10 @@
+import html
+import re
+
+from django.utils.html import strip_tags
+
+
+def html_to_text(value):
+    text = strip_tags(value or '')
+    text = html.unescape(text)
+    return re.sub(r'\s+', ' ', text).strip()
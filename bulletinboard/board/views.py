@@ -1,24 +1,44 @@
-import os
 from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 from django.core.exceptions import PermissionDenied
-from django.core.mail import send_mail
 from django.shortcuts import redirect, get_object_or_404
 from django.views.generic import (
     ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 )
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response as ApiResponse
+from . import moderation, outbox, response_counters
+from .caching import get_cached_post
 from .filters import PostFilter, ResponseFilter
-from .forms import PostForm, ProfileForm, ResponseForm
+from .forms import PostForm, ProfileForm, ResponseForm, ResponseModerationForm
+from .memo import request_memo
+from .roles import is_admin
+from .pagination import KeysetPagination, KeysetPaginationMixin
+from .search import TITLE_COLUMNS, search_posts, search_titles
+from .subscriptions import get_subscription_mask, is_subscribed, mask_category_ids
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.http import HttpResponseRedirect
-from django.core.cache import cache
+from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.views.decorators.http import require_POST
 from pytz import common_timezones
 from django.utils.translation import gettext as _
 from .serializers import *
 
 
+# titles returned by each autocomplete request
+POST_AUTOCOMPLETE_LIMIT = 20
+
+
+def post_stats(posts):
+    """Number of the posts and totals of their response counters, in one query."""
+    return posts.aggregate(
+        posts=Count('id'),
+        **{field: Coalesce(Sum(field), 0) for field in RESPONSE_COUNTER_FIELDS},
+    )
+
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -42,15 +62,38 @@ class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.defer('text')
+        return search_posts(queryset, self.request.query_params.get('q'))
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return PostListSerializer
+        return super().get_serializer_class()
 
 
 class ResponseViewSet(viewsets.ModelViewSet):
     queryset = Response.objects.all()
     serializer_class = ResponseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+
+    @action(detail=False, methods=['post'], serializer_class=ResponseModerationSerializer,
+            permission_classes=[permissions.IsAuthenticated])
+    def moderate(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = moderation.moderate(
+            request.user, serializer.validated_data['responses'], serializer.validated_data['status']
+        )
+        return ApiResponse({'changed': changed})
 
 
-class PostList(ListView):
+class PostList(KeysetPaginationMixin, ListView):
     model = Post
     ordering = '-creation_date'
     template_name = 'posts.html'
@@ -58,7 +101,9 @@ class PostList(ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = Post.objects.select_related('author', 'category')
+        queryset = Post.objects.select_related('author', 'category').defer('text').order_by(
+            '-creation_date', '-id'
+        )
         self.filterset = PostFilter(self.request.GET, queryset)
         return self.filterset.qs
 
@@ -72,23 +117,23 @@ class PostDetail(DetailView):
     model = Post
     template_name = 'post.html'
     context_object_name = 'post'
-    queryset = Post.objects.select_related('author', 'category')
+    queryset = Post.objects.select_related('author__user', 'category')
 
     def get_object(self, *args, **kwargs):
-        obj = cache.get(f'posts-{self.kwargs["pk"]}', None)
-        if not obj:
-            obj = super().get_object(queryset=self.queryset)
-            cache.set(f'posts-{self.kwargs["pk"]}', obj)
-        return obj
+        return request_memo(self.request).get_post(self.kwargs['pk'], self.load_object)
+
+    def load_object(self):
+        return get_cached_post(self.kwargs['pk'], self.fetch_object)
+
+    def fetch_object(self):
+        return super().get_object(queryset=self.queryset)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.request.user.is_authenticated:
-            category = self.get_object().category
-            is_subscribed = category.subscribers.filter(id=self.request.user.id).exists()
-            author_profile = Profile.objects.get(user=self.request.user)
-            if self.get_object().author != author_profile and not self.request.user.groups.filter(
-                    name='admin').exists():
+            memo = request_memo(self.request)
+            is_subscribed = memo.is_subscribed(self.object.category)
+            if self.object.author != memo.profile and not memo.is_admin:
                 user_responses_to_this_post = Response.objects.filter(
                     post=self.object,
                     user=self.request.user
@@ -109,8 +154,7 @@ class PostCreate(PermissionRequiredMixin, CreateView):
     template_name = 'edit.html'
 
     def form_valid(self, form):
-        author, created = Profile.objects.get_or_create(user=self.request.user)
-        form.instance.author = author
+        form.instance.author = self.request.profile
         return super().form_valid(form)
 
     def get_context_data(self, **kwargs):
@@ -128,15 +172,14 @@ class PostUpdate(PermissionRequiredMixin, UpdateView):
 
     def dispatch(self, request, *args, **kwargs):
         if self.request.user.is_authenticated:
-            author = Profile.objects.get(user=request.user)
-            if self.get_object().author != author and not request.user.groups.filter(name='admin').exists():
+            if self.get_object().author != request.profile and not is_admin(request.user):
                 raise PermissionDenied(_("You can edit only your own posts"))
         return super().dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
-        cache_key = f'posts-{self.object.id}'
-        cache.delete(cache_key)
-        return super().form_valid(form)
+        self.object = form.save(commit=False)
+        self.object.save(update_fields=response_counters.edited_fields(form.changed_data))
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -153,8 +196,7 @@ class PostDelete(PermissionRequiredMixin, DeleteView):
 
     def dispatch(self, request, *args, **kwargs):
         if self.request.user.is_authenticated:
-            author = Profile.objects.get(user=request.user)
-            if self.get_object().author != author and not request.user.groups.filter(name='admin').exists():
+            if self.get_object().author != request.profile and not is_admin(request.user):
                 raise PermissionDenied(_("You can delete only your own posts"))
         return super().dispatch(request, *args, **kwargs)
 
@@ -177,21 +219,24 @@ class MainPage(TemplateView):
         return redirect('/')
 
 
-class ProfileDetail(DetailView):
+class ProfileDetail(LoginRequiredMixin, DetailView):
     model = Profile
     template_name = 'profile.html'
     context_object_name = 'profile'
 
     def get_object(self, *args, **kwargs):
-        return Profile.objects.get(user=self.request.user)
+        return self.request.profile
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         profile = self.object
         context['user'] = self.request.user
         context['user_posts'] = Post.objects.filter(author=profile)
+        context['post_stats'] = post_stats(context['user_posts'])
         context['user_responses'] = Response.objects.filter(user=self.request.user)
-        context['user_subscriptions'] = Category.objects.filter(subscribers=self.request.user)
+        context['user_subscriptions'] = Category.objects.filter(
+            id__in=mask_category_ids(get_subscription_mask(self.request.user.pk))
+        )
         return context
 
 class ProfileUpdate(UpdateView):
@@ -209,7 +254,7 @@ class ProfileUpdate(UpdateView):
         return kwargs
 
 
-class ResponseList(PermissionRequiredMixin, ListView):
+class ResponseList(PermissionRequiredMixin, KeysetPaginationMixin, ListView):
     permission_required = 'board.view_response'
     model = Response
     ordering = '-creation_date'
@@ -218,18 +263,17 @@ class ResponseList(PermissionRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        profile = Profile.objects.get(user=self.request.user)
+        profile = self.request.profile
         queryset = Response.objects.filter(
             post__author=profile
-        ).select_related('post', 'post__author', 'user')
-        self.filterset = ResponseFilter(self.request.GET, queryset=queryset)
-        if 'post' in self.filterset.form.fields:
-            self.filterset.form.fields['post'].queryset = Post.objects.filter(author=profile)
+        ).select_related('post', 'post__author', 'user').order_by('-creation_date', '-id')
+        self.filterset = ResponseFilter(self.request.GET, queryset=queryset, request=self.request)
         return self.filterset.qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filterset'] = self.filterset
+        context['post_stats'] = post_stats(Post.objects.filter(author=self.request.profile))
         return context
 
 
@@ -240,9 +284,8 @@ class ResponseCreate(PermissionRequiredMixin, CreateView):
     template_name = 'edit.html'
 
     def form_valid(self, form):
-        author, created = Profile.objects.get_or_create(user=self.request.user)
         post = Post.objects.get(pk=self.kwargs['pk'])
-        form.instance.user = author.user
+        form.instance.user = self.request.user
         form.instance.post = post
         return super().form_valid(form)
 
@@ -269,7 +312,7 @@ class ResponseUpdate(PermissionRequiredMixin, UpdateView):
     def dispatch(self, request, *args, **kwargs):
         if self.request.user.is_authenticated:
             response = self.get_object()
-            if response.user != request.user and not request.user.groups.filter(name='admin').exists():
+            if response.user != request.user and not is_admin(request.user):
                 raise PermissionDenied(_("You can edit only your own responses"))
         return super().dispatch(request, *args, **kwargs)
 
@@ -296,7 +339,7 @@ class ResponseDelete(PermissionRequiredMixin, DeleteView):
     def dispatch(self, request, *args, **kwargs):
         if self.request.user.is_authenticated:
             response = self.get_object()
-            if response.user != request.user and not request.user.groups.filter(name='admin').exists():
+            if response.user != request.user and not is_admin(request.user):
                 raise PermissionDenied(_("You can delete only your own posts"))
         return super().dispatch(request, *args, **kwargs)
 
@@ -311,35 +354,47 @@ class ResponseDelete(PermissionRequiredMixin, DeleteView):
 @login_required()
 @transaction.atomic
 def subscribe_to_category(request, category_id):
-    category = Category.objects.get(id=category_id)
-    if not category.subscribers.filter(id=request.user.id).exists():
+    if not is_subscribed(request.user.pk, category_id):
+        category = get_object_or_404(Category, id=category_id)
         category.subscribers.add(request.user)
     return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
 
 
 @login_required
+@transaction.atomic
 def accept_response(request, post_pk, pk):
     response = Response.objects.get(pk=pk, post_id = post_pk)
-    profile = Profile.objects.get(user=request.user)
-    if response.post.author != profile and not request.user.groups.filter(name='admin').exists():
+    if response.post.author != request.profile and not is_admin(request.user):
         raise PermissionDenied(_("Only post author can accept responses"))
     response.status = 'accepted'
     response.save()
-    send_mail(
-        subject=_('Your response has been accepted'),
-        message=_('Your response to post "%s" has been accepted by the author.') % response.post.title,
-        from_email=os.getenv('EMAIL_HOST_USER'),
-        recipient_list=[response.user.email],
-    )
+    outbox.enqueue('response_accepted', response_id=response.pk)
     return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
 
 
 @login_required
 def reject_response(request, post_pk, pk):
     response = Response.objects.get(pk=pk, post_id=post_pk)
-    profile = Profile.objects.get(user=request.user)
-    if response.post.author != profile and not request.user.groups.filter(name='admin').exists():
+    if response.post.author != request.profile and not is_admin(request.user):
         raise PermissionDenied(_("Only post author can reject responses"))
     response.status = 'rejected'
     response.save()
-    return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
\ No newline at end of file
+    return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
+
+
+@login_required
+@require_POST
+def moderate_responses(request):
+    form = ResponseModerationForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    moderation.moderate(request.user, form.cleaned_data['responses'], form.cleaned_data['status'])
+    return HttpResponseRedirect(request.META.get('HTTP_REFERER', reverse('my_responses')))
+
+
+@login_required
+def post_autocomplete(request):
+    """Titles of the user's posts matching ?q=, for the post picker of the responses filter."""
+    posts = Post.objects.filter(author=request.profile).only('id', *TITLE_COLUMNS).order_by('-creation_date', '-id')
+    posts = search_titles(posts, request.GET.get('q'))[:POST_AUTOCOMPLETE_LIMIT]
+    return JsonResponse({'results': [{'id': post.pk, 'text': str(post)} for post in posts]})
@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bulletinboard.settings')
 
@@ -11,8 +12,24 @@ app.autodiscover_tasks()
 
 app.conf.beat_schedule = {
     'send_weekly_posts_every_monday_8am': {
-        'task': 'send_weekly_posts',
+        'task': 'board.tasks.send_weekly_posts',
         'schedule': crontab(hour=8, minute=0, day_of_week=1),
     },
+    'drain_outbox_every_minute': {
+        'task': 'board.tasks.drain_outbox',
+        'schedule': crontab(),
+    },
 }
 
+
+
+@worker_init.connect
+def refuse_unshared_mail_limit(**kwargs):
+    # a worker only logs failed Django checks: a send limit that each
+    # container counts on its own must stop it from starting
+    from board.checks import check_mail_rate_store
+    from django.core.exceptions import ImproperlyConfigured
+
+    errors = check_mail_rate_store(None)
+    if errors:
+        raise ImproperlyConfigured(f'{errors[0].msg} {errors[0].hint}')
@@ -77,6 +77,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'board.middlewares.TimezoneMiddleware',
+    'board.middlewares.ProfileMiddleware',
 ]
 
 ROOT_URLCONF = 'bulletinboard.urls'
@@ -237,8 +238,13 @@ EMAIL_PORT = 465
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 EMAIL_USE_SSL = True
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Письма из запросов (allauth, mail_admins и т.д.) только ставятся в очередь,
+# по SMTP их отправляет воркер через QUEUED_EMAIL_BACKEND
+EMAIL_BACKEND = 'board.mail_backends.QueuedEmailBackend'
+QUEUED_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_HOST_USER')
+# Сколько писем о новом посте отправляет одна задача через одно SMTP-соединение
+NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 100))
 ADMINS = [
     ('admin', os.getenv('EMAIL_ADMIN')),
 ]
@@ -248,12 +254,40 @@ REDIS_PORT = os.getenv('REDIS_PORT')
 REDIS_USERNAME = os.getenv('REDIS_USERNAME')
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
 
-CELERY_BROKER_URL = f'redis://{REDIS_USERNAME}:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0'
-CELERY_RESULT_BACKEND = f'redis://{REDIS_USERNAME}:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0'
+# Без настроек Redis (например, в тестах) Celery остаётся со своими значениями по умолчанию
+if REDIS_HOST:
+    CELERY_BROKER_URL = f'redis://{REDIS_USERNAME}:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0'
+# Очередь писем: 'celery' или 'thread' — фоновый поток в процессе web (разработка без воркера)
+EMAIL_QUEUE = os.getenv('EMAIL_QUEUE', 'celery' if REDIS_HOST else 'thread')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Результаты задач не сохраняются: их никто не читает, а рассылка оставляла бы
+# в Redis ключ на каждую задачу. Итоги рассылок считаются в DeliveryRun
+CELERY_TASK_IGNORE_RESULT = True
 CELERY_TIMEZONE = 'UTC'
+# Шарды еженедельной рассылки идут в отдельную очередь со своим воркером,
+# чтобы не задерживать уведомления о новых постах
+CELERY_TASK_ROUTES = {
+    'board.tasks.send_weekly_posts_shard': {'queue': 'digest'},
+    # письма из запросов и outbox не стоят в одной очереди с пачками рассылок
+    'board.tasks.send_queued_email': {'queue': 'mail'},
+    'board.tasks.drain_outbox': {'queue': 'mail'},
+}
+# Общий для всех воркеров лимит отправки писем (0 — без лимита); массовым
+# рассылкам достаётся только MAIL_BULK_SHARE, остальное — письмам из запросов
+MAIL_RATE_PER_SECOND = int(os.getenv('MAIL_RATE_PER_SECOND', 10))
+MAIL_RATE_PER_HOUR = int(os.getenv('MAIL_RATE_PER_HOUR', 5000))
+MAIL_BULK_SHARE = float(os.getenv('MAIL_BULK_SHARE', 0.8))
+# Скользящие окна лимита хранятся в Redis (по умолчанию в брокере), чтобы все контейнеры
+# воркеров расходовали один лимит; без Redis лимит действует в каждом процессе отдельно
+MAIL_RATE_REDIS_URL = os.getenv('MAIL_RATE_REDIS_URL', CELERY_BROKER_URL if REDIS_HOST else None)
+# Сколько сообщений outbox забирает воркер за один раз и сколько попыток
+# доставки делается, прежде чем сообщение попадёт в dead letters
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+# Сколько id пользователей покрывает один шард рассылки
+WEEKLY_DIGEST_SHARD_SIZE = int(os.getenv('WEEKLY_DIGEST_SHARD_SIZE', 10000))
 
 CACHES = {
     'default': {
@@ -262,6 +296,18 @@ CACHES = {
     }
 }
 
+# Общий кеш для web и celery: локальный LRU в каждом процессе перед Redis
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL')
+if REDIS_CACHE_URL:
+    CACHES['default'] = {
+        'BACKEND': 'board.cache_backends.TwoTierCache',
+        'LOCATION': REDIS_CACHE_URL,
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', 1000)),
+            'LOCAL_TIMEOUT': int(os.getenv('CACHE_LOCAL_TIMEOUT', 60)),
+        },
+    }
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -1,5 +1,6 @@
 # conftest.py
 
+import importlib
 import os
 import pytest
 from pathlib import Path
@@ -7,13 +8,19 @@ from dotenv import load_dotenv
 from django.contrib.auth.models import User, Group, Permission
 from django.core.management import call_command
 from pytest_factoryboy import register
+from board import mail_throttle
 from board.models import Profile, Category, Post, Response
+from board.tasks import drain_outbox
+from board.tests.fake_redis import FakeRedis
+from bulletinboard.celery import app as celery_app
 from factory.django import DjangoModelFactory
 import factory
 from faker import Faker
 from PIL import Image
 import io
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client
 
 # Загружаем .env файл
@@ -97,6 +104,38 @@ def enable_db_access_for_all_tests(db):
     pass
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кеш не должен переживать тест: id объектов в тестовой БД повторяются"""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def mail_rate_store(settings, mocker):
+    """Окна лимита писем — в FakeRedis вместо Redis брокера"""
+    settings.MAIL_RATE_REDIS_URL = 'redis://mail-rate/0'
+    FakeRedis.reset()
+    mail_throttle._local.clear()
+    mail_throttle._local_windows.clear()
+    mocker.patch.object(mail_throttle.redis.Redis, 'from_url', return_value=FakeRedis())
+
+
+@pytest.fixture
+def no_drain_kick(mocker):
+    """Разбор outbox запускается в тестах явно"""
+    return mocker.patch.object(drain_outbox, 'delay')
+
+
+@pytest.fixture
+def celery_eager():
+    """Задачи выполняются сразу в текущем процессе"""
+    celery_app.conf.task_always_eager = True
+    yield
+    celery_app.conf.task_always_eager = False
+
+
 @pytest.fixture
 def authors_group():
     group, created = Group.objects.get_or_create(name='authors')
@@ -184,6 +223,10 @@ def django_db_setup(django_db_setup, django_db_blocker):
     """Настройка тестовой БД"""
     with django_db_blocker.unblock():
         call_command('migrate')
+        # --nomigrations создаёт таблицы по моделям, а индекс поиска есть только в миграции
+        search_index = importlib.import_module('board.migrations.0017_post_search_index')
+        with connection.cursor() as cursor:
+            cursor.execute(search_index.CREATE_SEARCH_INDEX)
 
 
 @pytest.fixture
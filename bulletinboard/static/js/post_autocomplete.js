@@ -0,0 +1,59 @@
+// Post picker of the responses filter: the select only holds the selected
+// posts, the others are looked up by title as the user types.
+(function () {
+    var DELAY = 250;
+
+    function load(select, query, request) {
+        var url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(query);
+        fetch(url, {credentials: 'same-origin'})
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                // an answer to an older query arrived late
+                if (request !== select.lastRequest) {
+                    return;
+                }
+                Array.prototype.slice.call(select.options).forEach(function (option) {
+                    if (!option.selected) {
+                        option.remove();
+                    }
+                });
+                var selected = Array.prototype.map.call(select.options, function (option) {
+                    return option.value;
+                });
+                data.results.forEach(function (post) {
+                    if (selected.indexOf(String(post.id)) === -1) {
+                        select.add(new Option(post.text, post.id));
+                    }
+                });
+            });
+    }
+
+    function attach(select) {
+        var input = document.createElement('input');
+        var timer = null;
+        input.type = 'search';
+        input.placeholder = select.dataset.placeholder || '';
+        select.parentNode.insertBefore(input, select);
+        select.lastRequest = 0;
+
+        function search() {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                select.lastRequest += 1;
+                load(select, input.value, select.lastRequest);
+            }, DELAY);
+        }
+
+        input.addEventListener('input', search);
+        // the latest posts are offered once the picker is used, not on page load
+        input.addEventListener('focus', function () {
+            if (!select.lastRequest) {
+                search();
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(attach);
+    });
+})();